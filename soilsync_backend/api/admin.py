@@ -27,11 +27,11 @@ class CustomUserAdmin(BaseUserAdmin):
 
 @admin.register(SoilData)
 class SoilDataAdmin(admin.ModelAdmin):
-    list_display = ('user', 'prediction', 'created_at', 'nitrogen', 'phosphorus', 'potassium', 'ph')
-    list_filter = ('prediction', 'created_at')
-    search_fields = ('user__username', 'prediction')
+    list_display = ('user', 'source', 'prediction', 'created_at', 'nitrogen', 'phosphorus', 'potassium', 'ph')
+    list_filter = ('source', 'prediction', 'created_at')
+    search_fields = ('user__username', 'prediction', 'location', 'device_id', 'sensor__name')
     ordering = ('-created_at',)
-    raw_id_fields = ('user',)
+    raw_id_fields = ('user', 'sensor')
 
 @admin.register(Dataset)
 class DatasetAdmin(admin.ModelAdmin):
@@ -0,0 +1,207 @@
+"""
+Versioned on-disk format for the crop model.
+
+An artifact is a directory next to the pickle (``RandomForest.pkl`` ->
+``RandomForest_artifact/``) holding the flattened forest as uncompressed
+``.npy`` files plus a ``manifest.json``::
+
+    {
+      "format_version": 1,
+      "model_type": "RandomForestClassifier",
+      "sklearn_version": "1.6.1",
+      "created_at": "2025-01-01T00:00:00+00:00",
+      "classes": ["apple", ...],
+      "feature_names": ["N", "P", "K", "temperature", "humidity", "ph", "rainfall"],
+      "n_features": 7,
+      "n_trees": 20,
+      "max_depth": 18,
+      "arrays": {"feature": {"dtype": "int64", "shape": [3774]}, ...},
+      "source": {"size": 1048576, "mtime_ns": 1735689600000000000, "sha256": "..."}
+    }
+
+Arrays are opened with ``mmap_mode='r'``, so loading is a few syscalls and
+every worker on the host shares the same page-cache pages instead of
+holding its own unpickled copy. ``source`` fingerprints the pickle the
+artifact was exported from; an artifact whose pickle has since been
+replaced is ignored and the pickle is loaded instead.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+from datetime import datetime, timezone
+import numpy as np
+from .inference import FlatForest, outputs_identical
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+MANIFEST = 'manifest.json'
+
+
+class ArtifactError(Exception):
+    pass
+
+
+def artifact_dir_for(model_path):
+    """Artifact directory that belongs to a pickled model path"""
+    return f"{os.path.splitext(model_path)[0]}_artifact"
+
+
+def source_fingerprint(model_path):
+    """Size, modification time and SHA-256 of a pickled model"""
+    digest = hashlib.sha256()
+    with open(model_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    stat = os.stat(model_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest.hexdigest()}
+
+
+def check_source(manifest, model_path):
+    """
+    Raise ArtifactError unless the manifest was exported from the pickle now
+    at ``model_path``. The file is only hashed when its size matches but its
+    modification time does not (e.g. after a copy).
+    """
+    source = manifest.get('source')
+    if not source:
+        raise ArtifactError('Artifact does not record its source pickle')
+    stat = os.stat(model_path)
+    if stat.st_size != source['size']:
+        raise ArtifactError(f'{model_path} changed since the artifact was exported')
+    if stat.st_mtime_ns != source['mtime_ns'] and source_fingerprint(model_path)['sha256'] != source['sha256']:
+        raise ArtifactError(f'{model_path} changed since the artifact was exported')
+
+
+def export_artifact(model, directory, source_path=None):
+    """
+    Write ``model`` as an artifact in ``directory``, replacing any existing
+    one only after the new arrays reproduce the model's probabilities.
+    ``source_path`` is the pickle ``model`` was saved to; load_model only
+    uses the artifact while that pickle is unchanged.
+    """
+    import sklearn
+
+    try:
+        forest = FlatForest(model)
+    except (AttributeError, ValueError) as e:
+        raise ArtifactError(f'Cannot export {type(model).__name__}: {e}')
+    probes = forest.probe_inputs()
+    feature_names = getattr(model, 'feature_names_in_', None)
+    if feature_names is not None:
+        import pandas as pd
+        check_input = pd.DataFrame(probes, columns=feature_names)
+    else:
+        check_input = probes
+    if not outputs_identical(model, forest, check_input):
+        raise ArtifactError('Flattened forest does not reproduce predict_proba; not exporting')
+
+    staging = f"{directory}.tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    arrays = {}
+    for name in FlatForest.ARRAYS:
+        array = np.ascontiguousarray(getattr(forest, name))
+        np.save(os.path.join(staging, f'{name}.npy'), array, allow_pickle=False)
+        arrays[name] = {'dtype': str(array.dtype), 'shape': list(array.shape)}
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'model_type': type(model).__name__,
+        'sklearn_version': sklearn.__version__,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'classes': forest.classes_.tolist(),
+        'feature_names': list(feature_names) if feature_names is not None else None,
+        'n_features': int(forest.n_features_in_),
+        'n_trees': len(forest.roots),
+        'max_depth': int(forest.max_depth),
+        'arrays': arrays,
+        'source': source_fingerprint(source_path) if source_path else None,
+    }
+    with open(os.path.join(staging, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(staging, directory)
+    return manifest
+
+
+def install_artifact(source_model_path, target_model_path):
+    """
+    Give ``target_model_path`` (a copy of ``source_model_path``) the artifact
+    of ``source_model_path``, copying it when one exists for that exact
+    pickle and exporting one from the target pickle otherwise.
+    """
+    source = artifact_dir_for(source_model_path)
+    target = artifact_dir_for(target_model_path)
+    try:
+        manifest = read_manifest(source)
+        fingerprint = source_fingerprint(target_model_path)
+        if (manifest.get('source') or {}).get('sha256') != fingerprint['sha256']:
+            raise ArtifactError(f'{source} was not exported from {target_model_path}')
+    except ArtifactError:
+        import joblib
+        return export_artifact(joblib.load(target_model_path), target, target_model_path)
+    staging = f"{target}.tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    shutil.copytree(source, staging)
+    manifest['source'] = fingerprint
+    with open(os.path.join(staging, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(staging, target)
+    return manifest
+
+
+def read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise ArtifactError(f'No model artifact at {directory}')
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise ArtifactError(f"Unsupported artifact format {manifest.get('format_version')}")
+    return manifest
+
+
+def load_artifact(directory, mmap=True):
+    """Open an artifact as a FlatForest backed by read-only memory maps"""
+    manifest = read_manifest(directory)
+    arrays = {}
+    for name in FlatForest.ARRAYS:
+        array = np.load(
+            os.path.join(directory, f'{name}.npy'),
+            mmap_mode='r' if mmap else None,
+            allow_pickle=False
+        )
+        spec = manifest['arrays'][name]
+        if str(array.dtype) != spec['dtype'] or list(array.shape) != spec['shape']:
+            raise ArtifactError(f'{name}.npy does not match the manifest')
+        arrays[name] = array
+
+    classes = manifest['classes']
+    classes = np.array(classes, dtype=object if classes and isinstance(classes[0], str) else None)
+    forest = FlatForest.from_arrays(classes, manifest['n_features'], manifest['max_depth'], arrays)
+    if manifest.get('feature_names'):
+        forest.feature_names_in_ = np.array(manifest['feature_names'], dtype=object)
+    return forest
+
+
+def load_model(model_path, prefer_artifact=True):
+    """
+    Load the crop model for ``model_path``: its artifact when one exported
+    from that pickle exists (and ``prefer_artifact`` is set), otherwise the
+    pickle itself.
+    """
+    if prefer_artifact:
+        directory = artifact_dir_for(model_path)
+        if os.path.isdir(directory):
+            try:
+                check_source(read_manifest(directory), model_path)
+                return load_artifact(directory)
+            except (ArtifactError, OSError, ValueError, KeyError) as e:
+                logger.warning(f"Ignoring model artifact {directory}: {e}")
+    import joblib
+    return joblib.load(model_path)
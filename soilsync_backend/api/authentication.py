@@ -1,8 +1,56 @@
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
+from django.db import router
+from django.db.models import Case, IntegerField, Q, Value, When
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from .token_cache import token_user_cache
 
 User = get_user_model()
 
+# User fields kept in the cached snapshot. The password hash is left out and
+# loads lazily as a deferred field if a view ever needs it.
+SNAPSHOT_FIELDS = [
+    field.attname for field in User._meta.concrete_fields if field.attname != 'password'
+]
+
+
+def find_user(identifier):
+    """
+    Resolve a username or email address with a single query. An exact
+    username match wins over accounts that merely share the email address.
+    """
+    return (
+        User.objects.filter(Q(username=identifier) | Q(email=identifier))
+        .order_by(
+            Case(When(username=identifier, then=Value(0)), default=Value(1), output_field=IntegerField()),
+            'id',
+        )
+        .first()
+    )
+
+
+def check_credentials(identifier, password):
+    """
+    Single authentication path shared by the API token view, the dashboard
+    login and UsernameOrEmailBackend: one user lookup and exactly one password
+    hash per attempt. Returns ``(user, None)`` on success or ``(None, reason)``
+    with reason one of ``'not_found'``, ``'invalid_password'`` or ``'inactive'``.
+    """
+    user = find_user(identifier)
+    if user is None:
+        # Run the hasher once so unknown accounts cost the same as wrong passwords
+        User().set_password(password)
+        return None, 'not_found'
+
+    # check_password transparently re-hashes with the preferred hasher and
+    # cost when the stored hash is outdated
+    if not user.check_password(password):
+        return None, 'invalid_password'
+    if not user.is_active:
+        return None, 'inactive'
+    return user, None
+
+
 class UsernameOrEmailBackend(ModelBackend):
     """
     Custom authentication backend that allows login with username or email
@@ -11,21 +59,9 @@ class UsernameOrEmailBackend(ModelBackend):
     def authenticate(self, request, username=None, password=None, **kwargs):
         if username is None or password is None:
             return None
-        
-        # Try to find user by username first
-        try:
-            user = User.objects.get(username=username)
-        except User.DoesNotExist:
-            # If not found by username, try email
-            try:
-                user = User.objects.get(email=username)
-            except User.DoesNotExist:
-                return None
-        
-        # Check if the user can authenticate
-        if user.check_password(password) and self.user_can_authenticate(user):
-            return user
-        return None
+
+        user, _ = check_credentials(username, password)
+        return user
     
     def user_can_authenticate(self, user):
         """
@@ -34,3 +70,37 @@ class UsernameOrEmailBackend(ModelBackend):
         """
         is_active = getattr(user, 'is_active', None)
         return is_active or is_active is None
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that remembers verified tokens for a short TTL, so
+    repeat requests with the same token skip both signature verification and
+    the user SELECT. Snapshots are dropped whenever the user is saved or
+    deleted (see CustomUser.save/delete).
+    """
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        cached = token_user_cache.get(raw_token)
+        if cached is not None:
+            validated_token, snapshot = cached
+            return self._user_from_snapshot(snapshot), validated_token
+
+        validated_token = self.get_validated_token(raw_token)
+        user = self.get_user(validated_token)
+        snapshot = {name: getattr(user, name) for name in SNAPSHOT_FIELDS}
+        token_user_cache.set(raw_token, validated_token, snapshot, validated_token.get('exp'))
+        return user, validated_token
+
+    def _user_from_snapshot(self, snapshot):
+        # A fresh instance per request, so views can't leak changes to each other
+        db = router.db_for_read(self.user_model)
+        return self.user_model.from_db(db, SNAPSHOT_FIELDS, [snapshot[name] for name in SNAPSHOT_FIELDS])
@@ -0,0 +1,205 @@
+"""
+Resumable, chunked uploads of dataset CSVs.
+
+Protocol (all under /api/upload-csv/chunked/):
+
+1. ``POST``                  {filename, size, merge_mode?, chunk_size?}
+                             -> upload id, chunk size, total chunks
+2. ``PUT <id>/chunks/<n>/``  raw chunk bytes, ``X-Chunk-SHA256`` header
+3. ``GET <id>/``             received bytes and the next chunk to send,
+                             which is where an interrupted client resumes
+4. ``POST <id>/commit/``     {sha256?} -> parse and import the file
+
+Chunks must arrive in order and every chunk but the last is exactly
+``chunk_size`` bytes. Each one is streamed to a staging file while its
+checksum is computed, then appended to the upload's file under a row lock,
+so memory use is one read buffer per request and a retried chunk is either
+acknowledged again (same checksum) or rejected, never appended twice.
+"""
+import hashlib
+import os
+import shutil
+import uuid
+from django.conf import settings
+from django.db import transaction
+from .models import DatasetUpload
+
+_upload_settings = getattr(settings, 'DATASET_UPLOAD', {})
+UPLOAD_DIR = _upload_settings.get('DIR', os.path.join(settings.BASE_DIR, 'uploads', 'datasets'))
+CHUNK_SIZE = _upload_settings.get('CHUNK_SIZE', 4 * 1024 * 1024)
+MAX_CHUNK_SIZE = _upload_settings.get('MAX_CHUNK_SIZE', 16 * 1024 * 1024)
+MAX_FILE_SIZE = _upload_settings.get('MAX_FILE_SIZE', 2 * 1024 ** 3)
+EXPIRE_HOURS = _upload_settings.get('EXPIRE_HOURS', 24)
+
+READ_BUFFER = 64 * 1024
+
+
+class UploadError(Exception):
+    """A request that doesn't fit the upload's state; ``status`` is the HTTP code"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def upload_path(upload):
+    return os.path.join(UPLOAD_DIR, f'{upload.pk}.csv')
+
+
+def create_upload(user, filename, total_size, merge_mode='merge', chunk_size=None):
+    try:
+        total_size = int(total_size)
+        chunk_size = int(chunk_size or CHUNK_SIZE)
+    except (TypeError, ValueError):
+        raise UploadError('size and chunk_size must be integers')
+    if total_size <= 0:
+        raise UploadError('size must be positive')
+    if total_size > MAX_FILE_SIZE:
+        raise UploadError(f'File exceeds the {MAX_FILE_SIZE} byte limit', status=413)
+    if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+        raise UploadError(f'chunk_size must be between 1 and {MAX_CHUNK_SIZE}')
+    if merge_mode not in ('merge', 'replace'):
+        raise UploadError("merge_mode must be 'merge' or 'replace'")
+
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    upload = DatasetUpload.objects.create(
+        user=user,
+        filename=os.path.basename(filename or 'dataset.csv')[:255],
+        merge_mode=merge_mode,
+        total_size=total_size,
+        chunk_size=chunk_size,
+    )
+    open(upload_path(upload), 'wb').close()
+    return upload
+
+
+def expected_chunk_length(upload, index):
+    return min(upload.chunk_size, upload.total_size - index * upload.chunk_size)
+
+
+def _stream_to_staging(upload, stream, length):
+    """Copy ``length`` bytes of ``stream`` to a staging file; returns (path, sha256)"""
+    staging = os.path.join(UPLOAD_DIR, f'{upload.pk}.{uuid.uuid4().hex}.part')
+    digest = hashlib.sha256()
+    remaining = length
+    try:
+        with open(staging, 'wb') as f:
+            while remaining:
+                data = stream.read(min(READ_BUFFER, remaining))
+                if not data:
+                    break
+                digest.update(data)
+                f.write(data)
+                remaining -= len(data)
+    except BaseException:
+        _remove(staging)
+        raise
+    if remaining:
+        _remove(staging)
+        raise UploadError(f'Chunk body ended {remaining} bytes early')
+    return staging, digest.hexdigest()
+
+
+def write_chunk(upload_id, user, index, stream, length, checksum):
+    """
+    Store chunk ``index`` read from ``stream``. Re-sending a stored chunk with
+    the same checksum is acknowledged without writing anything.
+    """
+    upload = get_upload(upload_id, user)
+    if upload.status != 'uploading':
+        raise UploadError(f'Upload is {upload.status}', status=409)
+    if not 0 <= index < upload.total_chunks:
+        raise UploadError(f'Chunk index must be between 0 and {upload.total_chunks - 1}')
+    if not checksum:
+        raise UploadError('X-Chunk-SHA256 header is required')
+    if length != expected_chunk_length(upload, index):
+        raise UploadError(
+            f'Chunk {index} must be {expected_chunk_length(upload, index)} bytes, got {length}',
+            status=413 if length > upload.chunk_size else 400
+        )
+
+    staging, digest = _stream_to_staging(upload, stream, length)
+    try:
+        if digest != checksum.lower():
+            raise UploadError('Chunk checksum mismatch; resend the chunk', status=422)
+        with transaction.atomic():
+            upload = DatasetUpload.objects.select_for_update().get(pk=upload.pk)
+            if index < upload.next_chunk:
+                if upload.chunk_checksums[index] != digest:
+                    raise UploadError(f'Chunk {index} was already received with a different checksum', status=409)
+                return upload
+            if index > upload.next_chunk:
+                raise UploadError(f'Expected chunk {upload.next_chunk}', status=409)
+            with open(upload_path(upload), 'r+b') as target, open(staging, 'rb') as source:
+                # Drop the tail of an append that died before it was recorded
+                target.truncate(upload.received_bytes)
+                target.seek(upload.received_bytes)
+                shutil.copyfileobj(source, target, READ_BUFFER)
+                target.flush()
+                os.fsync(target.fileno())
+            upload.received_bytes += length
+            upload.chunk_checksums = upload.chunk_checksums + [digest]
+            upload.save(update_fields=['received_bytes', 'chunk_checksums', 'updated_at'])
+            return upload
+    finally:
+        _remove(staging)
+
+
+def get_upload(upload_id, user):
+    try:
+        return DatasetUpload.objects.get(pk=upload_id, user=user)
+    except DatasetUpload.DoesNotExist:
+        raise UploadError('Upload not found', status=404)
+
+
+def complete_file(upload, sha256=None):
+    """Path of a fully received upload, after checking the whole-file checksum"""
+    if upload.received_bytes != upload.total_size:
+        raise UploadError(
+            f'Upload incomplete: {upload.received_bytes} of {upload.total_size} bytes, '
+            f'next chunk {upload.next_chunk}',
+            status=409
+        )
+    path = upload_path(upload)
+    if sha256:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        if digest.hexdigest() != sha256.lower():
+            raise UploadError('File checksum mismatch', status=422)
+    return path
+
+
+def finish_upload(upload, status, result):
+    upload.status = status
+    upload.result = result
+    upload.save(update_fields=['status', 'result', 'updated_at'])
+    _remove(upload_path(upload))
+
+
+def delete_upload(upload):
+    _remove(upload_path(upload))
+    upload.delete()
+
+
+def status_data(upload):
+    return {
+        'upload_id': str(upload.pk),
+        'filename': upload.filename,
+        'status': upload.status,
+        'merge_mode': upload.merge_mode,
+        'size': upload.total_size,
+        'chunk_size': upload.chunk_size,
+        'total_chunks': upload.total_chunks,
+        'received_bytes': upload.received_bytes,
+        'next_chunk': upload.next_chunk,
+        'result': upload.result,
+    }
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,178 @@
+"""
+Validation and bulk import of training dataset CSVs.
+
+A file is checked column by column in one vectorised pass: every feature is
+coerced to float64, and missing, non-numeric and out-of-range values are
+flagged with NumPy masks. Labels are trimmed and lower-cased. Only the rows
+that pass every check are inserted, with bulk_create in a single
+transaction. Large files are read and validated ``chunk_rows`` rows at a
+time, so memory stays bounded whatever the file size.
+"""
+import numpy as np
+import pandas as pd
+from django.db import transaction
+from .models import Dataset
+
+# CSV column -> Dataset field, in model feature order
+CSV_COLUMNS = {
+    'N': 'nitrogen',
+    'P': 'phosphorus',
+    'K': 'potassium',
+    'temperature': 'temperature',
+    'humidity': 'humidity',
+    'ph': 'ph',
+    'rainfall': 'rainfall',
+}
+REQUIRED_COLUMNS = [*CSV_COLUMNS, 'label']
+
+# Plausible ranges of the training features (N, P, K as kg/ha ratios,
+# temperature in degrees C, relative humidity in %, rainfall in mm)
+FEATURE_RANGES = {
+    'N': (0.0, 1000.0),
+    'P': (0.0, 1000.0),
+    'K': (0.0, 1000.0),
+    'temperature': (-20.0, 60.0),
+    'humidity': (0.0, 100.0),
+    'ph': (0.0, 14.0),
+    'rainfall': (0.0, 5000.0),
+}
+
+LABEL_MAX_LENGTH = Dataset._meta.get_field('label').max_length
+
+# First data row of a CSV with a header is line 2
+FIRST_LINE = 2
+
+
+class DatasetValidationError(ValueError):
+    pass
+
+
+def _normalize_labels(column):
+    """
+    Trimmed, lower-cased labels as an object array (None where missing or
+    blank) and a mask of labels longer than the model field allows.
+    """
+    # Each distinct label is normalised once; code -1 (missing) picks the
+    # trailing None
+    codes, uniques = pd.factorize(column)
+    normalized = np.array([str(label).strip().lower() or None for label in uniques] + [None], dtype=object)
+    too_long = np.array([label is not None and len(label) > LABEL_MAX_LENGTH for label in normalized])
+    return normalized[codes], too_long[codes]
+
+
+def validate_dataset(df, max_errors=50, first_line=FIRST_LINE):
+    """
+    Validate a dataset DataFrame with the REQUIRED_COLUMNS.
+
+    Returns ``(features, labels, report)``: a float64 (n_valid, 7) matrix in
+    CSV_COLUMNS order, the matching normalised labels, and a report with row
+    counts, per-column error counts and the first ``max_errors`` row errors.
+    Row errors give the CSV line number, counting the frame's first row as
+    ``first_line``.
+    """
+    missing_columns = [column for column in REQUIRED_COLUMNS if column not in df.columns]
+    if missing_columns:
+        raise DatasetValidationError(f'CSV must contain columns: {REQUIRED_COLUMNS}')
+
+    n_rows = len(df)
+    features = np.empty((n_rows, len(CSV_COLUMNS)), dtype=np.float64)
+    invalid = np.zeros(n_rows, dtype=bool)
+    column_errors = {}
+    errors = []
+
+    def flag(column, kind, mask, message):
+        count = int(np.count_nonzero(mask))
+        if not count:
+            return
+        invalid[mask] = True
+        column_errors.setdefault(column, {})[kind] = count
+        raw = df[column]
+        for row in np.flatnonzero(mask)[:max_errors].tolist():
+            value = raw.iat[row]
+            errors.append({
+                'line': row + first_line,
+                'column': column,
+                'error': f'{column} {message}',
+                'value': None if pd.isna(value) else str(value)[:50],
+            })
+
+    for position, column in enumerate(CSV_COLUMNS):
+        raw = df[column]
+        # A no-op for columns pandas already parsed as numbers
+        values = pd.to_numeric(raw, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+        features[:, position] = values
+        missing = raw.isna().to_numpy()
+        unparsed = np.isnan(values)
+        low, high = FEATURE_RANGES[column]
+        flag(column, 'missing', missing, 'is missing')
+        flag(column, 'not_numeric', unparsed & ~missing, 'is not a number')
+        flag(column, 'out_of_range', ~unparsed & ((values < low) | (values > high)), f'is out of range [{low}, {high}]')
+
+    labels, label_too_long = _normalize_labels(df['label'])
+    flag('label', 'missing', np.equal(labels, None), 'is missing')
+    flag('label', 'too_long', label_too_long, f'is longer than {LABEL_MAX_LENGTH} characters')
+
+    valid = ~invalid
+    errors.sort(key=lambda error: error['line'])
+    report = {
+        'rows': n_rows,
+        'valid': int(np.count_nonzero(valid)),
+        'invalid': int(np.count_nonzero(invalid)),
+        'column_errors': column_errors,
+        'errors': errors[:max_errors],
+    }
+    return features[valid], labels[valid], report
+
+
+def import_dataset(features, labels, replace=False, batch_size=5000):
+    """
+    Insert validated rows with bulk_create, replacing the existing dataset
+    when ``replace`` is set. Either every row lands or none does.
+    """
+    fields = list(CSV_COLUMNS.values())
+    with transaction.atomic():
+        if replace:
+            Dataset.objects.all().delete()
+        rows = features.tolist()
+        for start in range(0, len(rows), batch_size):
+            Dataset.objects.bulk_create([
+                Dataset(label=label, **dict(zip(fields, row)))
+                for row, label in zip(rows[start:start + batch_size], labels[start:start + batch_size])
+            ])
+    return len(rows)
+
+
+def merge_reports(total, report, max_errors=50):
+    """Add a chunk's validation report to the running ``total``"""
+    for key in ('rows', 'valid', 'invalid'):
+        total[key] = total.get(key, 0) + report[key]
+    column_errors = total.setdefault('column_errors', {})
+    for column, counts in report['column_errors'].items():
+        for kind, count in counts.items():
+            column_errors.setdefault(column, {})[kind] = column_errors.get(column, {}).get(kind, 0) + count
+    errors = total.setdefault('errors', [])
+    errors.extend(report['errors'][:max_errors - len(errors)])
+    return total
+
+
+def import_dataset_csv(source, replace=False, chunk_rows=100000, max_errors=50):
+    """
+    Validate and import a CSV file (path or file object) ``chunk_rows``
+    rows at a time, in one transaction. Returns ``(records_added, report)``.
+    When no row is valid nothing is written, not even the replace-mode
+    delete.
+    """
+    report = {'rows': 0, 'valid': 0, 'invalid': 0, 'column_errors': {}, 'errors': []}
+    records_added = 0
+    with transaction.atomic():
+        first_line = FIRST_LINE
+        try:
+            for chunk in pd.read_csv(source, chunksize=chunk_rows):
+                features, labels, chunk_report = validate_dataset(chunk, max_errors, first_line)
+                merge_reports(report, chunk_report, max_errors)
+                first_line += len(chunk)
+                if len(features):
+                    records_added += import_dataset(features, labels, replace=replace and not records_added)
+        except (pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+            raise DatasetValidationError(f'Cannot parse CSV: {e}')
+    return records_added, report
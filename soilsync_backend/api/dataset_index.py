@@ -0,0 +1,127 @@
+import threading
+import time
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Max
+
+# Dataset columns held in the index, in feature-matrix column order, and the
+# prefix each one has in the crop soil requirement responses
+FEATURES = ['nitrogen', 'phosphorus', 'potassium', 'temperature', 'humidity', 'ph', 'rainfall']
+STAT_PREFIXES = ['nitrogen', 'phosphorus', 'potassium', 'temp', 'humidity', 'ph', 'rainfall']
+
+
+class DatasetIndex:
+    """
+    The training dataset as one float64 feature matrix sorted by crop, each
+    crop's rows a contiguous slice, plus the per-crop soil statistics.
+
+    Crops are matched case-insensitively, like the lower(label) lookups they
+    replace. A few large arrays instead of model instances keep a copy built
+    before fork shareable: reading a slice never writes to the pages of the
+    rows it covers.
+    """
+
+    def __init__(self, features, labels, version=None):
+        self.version = version
+        keys = np.asarray([label.lower() for label in labels], dtype=object)
+        crops, first, codes = np.unique(keys, return_index=True, return_inverse=True)
+        order = np.argsort(codes, kind='stable')
+        features = np.asarray(features, dtype=np.float64).reshape(-1, len(FEATURES))
+        self.features = np.ascontiguousarray(features[order])
+        self.features.setflags(write=False)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(crops)))])
+
+        self.slices = {}
+        self.names = {}
+        self.stats = {}
+        for i, crop in enumerate(crops):
+            start, stop = int(offsets[i]), int(offsets[i + 1])
+            self.slices[crop] = (start, stop)
+            # The spelling of the crop's first row, as the per-crop queries reported it
+            self.names[crop] = labels[first[i]]
+            self.stats[crop] = self._statistics(self.features[start:stop])
+
+    @staticmethod
+    def _statistics(rows):
+        stats = {}
+        for column, prefix in enumerate(STAT_PREFIXES):
+            values = rows[:, column]
+            stats[f'{prefix}_min'] = float(values.min())
+            stats[f'{prefix}_max'] = float(values.max())
+            stats[f'{prefix}_mean'] = round(float(values.mean()), 2)
+        stats['sample_size'] = len(rows)
+        return stats
+
+    @classmethod
+    def from_database(cls):
+        from .models import Dataset
+        version = cls.current_version()
+        rows = list(Dataset.objects.order_by('id').values_list(*FEATURES, 'label'))
+        features = [row[:-1] for row in rows]
+        labels = [row[-1] for row in rows]
+        return cls(features, labels, version)
+
+    @staticmethod
+    def current_version():
+        """Cheap fingerprint of the Dataset table: (row count, highest id)"""
+        from .models import Dataset
+        summary = Dataset.objects.aggregate(count=Count('id'), last=Max('id'))
+        return summary['count'], summary['last']
+
+    def crops(self):
+        """Display names of all crops, sorted"""
+        return sorted(self.names.values())
+
+    def crop_statistics(self, crop):
+        """Soil statistics of ``crop`` (any case), or None when it has no rows"""
+        return self.stats.get(crop.lower())
+
+    def similar_cases(self, crop, n=5, rng=None):
+        """Up to ``n`` random dataset rows of ``crop`` as dicts"""
+        bounds = self.slices.get(crop.lower())
+        if bounds is None:
+            return []
+        start, stop = bounds
+        rng = rng or np.random.default_rng()
+        picks = np.sort(rng.choice(np.arange(start, stop), min(n, stop - start), replace=False))
+        label = self.names[crop.lower()]
+        return [
+            dict(zip(FEATURES, self.features[row].tolist()), label=label)
+            for row in picks
+        ]
+
+
+class DatasetIndexCache:
+    """
+    Process-wide DatasetIndex. The table fingerprint is re-read at most once
+    per ``check_interval`` seconds and the index rebuilt only when it moved,
+    so a copy preloaded before fork stays shared until the data changes.
+    """
+
+    def __init__(self, check_interval=30.0):
+        self.check_interval = check_interval
+        self._index = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        index = self._index
+        if index is not None and self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return index
+        with self._lock:
+            index = self._index
+            if index is None or index.version != DatasetIndex.current_version():
+                index = self._index = DatasetIndex.from_database()
+            self._checked_at = now
+        return index
+
+    def invalidate(self):
+        with self._lock:
+            self._index = None
+            self._checked_at = None
+
+
+dataset_index = DatasetIndexCache(
+    getattr(settings, 'DATASET_INDEX', {}).get('CHECK_SECONDS', 30.0)
+)
@@ -0,0 +1,216 @@
+import logging
+import threading
+import time
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+ENGINE_SKLEARN = 'sklearn'
+ENGINE_FLAT = 'flat'
+
+
+class FlatForest:
+    """
+    A fitted random forest exported to flat NumPy arrays and evaluated for
+    all trees at once.
+
+    Every node of every tree lives in one set of arrays (feature, threshold,
+    left, right, leaf probabilities). Leaves point at themselves, so
+    ``max_depth`` rounds of vectorised ``where`` walk every (sample, tree)
+    pair to its leaf. Per-tree probabilities are then summed in estimator
+    order and divided by the tree count, which reproduces sklearn's
+    predict_proba bit for bit.
+    """
+
+    def __init__(self, model):
+        estimators = model.estimators_
+        if getattr(model, 'n_outputs_', 1) != 1:
+            raise ValueError('Only single-output forests can be flattened')
+        self.classes_ = model.classes_
+        self.n_features_in_ = model.n_features_in_
+        n_classes = len(self.classes_)
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        depth = 0
+        for estimator in estimators:
+            tree = estimator.tree_
+            node_ids = np.arange(tree.node_count) + offset
+            is_leaf = tree.children_left == -1
+            roots.append(offset)
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left + offset))
+            rights.append(np.where(is_leaf, node_ids, tree.children_right + offset))
+            # DecisionTreeClassifier.predict_proba normalises the leaf value
+            # per call; doing it once per leaf gives the same floats
+            value = np.array(tree.value[:, 0, :n_classes], dtype=np.float64)
+            normalizer = value.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            values.append(value / normalizer)
+            depth = max(depth, tree.max_depth)
+            offset += tree.node_count
+
+        self.feature = np.concatenate(features).astype(np.intp)
+        self.threshold = np.concatenate(thresholds)
+        self.left = np.concatenate(lefts).astype(np.intp)
+        self.right = np.concatenate(rights).astype(np.intp)
+        self.value = np.concatenate(values)
+        self.roots = np.array(roots, dtype=np.intp)
+        self.max_depth = depth
+
+    ARRAYS = ('feature', 'threshold', 'left', 'right', 'value', 'roots')
+
+    @classmethod
+    def from_arrays(cls, classes, n_features, max_depth, arrays):
+        """Rebuild a forest from arrays previously taken from ARRAYS"""
+        forest = cls.__new__(cls)
+        forest.classes_ = classes
+        forest.n_features_in_ = n_features
+        forest.max_depth = max_depth
+        for name in cls.ARRAYS:
+            setattr(forest, name, arrays[name])
+        return forest
+
+    def apply(self, X):
+        """Leaf index of every (sample, tree) pair, shape (n_samples, n_trees)"""
+        # sklearn compares float32 features against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        rows = np.arange(X.shape[0])[:, np.newaxis]
+        nodes = np.repeat(self.roots[np.newaxis, :], X.shape[0], axis=0)
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def predict_proba(self, X):
+        leaves = self.apply(X)
+        proba = np.zeros((leaves.shape[0], len(self.classes_)), dtype=np.float64)
+        for tree in range(leaves.shape[1]):
+            proba += self.value[leaves[:, tree]]
+        proba /= leaves.shape[1]
+        return proba
+
+    def predict(self, X):
+        return self.classes_.take(self.predict_proba(X).argmax(axis=1), axis=0)
+
+    def probe_inputs(self, n_random=512, seed=0):
+        """
+        Inputs that exercise the forest: random points spanning the split
+        thresholds plus points sitting exactly on a threshold, where float
+        rounding differences would show up first.
+        """
+        rng = np.random.default_rng(seed)
+        internal = self.left != np.arange(len(self.left))
+        low = np.zeros(self.n_features_in_)
+        high = np.ones(self.n_features_in_)
+        for feature in range(self.n_features_in_):
+            used = self.threshold[internal & (self.feature == feature)]
+            if len(used):
+                margin = (used.max() - used.min()) * 0.1 + 1.0
+                low[feature], high[feature] = used.min() - margin, used.max() + margin
+        probes = rng.uniform(low, high, size=(n_random, self.n_features_in_))
+
+        edge_nodes = np.flatnonzero(internal)
+        if len(edge_nodes) > n_random:
+            edge_nodes = rng.choice(edge_nodes, n_random, replace=False)
+        edges = rng.uniform(low, high, size=(len(edge_nodes), self.n_features_in_))
+        edges[np.arange(len(edge_nodes)), self.feature[edge_nodes]] = self.threshold[edge_nodes].astype(np.float32)
+        return np.vstack([probes, edges])
+
+
+def outputs_identical(model, predictor, X):
+    """True when predictor.predict_proba matches model.predict_proba exactly"""
+    return np.array_equal(model.predict_proba(X), predictor.predict_proba(X))
+
+
+def build_predictor(model, engine=ENGINE_SKLEARN, load_sklearn=None):
+    """
+    The object PredictSoilView calls predict_proba on. The flat engine is
+    only used once it has reproduced the model's probabilities exactly on a
+    probe set; otherwise the sklearn model itself is returned. When ``model``
+    was loaded from an artifact, the sklearn engine gets its model from
+    ``load_sklearn()`` (which unpickles it).
+    """
+    if isinstance(model, FlatForest):
+        if engine == ENGINE_SKLEARN and load_sklearn is not None:
+            return load_sklearn()
+        return model
+    if engine != ENGINE_FLAT:
+        return model
+    try:
+        flat = FlatForest(model)
+    except (AttributeError, ValueError) as e:
+        logger.warning(f"Cannot flatten {type(model).__name__}, using sklearn: {e}")
+        return model
+    probes = flat.probe_inputs()
+    if hasattr(model, 'feature_names_in_'):
+        import pandas as pd
+        probes = pd.DataFrame(probes, columns=model.feature_names_in_)
+    if not outputs_identical(model, flat, probes):
+        logger.error('Flattened forest diverged from predict_proba on probe inputs, using sklearn')
+        return model
+    return flat
+
+
+class PredictorCache:
+    """
+    Predictor for the loaded model using the inference engine of the active
+    ModelVersion. The engine is looked up at most once per
+    ``refresh_interval`` seconds; the predictor is rebuilt when the engine or
+    the model object changes.
+    """
+
+    def __init__(self, refresh_interval=5.0):
+        self.refresh_interval = refresh_interval
+        self._engine = None
+        self._version_id = None
+        self._checked_at = None
+        self._entry = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def active_engine(self):
+        now = time.monotonic()
+        if self._checked_at is None or now - self._checked_at >= self.refresh_interval:
+            from .models import ModelVersion
+            active = ModelVersion.objects.filter(is_active=True).values_list(
+                'id', 'inference_engine'
+            ).first()
+            version_id, engine = active or (None, None)
+            self._version_id = version_id
+            self._engine = engine or getattr(settings, 'DEFAULT_INFERENCE_ENGINE', ENGINE_SKLEARN)
+            self._checked_at = now
+        return self._engine
+
+    def active_version(self):
+        """Id of the active ModelVersion, refreshed like the engine"""
+        self.active_engine()
+        return self._version_id
+
+    @property
+    def generation(self):
+        """Incremented whenever the predictor is rebuilt for a new model object"""
+        return self._generation
+
+    def get(self, model, load_sklearn=None):
+        engine = self.active_engine()
+        entry = self._entry
+        if entry is not None and entry[0] is model and entry[1] == engine:
+            return entry[2]
+        with self._lock:
+            entry = self._entry
+            if entry is None or entry[0] is not model or entry[1] != engine:
+                if entry is None or entry[0] is not model:
+                    self._generation += 1
+                entry = self._entry = (model, engine, build_predictor(model, engine, load_sklearn))
+        return entry[2]
+
+    def invalidate(self):
+        self._checked_at = None
+
+
+predictor_cache = PredictorCache(getattr(settings, 'INFERENCE_ENGINE_REFRESH_SECONDS', 5.0))
@@ -0,0 +1,139 @@
+"""
+The one write path for soil readings. Every route that stores a reading
+goes through here and writes a single row of the canonical SoilData table:
+
+- ``save_prediction``: a prediction made by /api/predict/ (source 'app')
+- ``sensor_reading`` / ``save_sensor_readings``: readings of a sensor
+  device, buffered by the dashboard's ingestion endpoint (source 'sensor')
+- ``report_prediction``: a prediction the app reports to the dashboard's
+  legacy /dashboard/api/predictions/ route. The app reports the prediction
+  it just got from /api/predict/, so a matching recent app row is reused
+  instead of storing it again; otherwise it is kept as source 'report'.
+
+New rows are published to the dashboard's realtime feed once committed.
+"""
+from datetime import timedelta
+from functools import partial
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+from .models import SoilData
+from .services import record_prediction
+
+FEATURES = ['nitrogen', 'phosphorus', 'potassium', 'temperature', 'humidity', 'ph', 'rainfall']
+
+# Sensor reading field -> canonical SoilData field
+SENSOR_FIELDS = {
+    'nitrogen': 'nitrogen',
+    'phosphorus': 'phosphorus',
+    'potassium': 'potassium',
+    'temperature': 'temperature',
+    'moisture': 'humidity',
+    'ph_level': 'ph',
+    'rainfall': 'rainfall',
+    'timestamp': 'created_at',
+}
+
+# How long after an app prediction the app's report of it is recognised
+REPORT_MATCH_WINDOW = timedelta(seconds=getattr(settings, 'READING_INGEST', {}).get('REPORT_MATCH_SECONDS', 600))
+
+
+def save_prediction(user, values, prediction, confidence):
+    """Store a prediction made by the API, with the user's prediction counter in the same transaction"""
+    from dashboard.services.realtime import publish_prediction
+    with transaction.atomic():
+        reading = SoilData.objects.create(
+            source='app',
+            user=user,
+            prediction=prediction,
+            confidence=confidence,
+            **{feature: values[feature] for feature in FEATURES}
+        )
+        record_prediction(user, prediction)
+        transaction.on_commit(partial(publish_prediction, reading))
+    return reading
+
+
+def sensor_reading(device, user, reading):
+    """Unsaved canonical row for a reading in sensor field names"""
+    return SoilData(
+        source='sensor',
+        user=user,
+        sensor=device,
+        location=device.location,
+        **{SENSOR_FIELDS[field]: value for field, value in reading.items() if field in SENSOR_FIELDS}
+    )
+
+
+def save_sensor_readings(rows, batch_size=1000):
+    """Insert sensor rows from ``sensor_reading`` and queue their crop recommendations"""
+    from dashboard.models import SensorDevice
+    from dashboard.services.realtime import publish_readings
+    from dashboard.services.recommendation_queue import recommendation_queue
+    SoilData.objects.bulk_create(rows, batch_size=batch_size)
+    SensorDevice.objects.filter(pk__in={row.sensor_id for row in rows}).update(last_updated=timezone.now())
+    recommendation_queue.enqueue(row.pk for row in rows)
+    transaction.on_commit(partial(publish_readings, rows))
+    return len(rows)
+
+
+def resolve_user(user_id):
+    """The user a reported ``user_id`` (primary key or username) names, if any"""
+    if user_id in (None, ''):
+        return None
+    User = get_user_model()
+    user_id = str(user_id)
+    lookup = {'pk': int(user_id)} if user_id.isdigit() else {'username': user_id}
+    return User.objects.filter(**lookup).first()
+
+
+def report_prediction(values, now=None):
+    """
+    Store a prediction reported by the app, given canonical field values
+    plus an optional ``user_id``. Returns ``(reading, created)``; when the
+    report names a user and repeats their recent app prediction, that row is
+    returned, filled in with the report's location, device and predicted
+    yield. Reports without a known user are always stored as their own row.
+    """
+    from dashboard.services.realtime import publish_prediction
+    now = now or timezone.now()
+    user = resolve_user(values.get('user_id'))
+    created_at = values.get('created_at') or now
+    features = {feature: values[feature] for feature in FEATURES}
+    extra = {
+        'location': values.get('location') or '',
+        'device_id': values.get('device_id') or '',
+        'predicted_yield': values.get('predicted_yield'),
+    }
+
+    # Only a report naming the user can be matched to (and fill in) their row
+    match = None
+    if user is not None:
+        match = SoilData.objects.filter(
+            source='app',
+            user=user,
+            prediction=values.get('prediction') or '',
+            created_at__gte=created_at - REPORT_MATCH_WINDOW,
+            created_at__lte=created_at + REPORT_MATCH_WINDOW,
+            **features
+        ).order_by('-created_at').first()
+    if match is not None:
+        changed = {field: value for field, value in extra.items() if value not in ('', None) and not getattr(match, field)}
+        if changed:
+            SoilData.objects.filter(pk=match.pk).update(**changed)
+            for field, value in changed.items():
+                setattr(match, field, value)
+        return match, False
+
+    reading = SoilData.objects.create(
+        source='report',
+        user=user,
+        prediction=values.get('prediction') or '',
+        confidence=values.get('confidence'),
+        created_at=created_at,
+        **features,
+        **extra
+    )
+    transaction.on_commit(partial(publish_prediction, reading))
+    return reading, True
@@ -0,0 +1,104 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Run in a fresh interpreter: time to django.setup(), to the first response
+# (which imports the URLconf and every view module) and to the first
+# prediction (which loads the model)
+FIRST_REQUEST_SCRIPT = """
+import json, os, time
+start = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'soilsync_backend.settings')
+import django
+django.setup()
+setup = time.perf_counter()
+from django.test import Client
+Client().get('/api/')
+request = time.perf_counter()
+from api import model_store
+from api.views import predict_top_crops
+model = model_store.get_model()
+if model is not None:
+    predict_top_crops(model, [90, 42, 43, 20.8, 82.0, 6.5, 202.9])
+prediction = time.perf_counter()
+print(json.dumps({
+    'setup': setup - start,
+    'first_request': request - start,
+    'first_prediction': prediction - start if model is not None else None,
+}))
+"""
+
+
+def parse_importtime(stderr):
+    """Cumulative microseconds of each top-level import in -X importtime output"""
+    imports = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        try:
+            _, cumulative, name = line[len('import time:'):].split('|')
+            cumulative = int(cumulative)
+        except ValueError:
+            continue  # the header line
+        if not name.startswith('  '):
+            imports[name.strip()] = cumulative
+    return imports
+
+
+class Command(BaseCommand):
+    help = 'Measure cold-start time of manage.py check and first-request latency in fresh processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--runs',
+            type=int,
+            default=5,
+            help='Fresh processes started per measurement (default: 5)'
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=15,
+            help='Slowest top-level imports to list (default: 15)'
+        )
+
+    def run(self, args):
+        result = subprocess.run(
+            [sys.executable, *args], cwd=settings.BASE_DIR, capture_output=True, text=True,
+            env=dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+        )
+        if result.returncode:
+            raise CommandError(f"{' '.join(args)} failed:\n{result.stderr[-2000:]}")
+        return result
+
+    def handle(self, *args, **options):
+        manage = os.path.join(settings.BASE_DIR, 'manage.py')
+
+        wall, imports = [], {}
+        for _ in range(options['runs']):
+            start = time.perf_counter()
+            result = self.run(['-X', 'importtime', manage, 'check'])
+            wall.append(time.perf_counter() - start)
+            imports = parse_importtime(result.stderr)
+        self.stdout.write(
+            f"manage.py check    median {statistics.median(wall) * 1000:7.0f} ms   "
+            f"min {min(wall) * 1000:7.0f} ms   "
+            f"imports {sum(imports.values()) / 1000:7.0f} ms"
+        )
+        for name, cumulative in sorted(imports.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f"    {cumulative / 1000:7.1f} ms  {name}")
+
+        timings = []
+        for _ in range(options['runs']):
+            timings.append(json.loads(self.run(['-c', FIRST_REQUEST_SCRIPT]).stdout.strip().splitlines()[-1]))
+        for phase in ('setup', 'first_request', 'first_prediction'):
+            values = [timing[phase] for timing in timings if timing[phase] is not None]
+            if values:
+                self.stdout.write(f"{phase:18s} median {statistics.median(values) * 1000:7.0f} ms")
+            else:
+                self.stdout.write(self.style.ERROR(f"{phase:18s} skipped: no crop model could be loaded"))
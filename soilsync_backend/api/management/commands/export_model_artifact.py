@@ -0,0 +1,33 @@
+import os
+import joblib
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from api.artifacts import ArtifactError, artifact_dir_for, export_artifact
+
+class Command(BaseCommand):
+    help = 'Export a pickled crop model as a memory-mappable .npy artifact'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'model_path',
+            nargs='?',
+            default=os.path.join(settings.BASE_DIR, 'lib', 'models', 'RandomForest.pkl'),
+            help='Pickled model to export (default: the active RandomForest.pkl)'
+        )
+
+    def handle(self, *args, **options):
+        model_path = options['model_path']
+        if not os.path.exists(model_path):
+            self.stdout.write(self.style.ERROR(f'File {model_path} does not exist'))
+            return
+
+        directory = artifact_dir_for(model_path)
+        try:
+            manifest = export_artifact(joblib.load(model_path), directory, model_path)
+        except ArtifactError as e:
+            self.stdout.write(self.style.ERROR(str(e)))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {manifest['n_trees']} trees, {len(manifest['classes'])} classes to {directory}"
+        ))
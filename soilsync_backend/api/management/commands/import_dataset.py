@@ -1,6 +1,5 @@
-import csv
 from django.core.management.base import BaseCommand
-from api.models import Dataset
+from api.dataset_import import DatasetValidationError, import_dataset_csv
 from pathlib import Path
 
 class Command(BaseCommand):
@@ -18,36 +17,28 @@ class Command(BaseCommand):
             return
 
         try:
-            # Clear existing data
-            Dataset.objects.all().delete()
-            self.stdout.write(self.style.SUCCESS('Cleared existing dataset'))
-
-            # Read and import CSV data
-            with open(file_path, 'r') as f:
-                reader = csv.DictReader(f)
-                datasets = []
-                for row in reader:
-                    dataset = Dataset(
-                        nitrogen=float(row['N']),
-                        phosphorus=float(row['P']),
-                        potassium=float(row['K']),
-                        temperature=float(row['temperature']),
-                        humidity=float(row['humidity']),
-                        ph=float(row['ph']),
-                        rainfall=float(row['rainfall']),
-                        label=row['label']
-                    )
-                    datasets.append(dataset)
-
-                # Bulk create for better performance
-                Dataset.objects.bulk_create(datasets)
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f'Successfully imported {len(datasets)} records from {csv_file}'
-                    )
-                )
-
+            # Replaces the existing data in one transaction, unless no row is valid
+            imported, report = import_dataset_csv(file_path, replace=True)
+        except DatasetValidationError as e:
+            self.stdout.write(self.style.ERROR(f'Error reading dataset: {str(e)}'))
+            return
         except Exception as e:
             self.stdout.write(
                 self.style.ERROR(f'Error importing dataset: {str(e)}')
-            ) 
\ No newline at end of file
+            )
+            return
+
+        for error in report['errors']:
+            self.stdout.write(f"  line {error['line']}: {error['error']} ({error['value']!r})")
+        if report['invalid']:
+            self.stdout.write(self.style.ERROR(
+                f"Skipped {report['invalid']} invalid rows: {report['column_errors']}"
+            ))
+        if not imported:
+            self.stdout.write(self.style.ERROR('No valid rows to import; existing dataset kept'))
+            return
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully imported {imported} records from {csv_file}'
+            )
+        )
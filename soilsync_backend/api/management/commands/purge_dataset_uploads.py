@@ -0,0 +1,40 @@
+import os
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from api.chunked_upload import EXPIRE_HOURS, UPLOAD_DIR, delete_upload
+from api.models import DatasetUpload
+
+class Command(BaseCommand):
+    help = 'Remove chunked dataset uploads that were abandoned before commit'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=float,
+            default=EXPIRE_HOURS,
+            help=f'Age since the last chunk after which an upload is removed (default: {EXPIRE_HOURS})'
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        stale = DatasetUpload.objects.filter(status='uploading', updated_at__lt=cutoff)
+        removed = 0
+        for upload in stale.iterator():
+            delete_upload(upload)
+            removed += 1
+
+        # Staging files left behind by requests that died mid-chunk
+        orphans = 0
+        if os.path.isdir(UPLOAD_DIR):
+            oldest = time.time() - options['hours'] * 3600
+            for name in os.listdir(UPLOAD_DIR):
+                path = os.path.join(UPLOAD_DIR, name)
+                if name.endswith('.part') and os.path.getmtime(path) < oldest:
+                    os.remove(path)
+                    orphans += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Removed {removed} abandoned uploads and {orphans} staging files'
+        ))
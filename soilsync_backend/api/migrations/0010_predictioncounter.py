@@ -0,0 +1,40 @@
+# Generated by Django 5.1 on 2026-10-19 12:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_counters(apps, schema_editor):
+    SoilData = apps.get_model('api', 'SoilData')
+    PredictionCounter = apps.get_model('api', 'PredictionCounter')
+    totals = SoilData.objects.order_by().values('user_id', 'prediction').annotate(n=Count('id'))
+    PredictionCounter.objects.bulk_create([
+        PredictionCounter(user_id=row['user_id'], crop=row['prediction'], count=row['n'])
+        for row in totals
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_customuser_farm_name_customuser_farm_size'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PredictionCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('crop', models.CharField(max_length=100)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='prediction_counters', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'prediction_counters',
+                'constraints': [models.UniqueConstraint(fields=('user', 'crop'), name='unique_prediction_counter')],
+            },
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
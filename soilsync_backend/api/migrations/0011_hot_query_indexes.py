@@ -0,0 +1,30 @@
+# Generated by Django 5.1 on 2026-10-19 12:08
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_predictioncounter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dataset',
+            index=models.Index(fields=['label'], name='training_dataset_label_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dataset',
+            index=models.Index(django.db.models.functions.text.Lower('label'), name='training_dataset_label_ci_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='modelversion',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-created_at'], name='model_versions_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='soildata',
+            index=models.Index(fields=['user', '-created_at'], name='soil_data_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-19 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='modelversion',
+            name='inference_engine',
+            field=models.CharField(choices=[('sklearn', 'scikit-learn'), ('flat', 'Flattened forest')], default='sklearn', max_length=20),
+        ),
+    ]
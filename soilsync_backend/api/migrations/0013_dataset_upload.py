@@ -0,0 +1,36 @@
+# Generated by Django 5.1 on 2026-10-19 12:34
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_modelversion_inference_engine'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DatasetUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255)),
+                ('merge_mode', models.CharField(default='merge', max_length=10)),
+                ('total_size', models.BigIntegerField()),
+                ('chunk_size', models.PositiveIntegerField()),
+                ('received_bytes', models.BigIntegerField(default=0)),
+                ('chunk_checksums', models.JSONField(default=list)),
+                ('status', models.CharField(choices=[('uploading', 'Uploading'), ('committed', 'Committed'), ('failed', 'Failed')], default='uploading', max_length=20)),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dataset_uploads', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'dataset_uploads',
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1 on 2026-10-19 12:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_dataset_upload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='modelversion',
+            name='rollout_mode',
+            field=models.CharField(blank=True, choices=[('shadow', 'Shadow'), ('canary', 'Canary')], default='', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='modelversion',
+            name='rollout_percent',
+            field=models.FloatField(default=0),
+        ),
+        migrations.CreateModel(
+            name='ModelEvaluation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mode', models.CharField(choices=[('primary', 'Primary'), ('shadow', 'Shadow'), ('canary', 'Canary')], max_length=10)),
+                ('predictions', models.PositiveIntegerField(default=0)),
+                ('agreements', models.PositiveIntegerField(default=0)),
+                ('errors', models.PositiveIntegerField(default=0)),
+                ('dropped', models.PositiveIntegerField(default=0)),
+                ('latency_total_ms', models.FloatField(default=0)),
+                ('latency_max_ms', models.FloatField(default=0)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('model_version', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='evaluations', to='api.modelversion')),
+            ],
+            options={
+                'db_table': 'model_evaluations',
+                'constraints': [models.UniqueConstraint(fields=('model_version', 'mode'), name='unique_model_evaluation')],
+            },
+        ),
+    ]
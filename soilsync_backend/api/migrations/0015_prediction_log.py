@@ -0,0 +1,36 @@
+# Generated by Django 5.1 on 2026-10-19 12:47
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_model_rollout'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PredictionLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('served_by', models.CharField(choices=[('primary', 'Primary'), ('canary', 'Canary')], default='primary', max_length=10)),
+                ('inputs', models.JSONField()),
+                ('prediction', models.CharField(max_length=100)),
+                ('top_crops', models.JSONField()),
+                ('latency_ms', models.FloatField()),
+                ('model_version', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='prediction_logs', to='api.modelversion')),
+                ('soil_data', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='prediction_logs', to='api.soildata')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='prediction_logs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'prediction_logs',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['-created_at'], name='prediction_logs_created_idx'), models.Index(fields=['model_version', '-created_at'], name='prediction_logs_version_idx')],
+            },
+        ),
+    ]
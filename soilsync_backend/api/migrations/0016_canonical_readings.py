@@ -0,0 +1,65 @@
+# Generated by Django 5.1 on 2026-10-19 12:54
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_prediction_log'),
+        ('dashboard', '0005_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='soildata',
+            name='device_id',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='soildata',
+            name='location',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='soildata',
+            name='predicted_yield',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='soildata',
+            name='sensor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='readings', to='dashboard.sensordevice'),
+        ),
+        migrations.AddField(
+            model_name='soildata',
+            name='source',
+            field=models.CharField(choices=[('app', 'App prediction'), ('sensor', 'Sensor reading'), ('report', 'Reported prediction')], default='app', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='soildata',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='soildata',
+            name='prediction',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='soildata',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='soil_data', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='soildata',
+            index=models.Index(fields=['source', '-created_at'], name='soil_data_source_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='soildata',
+            index=models.Index(condition=models.Q(('source', 'sensor'), _negated=True), fields=['-created_at'], name='soil_data_predictions_idx'),
+        ),
+    ]
@@ -0,0 +1,119 @@
+"""
+Accuracy vs. inference latency vs. artifact size of smaller crop forests.
+
+Variants come from two knobs. Tree counts are prefixes of a trained
+forest's ``estimators_``: the first k trees of a forest are a k-tree
+forest, so they cost no extra training. Depth limits need one forest
+trained per ``max_depth``. Every variant is scored on the holdout split,
+timed as a single-row prediction through the flat engine that serves the
+memory-mapped artifact, and sized by the artifact arrays it would export.
+"""
+import copy
+import pickle
+import time
+import numpy as np
+from .inference import FlatForest
+
+DEFAULT_TREE_COUNTS = [10, 25, 50, 100, 200]
+DEFAULT_DEPTHS = [None, 16, 12, 8]
+
+
+def truncate_forest(forest, n_estimators):
+    """The forest made of the first ``n_estimators`` trees of ``forest``"""
+    if n_estimators >= len(forest.estimators_):
+        return forest
+    smaller = copy.copy(forest)
+    smaller.estimators_ = forest.estimators_[:n_estimators]
+    smaller.n_estimators = n_estimators
+    return smaller
+
+
+def single_row_latency(forest, X, samples=200):
+    """Median seconds of one single-row predict_proba"""
+    rows = np.asarray(X, dtype=np.float64)[:samples]
+    forest.predict_proba(rows[:1])
+    timings = []
+    for row in rows:
+        row = row.reshape(1, -1)
+        start = time.perf_counter()
+        forest.predict_proba(row)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def mark_pareto(variants):
+    """
+    Flag variants no other variant beats on accuracy, latency and size at
+    once (at least as good on all three and better on one).
+    """
+    for variant in variants:
+        variant['pareto'] = not any(
+            other is not variant
+            and other['accuracy'] >= variant['accuracy']
+            and other['latency_us'] <= variant['latency_us']
+            and other['artifact_bytes'] <= variant['artifact_bytes']
+            and (
+                other['accuracy'] > variant['accuracy']
+                or other['latency_us'] < variant['latency_us']
+                or other['artifact_bytes'] < variant['artifact_bytes']
+            )
+            for other in variants
+        )
+    return variants
+
+
+def smallest_within(variants, tolerance):
+    """Smallest-artifact variant whose accuracy is within ``tolerance`` of the best"""
+    best = max(variant['accuracy'] for variant in variants)
+    eligible = [variant for variant in variants if variant['accuracy'] >= best - tolerance]
+    return min(eligible, key=lambda variant: (variant['artifact_bytes'], variant['latency_us'], -variant['accuracy']))
+
+
+def size_report(model, params, X_train, y_train, X_test, y_test, tree_counts=None, depths=None,
+                latency_samples=200, random_state=42):
+    """
+    Score tree-count and depth variants of ``model``, a forest fitted with
+    ``params``. Returns ``(report, forests)`` where ``forests`` maps
+    (n_estimators, max_depth) to each variant's fitted forest.
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.metrics import accuracy_score, f1_score
+
+    n_trees = len(model.estimators_)
+    base_depth = params.get('max_depth')
+    counts = sorted({count for count in (tree_counts or DEFAULT_TREE_COUNTS) if count < n_trees} | {n_trees})
+    depth_limits = [
+        depth for depth in (depths or DEFAULT_DEPTHS)
+        if depth is not None and (base_depth is None or depth < base_depth)
+    ]
+
+    full_forests = {base_depth: model}
+    for depth in depth_limits:
+        forest = RandomForestClassifier(**dict(params, max_depth=depth, random_state=random_state))
+        full_forests[depth] = forest.fit(X_train, y_train)
+
+    X_eval = np.asarray(X_test, dtype=np.float64)
+    variants, forests = [], {}
+    for depth, full in full_forests.items():
+        for count in counts:
+            forest = truncate_forest(full, count)
+            flat = FlatForest(forest)
+            y_pred = forest.classes_.take(flat.predict_proba(X_eval).argmax(axis=1))
+            variants.append({
+                'n_estimators': count,
+                'max_depth': depth,
+                'accuracy': float(accuracy_score(y_test, y_pred)),
+                'f1_score': float(f1_score(y_test, y_pred, average='weighted')),
+                'latency_us': round(single_row_latency(flat, X_eval, latency_samples) * 1e6, 1),
+                'artifact_bytes': int(sum(getattr(flat, name).nbytes for name in FlatForest.ARRAYS)),
+                'pickle_bytes': len(pickle.dumps(forest, protocol=pickle.HIGHEST_PROTOCOL)),
+                'max_tree_depth': int(flat.max_depth),
+            })
+            forests[(count, depth)] = forest
+
+    mark_pareto(variants)
+    report = {
+        'variants': sorted(variants, key=lambda variant: (variant['artifact_bytes'], variant['latency_us'])),
+        'best_accuracy': max(variant['accuracy'] for variant in variants),
+    }
+    return report, forests
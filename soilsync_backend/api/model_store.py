@@ -0,0 +1,123 @@
+"""
+The crop model served by the API, loaded on first use.
+
+Importing this module is cheap: the model (and NumPy or sklearn with it) is
+only read the first time ``get_model()`` is called, so management commands,
+migrations and the shell don't pay for it. Under a pre-forking server
+api.preload calls it in the master before fork.
+
+Each process follows the active ModelVersion: when another process activates
+a new version (retraining or deploying rewrites the active model file before
+switching versions), the model is reloaded on the next prediction, so results
+are always keyed and logged under the version that produced them.
+"""
+import logging
+import os
+import threading
+from functools import partial
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# The memory-mapped artifact is preferred over the pickle
+PREFER_MODEL_ARTIFACT = getattr(settings, 'MODEL_ARTIFACT_FORMAT', 'npy') == 'npy'
+MODEL_PATH = os.path.join(settings.BASE_DIR, 'lib', 'models', 'RandomForest.pkl')
+ALTERNATIVE_MODEL_PATH = os.path.join(settings.BASE_DIR.parent, 'lib', 'models', 'RandomForest.pkl')
+
+_model = None
+_model_path = None
+_loaded = False
+_lock = threading.Lock()
+# The ModelVersion the loaded model belongs to; the model read at startup is
+# the active version's, adopted on the first check
+_UNKNOWN = object()
+_version_id = _UNKNOWN
+_failed_version_id = _UNKNOWN
+
+
+def _load():
+    from .artifacts import load_model
+    try:
+        model = load_model(MODEL_PATH, PREFER_MODEL_ARTIFACT)
+        logger.info(f"Successfully loaded model from {MODEL_PATH}")
+        return model, MODEL_PATH
+    except Exception as e:
+        logger.error(f"Error loading model from {MODEL_PATH}: {str(e)}")
+    try:
+        model = load_model(ALTERNATIVE_MODEL_PATH, PREFER_MODEL_ARTIFACT)
+        logger.info(f"Successfully loaded model from alternative path: {ALTERNATIVE_MODEL_PATH}")
+        return model, ALTERNATIVE_MODEL_PATH
+    except Exception as e:
+        logger.error(f"Error loading model from alternative path: {str(e)}")
+        return None, None
+
+
+def get_model():
+    """The active crop model, or None when no model file could be loaded"""
+    global _model, _model_path, _loaded
+    if not _loaded:
+        with _lock:
+            if not _loaded:
+                _model, _model_path = _load()
+                _loaded = True
+    return _model
+
+
+def reload_model(model_path=MODEL_PATH, version_id=_UNKNOWN):
+    """Replace the served model with the one at ``model_path``, the file of ModelVersion ``version_id``"""
+    global _model, _model_path, _loaded, _version_id
+    from .artifacts import load_model
+    model = load_model(model_path, PREFER_MODEL_ARTIFACT)
+    with _lock:
+        _model, _model_path = model, model_path
+        _version_id = version_id
+        _loaded = True
+    invalidate_predictor()
+    return model
+
+
+def get_predictor():
+    """
+    The model wrapped for the active version's inference engine, or None
+    when no model is loaded. The 'sklearn' engine unpickles the model when
+    the served one was loaded from its artifact.
+    """
+    global _version_id, _failed_version_id
+    model = get_model()
+    if model is None:
+        return None
+    from .inference import predictor_cache
+    version_id = predictor_cache.active_version()
+    if _version_id is _UNKNOWN:
+        _version_id = version_id
+    elif version_id != _version_id and version_id != _failed_version_id:
+        # Another process activated a new version and rewrote the model file
+        try:
+            model = reload_model(_model_path or MODEL_PATH, version_id)
+        except Exception as e:
+            _failed_version_id = version_id
+            logger.error(f"Error loading model version {version_id}, still serving {_version_id}: {str(e)}")
+    return predictor_cache.get(model, partial(load_pickle, _model_path))
+
+
+def load_pickle(model_path):
+    """Unpickle the sklearn model at ``model_path``"""
+    import joblib
+    logger.info(f"Loading {model_path} for the sklearn inference engine")
+    return joblib.load(model_path)
+
+
+def model_key():
+    """
+    Identifies the ModelVersion the loaded model belongs to and the model
+    object itself, so caches of prediction results can key on it.
+    """
+    from .inference import predictor_cache
+    version_id = None if _version_id is _UNKNOWN else _version_id
+    return version_id, predictor_cache.generation
+
+
+def invalidate_predictor():
+    """Re-read the active version's inference engine on the next prediction"""
+    from .inference import predictor_cache
+    predictor_cache.invalidate()
@@ -1,6 +1,10 @@
+import uuid
 from django.contrib.auth.models import AbstractUser, Group, Permission
 from django.db import models
 from django.db.models import CASCADE
+from django.db.models.functions import Lower
+from django.utils import timezone
+from .token_cache import token_user_cache
 
 class CustomUser(AbstractUser):
     ROLE_CHOICES = (
@@ -30,10 +34,13 @@ class CustomUser(AbstractUser):
         if self.is_superuser:
             self.role = 'admin'
         super().save(*args, **kwargs)
+        token_user_cache.invalidate_user(self.pk)
 
     def delete(self, *args, **kwargs):
+        user_id = self.pk
         self.soil_data.all().delete()
         super().delete(*args, **kwargs)
+        token_user_cache.invalidate_user(user_id)
 
     class Meta:
         db_table = 'custom_user'
@@ -56,14 +63,50 @@ class Dataset(models.Model):
 
     class Meta:
         db_table = 'training_dataset'
+        indexes = [
+            models.Index(fields=['label'], name='training_dataset_label_idx'),
+            models.Index(Lower('label'), name='training_dataset_label_ci_idx'),
+        ]
+
+class SoilDataQuerySet(models.QuerySet):
+    def predictions(self):
+        """App predictions and predictions reported to the dashboard"""
+        return self.exclude(source='sensor')
+
+    def sensor_readings(self):
+        return self.filter(source='sensor')
 
 class SoilData(models.Model):
+    """
+    Canonical soil reading, written once by api.ingestion whichever route it
+    arrived by: a prediction made by the API, a sensor reading, or a
+    prediction the app reported to the dashboard. Sensor readings have no
+    ``prediction``; their recommendation is a dashboard CropRecommendation.
+    """
+    SOURCE_CHOICES = (
+        ('app', 'App prediction'),
+        ('sensor', 'Sensor reading'),
+        ('report', 'Reported prediction'),
+    )
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default='app')
+    # Reported predictions may come from an unknown user
     user = models.ForeignKey(
         CustomUser,
         on_delete=CASCADE,
         related_name='soil_data',
-        db_index=True
+        db_index=True,
+        null=True,
+        blank=True
+    )
+    sensor = models.ForeignKey(
+        'dashboard.SensorDevice',
+        on_delete=CASCADE,
+        related_name='readings',
+        null=True,
+        blank=True
     )
+    location = models.CharField(max_length=255, blank=True, default='')
+    device_id = models.CharField(max_length=255, blank=True, default='')
     nitrogen = models.FloatField()
     phosphorus = models.FloatField()
     potassium = models.FloatField()
@@ -71,18 +114,50 @@ class SoilData(models.Model):
     humidity = models.FloatField()
     ph = models.FloatField()
     rainfall = models.FloatField()
-    prediction = models.CharField(max_length=100)
+    prediction = models.CharField(max_length=100, blank=True, default='')
     confidence = models.FloatField(null=True, blank=True)  # Store confidence level for predictions
-    created_at = models.DateTimeField(auto_now_add=True)
+    predicted_yield = models.FloatField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    objects = SoilDataQuerySet.as_manager()
+
+    # Names sensor readings had in the dashboard's former SoilData model
+    @property
+    def moisture(self):
+        return self.humidity
+
+    @property
+    def ph_level(self):
+        return self.ph
+
+    @property
+    def timestamp(self):
+        return self.created_at
 
     def __str__(self):
-        return f"{self.user.username}'s soil data - {self.created_at}"
+        owner = self.user.username if self.user else 'Unknown user'
+        return f"{owner}'s soil data - {self.created_at}"
 
     class Meta:
         db_table = 'soil_data'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='soil_data_user_created_idx'),
+            models.Index(fields=['source', '-created_at'], name='soil_data_source_created_idx'),
+            models.Index(
+                fields=['-created_at'], name='soil_data_predictions_idx', condition=~models.Q(source='sensor')
+            ),
+        ]
 
 class ModelVersion(models.Model):
+    ENGINE_CHOICES = (
+        ('sklearn', 'scikit-learn'),
+        ('flat', 'Flattened forest'),
+    )
+    ROLLOUT_CHOICES = (
+        ('shadow', 'Shadow'),
+        ('canary', 'Canary'),
+    )
     version = models.CharField(max_length=50, unique=True)
     model_path = models.CharField(max_length=500)
     dataset_size = models.IntegerField()
@@ -94,6 +169,12 @@ class ModelVersion(models.Model):
     feature_importance = models.JSONField()
     training_metrics = models.JSONField()  # Training vs validation accuracy
     is_active = models.BooleanField(default=False)
+    inference_engine = models.CharField(max_length=20, choices=ENGINE_CHOICES, default='sklearn')
+    # Evaluation on live traffic before deploying: 'shadow' scores
+    # rollout_percent % of predictions off the response path, 'canary'
+    # serves rollout_percent % of users with this version
+    rollout_mode = models.CharField(max_length=10, choices=ROLLOUT_CHOICES, blank=True, default='')
+    rollout_percent = models.FloatField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     created_by = models.ForeignKey(
         CustomUser,
@@ -107,6 +188,102 @@ class ModelVersion(models.Model):
     class Meta:
         db_table = 'model_versions'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at'], name='model_versions_active_idx', condition=models.Q(is_active=True)),
+        ]
+
+class ModelEvaluation(models.Model):
+    """
+    Live-traffic statistics of a model version in one role: 'primary' while
+    it serves a rollout's other requests, or the 'shadow' / 'canary' it is
+    being evaluated in. Counters are summed over all workers.
+    """
+    MODE_CHOICES = (
+        ('primary', 'Primary'),
+        ('shadow', 'Shadow'),
+        ('canary', 'Canary'),
+    )
+    model_version = models.ForeignKey(
+        ModelVersion,
+        on_delete=CASCADE,
+        related_name='evaluations'
+    )
+    mode = models.CharField(max_length=10, choices=MODE_CHOICES)
+    predictions = models.PositiveIntegerField(default=0)
+    # Shadow predictions compared with the prediction actually served
+    agreements = models.PositiveIntegerField(default=0)
+    errors = models.PositiveIntegerField(default=0)
+    # Shadow samples skipped because the background queue was full
+    dropped = models.PositiveIntegerField(default=0)
+    latency_total_ms = models.FloatField(default=0)
+    latency_max_ms = models.FloatField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def agreement_rate(self):
+        return self.agreements / self.predictions if self.predictions else None
+
+    @property
+    def mean_latency_ms(self):
+        return self.latency_total_ms / self.predictions if self.predictions else None
+
+    def __str__(self):
+        return f"{self.model_version.version} ({self.mode}): {self.predictions} predictions"
+
+    class Meta:
+        db_table = 'model_evaluations'
+        constraints = [
+            models.UniqueConstraint(fields=['model_version', 'mode'], name='unique_model_evaluation'),
+        ]
+
+class PredictionLog(models.Model):
+    """
+    Append-only record of one served prediction: the model version that made
+    it, the inputs, the top-k crop probabilities and the prediction latency.
+    Rows are written in batches by api.prediction_log, so ``created_at`` is
+    the time of the prediction rather than of the insert.
+    """
+    SERVED_BY_CHOICES = (
+        ('primary', 'Primary'),
+        ('canary', 'Canary'),
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='prediction_logs'
+    )
+    soil_data = models.ForeignKey(
+        SoilData,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='prediction_logs'
+    )
+    # None when the served model file has no ModelVersion record
+    model_version = models.ForeignKey(
+        ModelVersion,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='prediction_logs'
+    )
+    served_by = models.CharField(max_length=10, choices=SERVED_BY_CHOICES, default='primary')
+    inputs = models.JSONField()
+    prediction = models.CharField(max_length=100)
+    top_crops = models.JSONField()
+    latency_ms = models.FloatField()
+
+    def __str__(self):
+        return f"{self.prediction} at {self.created_at:%Y-%m-%d %H:%M:%S}"
+
+    class Meta:
+        db_table = 'prediction_logs'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at'], name='prediction_logs_created_idx'),
+            models.Index(fields=['model_version', '-created_at'], name='prediction_logs_version_idx'),
+        ]
 
 class TrainingLog(models.Model):
     model_version = models.ForeignKey(
@@ -122,4 +299,65 @@ class TrainingLog(models.Model):
 
     class Meta:
         db_table = 'training_logs'
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+
+class PredictionCounter(models.Model):
+    """Running prediction count per user and crop, kept in step with SoilData"""
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=CASCADE,
+        related_name='prediction_counters'
+    )
+    crop = models.CharField(max_length=100)
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user.username}: {self.crop} x{self.count}"
+
+    class Meta:
+        db_table = 'prediction_counters'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'crop'], name='unique_prediction_counter'),
+        ]
+
+class DatasetUpload(models.Model):
+    """
+    A dataset CSV uploaded in chunks. Received chunks are appended to a file
+    in DATASET_UPLOAD['DIR']; ``received_bytes`` is the committed length of
+    that file and ``chunk_checksums`` the SHA-256 of every chunk so far.
+    """
+    STATUS_CHOICES = (
+        ('uploading', 'Uploading'),
+        ('committed', 'Committed'),
+        ('failed', 'Failed'),
+    )
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=CASCADE,
+        related_name='dataset_uploads'
+    )
+    filename = models.CharField(max_length=255)
+    merge_mode = models.CharField(max_length=10, default='merge')
+    total_size = models.BigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    received_bytes = models.BigIntegerField(default=0)
+    chunk_checksums = models.JSONField(default=list)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading')
+    result = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Upload {self.filename} ({self.received_bytes}/{self.total_size} bytes, {self.status})"
+
+    @property
+    def total_chunks(self):
+        return max(1, -(-self.total_size // self.chunk_size))
+
+    @property
+    def next_chunk(self):
+        return len(self.chunk_checksums)
+
+    class Meta:
+        db_table = 'dataset_uploads'
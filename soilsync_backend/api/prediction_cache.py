@@ -0,0 +1,117 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+
+# Feature order of the crop model input
+FEATURES = ['nitrogen', 'phosphorus', 'potassium', 'temperature', 'humidity', 'ph', 'rainfall']
+
+# Bucket width per feature. Readings in the same bucket share one cached
+# prediction; None keeps the exact value.
+DEFAULT_QUANTIZATION = {
+    'nitrogen': 1,
+    'phosphorus': 1,
+    'potassium': 1,
+    'temperature': 0.1,
+    'humidity': 0.1,
+    'ph': 0.1,
+    'rainfall': 1,
+}
+
+
+class PredictionCache:
+    """
+    Bounded LRU of quantized soil feature vectors -> prediction result for
+    the model that produced it.
+
+    Each feature is snapped to the centre of its bucket before predicting, so
+    a cached result is exactly what a fresh prediction for that reading
+    would return, whichever request filled the entry. The cache is tied to
+    one model key (active ModelVersion and loaded model); a different key
+    empties it.
+    """
+
+    def __init__(self, ttl=600, max_entries=10000, quantization=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.quantization = dict(DEFAULT_QUANTIZATION, **(quantization or {}))
+        self._steps = [self.quantization.get(feature) for feature in FEATURES]
+        self._entries = OrderedDict()
+        self._model_key = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def quantize(self, values):
+        """(cache key, model input row) for raw feature values in FEATURES order"""
+        key, row = [], []
+        for value, step in zip(values, self._steps):
+            value = float(value)
+            if step:
+                bucket = round(value / step)
+                key.append(bucket)
+                row.append(bucket * step)
+            else:
+                key.append(value)
+                row.append(value)
+        return tuple(key), row
+
+    def get_or_compute(self, model_key, values, compute):
+        """
+        Return the cached result for ``values`` under ``model_key``, calling
+        ``compute(row)`` with the quantized row on a miss.
+        """
+        key, row = self.quantize(values)
+        now = time.monotonic()
+        with self._lock:
+            if model_key != self._model_key:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._model_key = model_key
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        result = compute(row)
+        with self._lock:
+            if model_key == self._model_key:
+                self._entries[key] = (now + self.ttl, result)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._model_key = None
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'quantization': self.quantization,
+            }
+
+
+_cache_settings = getattr(settings, 'PREDICTION_CACHE', {})
+prediction_cache = PredictionCache(
+    ttl=_cache_settings.get('TTL', 600),
+    max_entries=_cache_settings.get('SIZE', 10000),
+    quantization=_cache_settings.get('QUANTIZATION'),
+)
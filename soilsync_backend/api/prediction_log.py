@@ -0,0 +1,162 @@
+"""
+Batched writes of the PredictionLog audit trail.
+
+/api/predict/ hands every served prediction to ``prediction_log.log``,
+which only appends to an in-memory buffer; a background thread writes the
+buffer with bulk_create, so logging adds no query to the request. Entries
+still pending when the process exits are flushed by an atexit hook.
+
+An entry can outlive the rows it refers to: a user, reading or model
+version deleted while it waited has its reference cleared (as the
+SET_NULL foreign keys would have done) instead of failing the whole batch.
+"""
+import atexit
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db import IntegrityError, connection
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionLogBuffer:
+    """
+    Buffers PredictionLog rows in memory and writes them with bulk_create
+    from a background thread, once ``batch_size`` rows are pending or the
+    oldest is ``max_delay`` seconds old. The writer exits when the buffer is
+    empty and is restarted by the next entry.
+
+    At most ``max_pending`` rows are held, counting a batch being written.
+    When the buffer is full ``log`` waits up to ``block_seconds`` for a
+    write to finish, slowing callers down to the database's pace, and drops
+    the entry (counted in ``dropped``) if there is still no room.
+    """
+
+    def __init__(self, max_pending=10000, batch_size=500, max_delay=1.0, block_seconds=0.05, enabled=True):
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.block_seconds = block_seconds
+        self.enabled = enabled
+        self._pending = []
+        self._writing = 0
+        self._oldest = None
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._writer = None
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def log(self, **fields):
+        """Queue one PredictionLog row; False when it was dropped"""
+        if not self.enabled:
+            return False
+        from .models import PredictionLog
+        fields.setdefault('created_at', timezone.now())
+        entry = PredictionLog(**fields)
+        with self._condition:
+            if not self._has_room():
+                self._condition.notify_all()
+                if not self._condition.wait_for(self._has_room, self.block_seconds):
+                    self.dropped += 1
+                    return False
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending.append(entry)
+            if len(self._pending) >= self.batch_size:
+                self._condition.notify_all()
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._run, name='prediction-log-writer', daemon=True)
+                self._writer.start()
+        return True
+
+    def _has_room(self):
+        return len(self._pending) + self._writing < self.max_pending
+
+    def flush(self):
+        """Write everything pending on the calling thread; returns rows written"""
+        from .models import PredictionLog
+        with self._flush_lock:
+            with self._condition:
+                rows, self._pending, self._oldest = self._pending, [], None
+                self._writing = len(rows)
+            if not rows:
+                return 0
+            try:
+                try:
+                    PredictionLog.objects.bulk_create(rows, batch_size=self.batch_size)
+                except IntegrityError:
+                    cleared = self._clear_missing_references(rows)
+                    if not cleared:
+                        raise
+                    logger.warning(f'Cleared {cleared} references to deleted rows in prediction log entries')
+                    PredictionLog.objects.bulk_create(rows, batch_size=self.batch_size)
+                self.written += len(rows)
+            except Exception:
+                self.failed += len(rows)
+                raise
+            finally:
+                with self._condition:
+                    self._writing = 0
+                    self._condition.notify_all()
+            return len(rows)
+
+    def _clear_missing_references(self, rows):
+        """Null out foreign keys to rows that no longer exist; returns how many were cleared"""
+        from .models import PredictionLog
+        cleared = 0
+        for name in ('user', 'soil_data', 'model_version'):
+            field = PredictionLog._meta.get_field(name)
+            ids = {getattr(row, field.attname) for row in rows} - {None}
+            if ids:
+                ids -= set(field.related_model._default_manager.filter(pk__in=ids).values_list('pk', flat=True))
+            for row in rows:
+                if getattr(row, field.attname) in ids:
+                    setattr(row, field.attname, None)
+                    cleared += 1
+        return cleared
+
+    def _run(self):
+        try:
+            while True:
+                with self._condition:
+                    if not self._pending:
+                        self._writer = None
+                        return
+                    wait = self._oldest + self.max_delay - time.monotonic()
+                    if self._has_room() and len(self._pending) < self.batch_size and wait > 0:
+                        self._condition.wait(wait)
+                        continue
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception('Failed to write prediction log entries')
+        finally:
+            connection.close()
+
+    def stats(self):
+        with self._condition:
+            pending = len(self._pending)
+        return {
+            'enabled': self.enabled,
+            'pending': pending,
+            'writing': self._writing,
+            'max_pending': self.max_pending,
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+        }
+
+
+_log_settings = getattr(settings, 'PREDICTION_LOG', {})
+prediction_log = PredictionLogBuffer(
+    max_pending=_log_settings.get('MAX_PENDING', 10000),
+    batch_size=_log_settings.get('BATCH_SIZE', 500),
+    max_delay=_log_settings.get('MAX_FLUSH_DELAY', 1.0),
+    block_seconds=_log_settings.get('BLOCK_SECONDS', 0.05),
+    enabled=_log_settings.get('ENABLED', True),
+)
+atexit.register(prediction_log.flush)
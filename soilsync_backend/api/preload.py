@@ -0,0 +1,102 @@
+"""
+Load the read-mostly serving state once, before a pre-forking server forks.
+
+With ``preload_app = True`` (see gunicorn.conf.py) the WSGI module is
+imported in the master process, so ``preload()`` runs there: the crop model,
+its predictor, the dataset index and crop statistics are built once, and the
+workers inherit them copy-on-write instead of each loading its own copy.
+
+Two things keep the inherited pages shared:
+
+* big data lives in a handful of NumPy arrays (the model artifact is even
+  memory-mapped), so reading it bumps the refcount of one array header, not
+  of every row;
+* ``gc.freeze()`` moves everything allocated so far out of the collector's
+  generations, so a worker's garbage collections never write to the GC
+  headers of the preloaded objects.
+"""
+import gc
+import logging
+import os
+import resource
+import time
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+def preload():
+    """Build the shared serving state in this process and freeze it"""
+    start = time.perf_counter()
+    from django.urls import get_resolver
+    from . import model_store
+    from .dataset_index import dataset_index
+
+    # Import every view module now instead of on each worker's first request
+    get_resolver().url_patterns
+    loaded = []
+    if model_store.get_model() is not None:
+        loaded.append('model')
+        try:
+            model_store.get_predictor()
+            loaded.append('predictor')
+        except Exception as e:
+            logger.warning(f"Preload: predictor not built: {e}")
+    try:
+        index = dataset_index.get()
+        loaded.append(f"dataset index ({len(index.features)} rows, {len(index.stats)} crops)")
+    except Exception as e:
+        logger.warning(f"Preload: dataset index not built: {e}")
+    try:
+        from dashboard.services.crop_recommendation_service import get_recommendation_service
+        if get_recommendation_service().get_artifacts()[0] is not None:
+            loaded.append('recommendation model')
+    except Exception as e:
+        logger.warning(f"Preload: recommendation model not loaded: {e}")
+
+    # Workers must open their own database connections, never share ours
+    for connection in connections.all(initialized_only=True):
+        connection.close()
+        if hasattr(connection, 'close_pool'):
+            connection.close_pool()
+    gc.collect()
+    gc.freeze()
+    logger.info(
+        f"Preloaded {', '.join(loaded) or 'nothing'} in {time.perf_counter() - start:.2f}s; "
+        f"{gc.get_freeze_count()} objects frozen; {format_memory(memory_usage())}"
+    )
+
+
+def memory_usage(pid='self'):
+    """
+    Memory of a process in kB. ``rss`` counts every resident page;
+    ``shared`` is the part also mapped by other processes (preloaded pages
+    not yet copied); ``pss`` splits shared pages between their users, so
+    summing it over all workers gives the real total. Only ``max_rss`` is
+    available outside Linux.
+    """
+    usage = {'pid': os.getpid() if pid == 'self' else pid}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            fields = {}
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == 'kB':
+                    fields[parts[0].rstrip(':')] = int(parts[1])
+        usage['rss'] = fields.get('Rss')
+        usage['pss'] = fields.get('Pss')
+        usage['shared'] = fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0)
+        usage['private'] = fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+    except OSError:
+        pass
+    if pid == 'self':
+        usage['max_rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage
+
+
+def format_memory(usage):
+    return ' '.join(
+        f"{name}={usage[name] / 1024:.1f}MB"
+        for name in ('rss', 'pss', 'shared', 'private', 'max_rss')
+        if usage.get(name) is not None
+    )
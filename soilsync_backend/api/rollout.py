@@ -0,0 +1,229 @@
+"""
+Shadow and canary evaluation of a candidate ModelVersion on live traffic.
+
+At most one inactive version is under evaluation at a time; its
+``rollout_mode`` and ``rollout_percent`` are read from the database at most
+once per ``refresh_interval`` seconds, like the active inference engine.
+
+- shadow: ``rollout_percent`` % of predictions are scored again with the
+  candidate on a background thread, after the primary result is known. The
+  candidate's latency and whether it agreed with the served crop are
+  recorded; when the queue is full the sample is dropped, never waited for.
+- canary: ``rollout_percent`` % of users, picked by a stable hash of the
+  user id, are served by the candidate. Until the candidate is loaded (on
+  the background thread) they are served by the primary model.
+
+Counters are summed in memory and added to ModelEvaluation rows from the
+background thread every ``flush_interval`` seconds, so the request path
+never writes them.
+"""
+import hashlib
+import logging
+import random
+import threading
+import time
+from collections import namedtuple
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, wait
+from django.conf import settings
+from django.db import connection
+from .prediction_cache import prediction_cache
+
+logger = logging.getLogger(__name__)
+
+Rollout = namedtuple('Rollout', 'version_id mode percent model_path engine')
+
+COUNTERS = ('predictions', 'agreements', 'errors', 'dropped', 'latency_total_ms', 'latency_max_ms')
+
+
+def in_canary(version_id, user_id, percent):
+    """Whether ``user_id`` is among the ``percent`` % of users served by the canary"""
+    digest = hashlib.sha256(f'{version_id}:{user_id}'.encode()).digest()
+    return int.from_bytes(digest[:4], 'big') % 10000 < percent * 100
+
+
+class RolloutEvaluator:
+    def __init__(self, refresh_interval=5.0, workers=1, max_pending=100, flush_interval=10.0):
+        self.refresh_interval = refresh_interval
+        self.workers = workers
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self._rollout = None
+        self._checked_at = None
+        self._predictor = None
+        self._loading = None
+        self._counters = {}
+        self._flushed_at = time.monotonic()
+        self._flushing = False
+        self._futures = set()
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def current(self):
+        """The Rollout under evaluation, or None"""
+        now = time.monotonic()
+        if self._checked_at is None or now - self._checked_at >= self.refresh_interval:
+            from .models import ModelVersion
+            row = ModelVersion.objects.filter(
+                is_active=False, rollout_mode__in=('shadow', 'canary'), rollout_percent__gt=0
+            ).values_list('id', 'rollout_mode', 'rollout_percent', 'model_path', 'inference_engine').first()
+            rollout = Rollout(*row) if row else None
+            if rollout != self._rollout:
+                with self._lock:
+                    self._rollout = rollout
+                    self._predictor = None
+            self._checked_at = now
+        return self._rollout
+
+    def invalidate(self):
+        self._checked_at = None
+
+    def canary_predictor(self, rollout, user):
+        """The candidate's predictor when ``user`` is routed to the canary and it is loaded"""
+        if rollout is None or rollout.mode != 'canary' or not in_canary(rollout.version_id, user.pk, rollout.percent):
+            return None
+        loaded = self._predictor
+        if loaded is not None and loaded[0] == rollout:
+            return loaded[1]
+        with self._lock:
+            if self._loading == rollout:
+                return None
+            self._loading = rollout
+        self._submit(self._load, rollout)
+        return None
+
+    def shadow(self, rollout, values, served):
+        """Score a sample of predictions with the shadow candidate in the background"""
+        if rollout is None or rollout.mode != 'shadow' or random.random() * 100 >= rollout.percent:
+            return
+        _, row = prediction_cache.quantize(values)
+        with self._lock:
+            if len(self._futures) >= self.max_pending:
+                self._add(rollout.version_id, 'shadow', dropped=1)
+                return
+        self._submit(self._score_shadow, rollout, row, served)
+
+    def timed(self, version_id, mode, predict, row):
+        """``predict(row)``, recording its latency for ``version_id`` in ``mode``"""
+        start = time.perf_counter()
+        try:
+            result = predict(row)
+        except Exception:
+            self.record(version_id, mode, errors=1)
+            raise
+        self.record(version_id, mode, predictions=1, latency=time.perf_counter() - start)
+        return result
+
+    def record(self, version_id, mode, predictions=0, agreements=0, errors=0, latency=None):
+        if version_id is None:
+            return
+        self._add(version_id, mode, predictions=predictions, agreements=agreements, errors=errors, latency=latency)
+        if time.monotonic() - self._flushed_at >= self.flush_interval:
+            with self._lock:
+                if self._flushing:
+                    return
+                self._flushing = True
+            self._submit(self._flush_in_background)
+
+    def _add(self, version_id, mode, latency=None, **counts):
+        with self._lock:
+            counters = self._counters.setdefault((version_id, mode), dict.fromkeys(COUNTERS, 0))
+            for name, count in counts.items():
+                counters[name] += count
+            if latency is not None:
+                latency_ms = latency * 1000
+                counters['latency_total_ms'] += latency_ms
+                counters['latency_max_ms'] = max(counters['latency_max_ms'], latency_ms)
+
+    def _submit(self, fn, *args):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='model-rollout')
+            future = self._executor.submit(fn, *args)
+            self._futures.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            self._futures.discard(future)
+        if future.exception() is not None:
+            logger.error('Model rollout task failed', exc_info=future.exception())
+
+    def _load(self, rollout):
+        loaded = self._predictor
+        if loaded is not None and loaded[0] == rollout:
+            return loaded[1]
+        from .artifacts import load_model
+        from .inference import build_predictor
+        from .model_store import PREFER_MODEL_ARTIFACT, load_pickle
+        try:
+            predictor = build_predictor(
+                load_model(rollout.model_path, PREFER_MODEL_ARTIFACT), rollout.engine,
+                partial(load_pickle, rollout.model_path)
+            )
+        finally:
+            with self._lock:
+                if self._loading == rollout:
+                    self._loading = None
+        with self._lock:
+            if self._rollout == rollout:
+                self._predictor = (rollout, predictor)
+        logger.info(f'Loaded {rollout.mode} candidate model {rollout.model_path}')
+        return predictor
+
+    def _score_shadow(self, rollout, row, served):
+        import numpy as np
+        try:
+            predictor = self._load(rollout)
+            start = time.perf_counter()
+            proba = predictor.predict_proba(np.array([row]))[0]
+            latency = time.perf_counter() - start
+        except Exception:
+            self.record(rollout.version_id, 'shadow', errors=1)
+            raise
+        prediction = str(predictor.classes_[proba.argmax()])
+        self.record(
+            rollout.version_id, 'shadow', predictions=1, agreements=int(prediction == served), latency=latency
+        )
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        finally:
+            connection.close()
+
+    def flush(self):
+        """Add the counters gathered since the last flush to ModelEvaluation"""
+        from django.db.models import F
+        from django.db.models.functions import Greatest
+        from .models import ModelEvaluation
+        with self._lock:
+            counters, self._counters = self._counters, {}
+            self._flushed_at = time.monotonic()
+            self._flushing = False
+        for (version_id, mode), counts in counters.items():
+            try:
+                evaluation, _ = ModelEvaluation.objects.get_or_create(model_version_id=version_id, mode=mode)
+                ModelEvaluation.objects.filter(pk=evaluation.pk).update(
+                    latency_max_ms=Greatest(F('latency_max_ms'), counts['latency_max_ms']),
+                    **{name: F(name) + counts[name] for name in COUNTERS if name != 'latency_max_ms'}
+                )
+            except Exception:
+                logger.exception(f'Failed to save {mode} evaluation of model version {version_id}')
+        return len(counters)
+
+    def join(self, timeout=None):
+        """Wait for the background tasks submitted so far"""
+        with self._lock:
+            futures = list(self._futures)
+        wait(futures, timeout=timeout)
+
+
+_rollout_settings = getattr(settings, 'MODEL_ROLLOUT', {})
+model_rollout = RolloutEvaluator(
+    refresh_interval=_rollout_settings.get('REFRESH_SECONDS', 5.0),
+    workers=_rollout_settings.get('WORKERS', 1),
+    max_pending=_rollout_settings.get('MAX_PENDING', 100),
+    flush_interval=_rollout_settings.get('FLUSH_SECONDS', 10.0),
+)
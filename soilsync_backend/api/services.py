@@ -0,0 +1,42 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from .models import PredictionCounter
+
+
+def record_prediction(user, crop):
+    """Increment the user's counter for ``crop``. Call inside the transaction that saves the SoilData row."""
+    updated = PredictionCounter.objects.filter(user=user, crop=crop).update(count=F('count') + 1)
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            PredictionCounter.objects.create(user=user, crop=crop, count=1)
+    except IntegrityError:
+        # Another request created the counter first
+        PredictionCounter.objects.filter(user=user, crop=crop).update(count=F('count') + 1)
+
+
+def forget_prediction(user, crop):
+    """Decrement the user's counter for ``crop`` after a SoilData row is removed or relabelled"""
+    PredictionCounter.objects.filter(user=user, crop=crop, count__gt=0).update(count=F('count') - 1)
+
+
+def get_user_profile(user):
+    """Profile fields plus prediction statistics, read from the per-user counters in one query"""
+    counters = list(
+        PredictionCounter.objects.filter(user=user, count__gt=0).order_by('-count', 'crop').values_list('crop', 'count')
+    )
+    return {
+        'username': user.username,
+        'email': user.email,
+        'first_name': user.first_name or '',
+        'last_name': user.last_name or '',
+        'farm_name': user.farm_name or '',
+        'farm_size': user.farm_size or '',
+        'role': user.role,
+        'date_joined': user.date_joined,
+        'total_predictions': sum(count for _, count in counters),
+        'most_predicted_crop': counters[0][0] if counters else 'None',
+        'phone': user.phone or '',
+        'location': user.location or '',
+    }
@@ -1,3 +1,890 @@
-from django.test import TestCase
+import hashlib
+import importlib
+import joblib
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from unittest import mock, skipUnless
+import numpy as np
+import pandas as pd
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+from django.db.models import Count
+from django.db.models.functions import Lower
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+import httpx
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.dummy import DummyClassifier
+from . import chunked_upload, model_store
+from .artifacts import (
+    ArtifactError, artifact_dir_for, export_artifact, install_artifact, load_artifact, load_model, source_fingerprint
+)
+from .authentication import CachedJWTAuthentication, check_credentials, find_user
+from .dataset_import import validate_dataset
+from .dataset_index import DatasetIndex, DatasetIndexCache, dataset_index
+from .inference import FlatForest, build_predictor, predictor_cache
+from .model_size import mark_pareto, size_report, smallest_within, truncate_forest
+from .ingestion import report_prediction, save_prediction
+from .models import SoilData, Dataset, ModelEvaluation, ModelVersion, PredictionCounter, PredictionLog
+from .prediction_cache import PredictionCache, prediction_cache
+from .prediction_log import PredictionLogBuffer
+from .rollout import RolloutEvaluator, in_canary
+from .services import get_user_profile
+from .token_cache import TokenUserCache, token_user_cache
+from .tuning import candidate_params, search
 
-# Create your tests here.
+User = get_user_model()
+
+
+class QueryPlanAssertionsMixin:
+    """
+    EXPLAIN-based checks for hot queries. A plan regresses when SQLite has to
+    scan the whole table or sort the result in a temporary B-tree instead of
+    walking an index.
+    """
+
+    def assertUsesIndex(self, queryset, index_name=None):
+        plan = queryset.explain()
+        full_scans = [
+            line for line in plan.splitlines()
+            if re.search(r'\bSCAN \S+$', line.strip())
+        ]
+        self.assertFalse(full_scans, f"Full table scan in plan:\n{plan}")
+        self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan, f"Unindexed sort in plan:\n{plan}")
+        if index_name:
+            self.assertIn(index_name, plan)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Query plan assertions are written against SQLite EXPLAIN output')
+class HotQueryPlanTests(QueryPlanAssertionsMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='farmer', password='testpass123')
+
+    def test_soil_data_by_user_newest_first(self):
+        queryset = SoilData.objects.filter(user=self.user).order_by('-created_at')
+        self.assertUsesIndex(queryset, 'soil_data_user_created_idx')
+
+    def test_soil_data_by_user_since(self):
+        queryset = SoilData.objects.filter(user=self.user, created_at__gte='2025-01-01').order_by('created_at')
+        self.assertUsesIndex(queryset, 'soil_data_user_created_idx')
+
+    def test_dataset_by_label(self):
+        queryset = Dataset.objects.filter(label='rice')
+        self.assertUsesIndex(queryset, 'training_dataset_label_idx')
+
+    def test_dataset_by_label_case_insensitive(self):
+        queryset = Dataset.objects.alias(label_lower=Lower('label')).filter(label_lower='rice')
+        self.assertUsesIndex(queryset, 'training_dataset_label_ci_idx')
+
+    def test_active_model_version(self):
+        queryset = ModelVersion.objects.filter(is_active=True)
+        self.assertUsesIndex(queryset, 'model_versions_active_idx')
+
+
+FEATURES = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+
+
+def make_training_data(n=400, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.uniform([0, 5, 5, 8, 14, 3.5, 20], [140, 145, 205, 43, 99, 9.9, 298], size=(n, 7))
+    y = rng.choice(['rice', 'maize', 'coffee', 'jute', 'mango'], size=n)
+    return pd.DataFrame(X, columns=FEATURES), y
+
+
+class FlatForestTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.X, y = make_training_data()
+        cls.model = RandomForestClassifier(n_estimators=15, random_state=0).fit(cls.X, y)
+        cls.flat = FlatForest(cls.model)
+
+    def test_matches_predict_proba_exactly(self):
+        np.testing.assert_array_equal(self.flat.predict_proba(self.X.to_numpy()), self.model.predict_proba(self.X))
+
+    def test_matches_on_threshold_probes(self):
+        probes = self.flat.probe_inputs()
+        expected = self.model.predict_proba(pd.DataFrame(probes, columns=FEATURES))
+        np.testing.assert_array_equal(self.flat.predict_proba(probes), expected)
+
+    def test_single_sample(self):
+        row = self.X.iloc[:1]
+        np.testing.assert_array_equal(self.flat.predict_proba(row.to_numpy()[0]), self.model.predict_proba(row))
+        self.assertEqual(self.flat.predict(row.to_numpy())[0], self.model.predict(row)[0])
+
+    def test_build_predictor(self):
+        self.assertIsInstance(build_predictor(self.model, 'flat'), FlatForest)
+        self.assertIs(build_predictor(self.model, 'sklearn'), self.model)
+        baseline = DummyClassifier().fit(self.X, self.model.predict(self.X))
+        self.assertIs(build_predictor(baseline, 'flat'), baseline)
+
+    def test_sklearn_engine_unpickles_artifact_models(self):
+        self.assertIs(build_predictor(self.flat, 'sklearn', lambda: self.model), self.model)
+        self.assertIs(build_predictor(self.flat, 'flat', lambda: self.model), self.flat)
+
+
+
+class ModelArtifactTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.X, y = make_training_data()
+        cls.model = RandomForestClassifier(n_estimators=10, random_state=0).fit(cls.X, y)
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = os.path.join(tmp.name, 'RandomForest_artifact')
+        self.manifest = export_artifact(self.model, self.directory)
+
+    def test_round_trip_is_exact_and_memory_mapped(self):
+        forest = load_artifact(self.directory)
+        self.assertIsInstance(forest.value, np.memmap)
+        self.assertEqual(list(forest.classes_), list(self.model.classes_))
+        np.testing.assert_array_equal(forest.predict_proba(self.X.to_numpy()), self.model.predict_proba(self.X))
+
+    def test_manifest(self):
+        self.assertEqual(self.manifest['feature_names'], FEATURES)
+        self.assertEqual(self.manifest['n_trees'], 10)
+        self.assertEqual(sorted(self.manifest['arrays']), sorted(FlatForest.ARRAYS))
+
+    def test_rejects_mismatched_arrays(self):
+        manifest_path = os.path.join(self.directory, 'manifest.json')
+        self.manifest['arrays']['value']['shape'][0] += 1
+        with open(manifest_path, 'w') as f:
+            json.dump(self.manifest, f)
+        with self.assertRaises(ArtifactError):
+            load_artifact(self.directory)
+
+    def test_rejects_unknown_format(self):
+        manifest_path = os.path.join(self.directory, 'manifest.json')
+        with open(manifest_path, 'w') as f:
+            json.dump(dict(self.manifest, format_version=99), f)
+        with self.assertRaises(ArtifactError):
+            load_artifact(self.directory)
+
+    def test_artifact_is_only_used_for_its_own_pickle(self):
+        model_path = os.path.join(os.path.dirname(self.directory), 'RandomForest.pkl')
+        joblib.dump(self.model, model_path)
+        # Exported without a source fingerprint
+        self.assertIsInstance(load_model(model_path), RandomForestClassifier)
+        export_artifact(self.model, self.directory, model_path)
+        self.assertIsInstance(load_model(model_path), FlatForest)
+        os.utime(model_path, ns=(0, 0))
+        self.assertIsInstance(load_model(model_path), FlatForest)
+        joblib.dump(RandomForestClassifier(n_estimators=2, random_state=0).fit(self.X, self.model.predict(self.X)), model_path)
+        self.assertIsInstance(load_model(model_path), RandomForestClassifier)
+
+    def test_install_copies_matching_artifact(self):
+        root = os.path.dirname(self.directory)
+        source_path, target_path = os.path.join(root, 'RandomForest_v1.pkl'), os.path.join(root, 'active.pkl')
+        joblib.dump(self.model, source_path)
+        export_artifact(self.model, artifact_dir_for(source_path), source_path)
+        shutil.copy(source_path, target_path)
+        manifest = install_artifact(source_path, target_path)
+        self.assertEqual(manifest['source'], source_fingerprint(target_path))
+        self.assertIsInstance(load_model(target_path), FlatForest)
+
+
+class PredictEngineTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='farmer', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        predictor_cache.invalidate()
+        prediction_cache.clear()
+        self.addCleanup(predictor_cache.invalidate)
+        self.addCleanup(prediction_cache.clear)
+        patcher = mock.patch('api.views.prediction_log', PredictionLogBuffer(enabled=False))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def predict(self):
+        response = self.client.post('/api/predict/', {
+            'nitrogen': 90, 'phosphorus': 42, 'potassium': 43, 'temperature': 20.8,
+            'humidity': 82.0, 'ph': 6.5, 'rainfall': 202.9,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data
+
+    @skipUnless(model_store.get_model() is not None, 'RandomForest.pkl is not available')
+    def test_engines_agree(self):
+        version = ModelVersion.objects.create(
+            version='v1', model_path='RandomForest.pkl', dataset_size=0, accuracy=1, precision=1,
+            recall=1, f1_score=1, confusion_matrix={}, feature_importance={}, training_metrics={},
+            is_active=True, created_by=self.user
+        )
+        sklearn_result = self.predict()
+        self.assertIsInstance(model_store.get_predictor(), RandomForestClassifier)
+
+        version.inference_engine = 'flat'
+        version.save()
+        predictor_cache.invalidate()
+        prediction_cache.clear()
+        flat_result = self.predict()
+        self.assertIsInstance(model_store.get_predictor(), FlatForest)
+
+        self.assertEqual(flat_result['prediction'], sklearn_result['prediction'])
+        self.assertEqual(flat_result['top_crops'], sklearn_result['top_crops'])
+
+    @skipUnless(model_store.get_model() is not None, 'RandomForest.pkl is not available')
+    def test_model_follows_the_active_version(self):
+        model_store.get_predictor()
+        model = model_store.get_model()
+        # Activated by another process, which rewrote the model file
+        version = ModelVersion.objects.create(
+            version='v1', model_path='RandomForest.pkl', dataset_size=0, accuracy=1, precision=1,
+            recall=1, f1_score=1, confusion_matrix={}, feature_importance={}, training_metrics={},
+            is_active=True, created_by=self.user
+        )
+        predictor_cache.invalidate()
+        self.predict()
+        self.assertIsNot(model_store.get_model(), model)
+        self.assertEqual(model_store.model_key()[0], version.pk)
+
+    def test_only_admins_set_the_engine(self):
+        version = ModelVersion.objects.create(
+            version='v1', model_path='RandomForest.pkl', dataset_size=0, accuracy=1, precision=1,
+            recall=1, f1_score=1, confusion_matrix={}, feature_importance={}, training_metrics={},
+            created_by=self.user
+        )
+        url = f'/api/models/{version.pk}/engine/'
+        self.assertEqual(self.client.post(url, {'engine': 'flat'}, format='json').status_code, 403)
+        version.refresh_from_db()
+        self.assertEqual(version.inference_engine, 'sklearn')
+        self.client.force_authenticate(User.objects.create_user(username='admin', password='testpass123', role='admin'))
+        self.assertEqual(self.client.post(url, {'engine': 'flat'}, format='json').status_code, 200)
+        version.refresh_from_db()
+        self.assertEqual(version.inference_engine, 'flat')
+
+    @skipUnless(model_store.get_model() is not None, 'RandomForest.pkl is not available')
+    def test_repeat_prediction_is_cached(self):
+        before = prediction_cache.stats()
+        first = self.predict()
+        second = self.predict()
+        self.assertEqual(first['top_crops'], second['top_crops'])
+        after = prediction_cache.stats()
+        self.assertEqual(after['hits'] - before['hits'], 1)
+        self.assertEqual(after['misses'] - before['misses'], 1)
+
+
+@skipUnless(model_store.get_model() is not None, 'RandomForest.pkl is not available')
+class ModelRolloutTests(TestCase):
+    READING = {
+        'nitrogen': 90, 'phosphorus': 42, 'potassium': 43, 'temperature': 20.8,
+        'humidity': 82.0, 'ph': 6.5, 'rainfall': 202.9,
+    }
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='testpass123', role='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        # A candidate that always answers 'mango', so who served a request is visible
+        X, y = make_training_data()
+        candidate_path = os.path.join(tmp.name, 'RandomForest_candidate.pkl')
+        joblib.dump(DummyClassifier(strategy='constant', constant='mango').fit(X, y), candidate_path)
+        fields = dict(
+            dataset_size=0, accuracy=1, precision=1, recall=1, f1_score=1, confusion_matrix={},
+            feature_importance={}, training_metrics={}, created_by=self.admin
+        )
+        self.active = ModelVersion.objects.create(version='v1', model_path='RandomForest.pkl', is_active=True, **fields)
+        self.candidate = ModelVersion.objects.create(version='v2', model_path=candidate_path, **fields)
+
+        self.rollout = RolloutEvaluator(refresh_interval=0, flush_interval=3600)
+        for name, value in (('model_rollout', self.rollout), ('prediction_log', PredictionLogBuffer(enabled=False))):
+            patcher = mock.patch(f'api.views.{name}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for cache in (predictor_cache, prediction_cache):
+            cache_reset = cache.invalidate if cache is predictor_cache else cache.clear
+            cache_reset()
+            self.addCleanup(cache_reset)
+
+    def start(self, mode, percent=100):
+        response = self.client.post(
+            f'/api/models/{self.candidate.id}/rollout/', {'mode': mode, 'percent': percent}, format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+
+    def predict(self):
+        response = self.client.post('/api/predict/', self.READING, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data['prediction']
+
+    def evaluation(self, version, mode):
+        self.rollout.join()
+        self.rollout.flush()
+        return ModelEvaluation.objects.get(model_version=version, mode=mode)
+
+    def test_shadow_scores_in_background_and_records_agreement(self):
+        self.start('shadow')
+        served = [self.predict(), self.predict()]
+        self.assertNotIn('mango', served)
+        shadow = self.evaluation(self.candidate, 'shadow')
+        self.assertEqual((shadow.predictions, shadow.agreements, shadow.errors), (2, 0, 0))
+        self.assertEqual(shadow.agreement_rate, 0)
+        self.assertGreater(shadow.latency_max_ms, 0)
+        # The second reading was a prediction cache hit
+        self.assertEqual(ModelEvaluation.objects.get(model_version=self.active, mode='primary').predictions, 1)
+
+    def test_canary_user_is_served_by_candidate_once_loaded(self):
+        self.start('canary')
+        # The first request only starts loading the candidate
+        self.assertNotEqual(self.predict(), 'mango')
+        self.rollout.join()
+        self.assertEqual(self.predict(), 'mango')
+        self.assertEqual(self.evaluation(self.candidate, 'canary').predictions, 1)
+
+    def test_canary_share_is_stable_per_user(self):
+        routed = [in_canary(self.candidate.id, user_id, 20) for user_id in range(2000)]
+        self.assertAlmostEqual(sum(routed) / len(routed), 0.2, delta=0.03)
+        self.assertEqual(routed, [in_canary(self.candidate.id, user_id, 20) for user_id in range(2000)])
+
+    def test_rollout_endpoints(self):
+        response = self.client.post(f'/api/models/{self.active.id}/rollout/', {'mode': 'shadow'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.start('canary', 25)
+        rollout = self.client.get('/api/models/rollout/').data['rollout']
+        self.assertEqual((rollout['version'], rollout['mode'], rollout['percent']), ('v2', 'canary', 25))
+        self.start('off')
+        self.assertIsNone(self.client.get('/api/models/rollout/').data['rollout'])
+        self.assertIsNone(self.rollout.current())
+
+
+class PredictionLogTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='farmer', password='testpass123')
+        # The writer thread never fires on its own; tests flush on this thread
+        self.buffer = PredictionLogBuffer(max_pending=3, batch_size=100, max_delay=3600, block_seconds=0.01)
+
+    def entry(self, **fields):
+        return dict(dict(
+            user=self.user, served_by='primary', inputs={'nitrogen': 90}, prediction='rice',
+            top_crops=[{'label': 'rice', 'confidence': 0.9}], latency_ms=1.5
+        ), **fields)
+
+    def test_entries_are_written_in_one_batch(self):
+        for crop in ('rice', 'maize'):
+            self.assertTrue(self.buffer.log(**self.entry(prediction=crop)))
+        self.assertEqual(PredictionLog.objects.count(), 0)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(sorted(PredictionLog.objects.values_list('prediction', flat=True)), ['maize', 'rice'])
+        self.assertEqual(self.buffer.stats()['written'], 2)
+
+    def test_full_buffer_drops_while_writer_is_busy(self):
+        release = threading.Event()
+        with mock.patch.object(PredictionLog.objects, 'bulk_create', side_effect=lambda *args, **kwargs: release.wait(5)):
+            for _ in range(3):
+                self.assertTrue(self.buffer.log(**self.entry()))
+            # Full: the writer takes the batch, but it is still being written
+            self.assertFalse(self.buffer.log(**self.entry()))
+            release.set()
+            self.buffer._writer.join(5)
+        stats = self.buffer.stats()
+        self.assertEqual((stats['written'], stats['dropped'], stats['pending']), (3, 1, 0))
+        self.assertTrue(self.buffer.log(**self.entry()))
+
+    @skipUnless(model_store.get_model() is not None, 'RandomForest.pkl is not available')
+    def test_prediction_is_logged_with_top_crops(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        prediction_cache.clear()
+        self.addCleanup(prediction_cache.clear)
+        with mock.patch('api.views.prediction_log', self.buffer):
+            response = client.post('/api/predict/', {
+                'nitrogen': 90, 'phosphorus': 42, 'potassium': 43, 'temperature': 20.8,
+                'humidity': 82.0, 'ph': 6.5, 'rainfall': 202.9,
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.buffer.flush()
+        entry = PredictionLog.objects.get()
+        self.assertEqual(entry.prediction, response.data['prediction'])
+        self.assertEqual(entry.top_crops, response.data['top_crops'])
+        self.assertEqual(entry.soil_data_id, response.data['data']['id'])
+        self.assertEqual(entry.inputs['rainfall'], 202.9)
+        self.assertGreater(entry.latency_ms, 0)
+
+
+class PredictionLogReferenceTests(TransactionTestCase):
+    def test_entries_for_deleted_rows_are_kept_without_the_reference(self):
+        buffer = PredictionLogBuffer(batch_size=100, max_delay=3600)
+        kept, deleted = (User.objects.create_user(username=name, password='testpass123') for name in ('farmer', 'gone'))
+        for user in (kept, deleted):
+            buffer.log(user_id=user.pk, served_by='primary', inputs={}, prediction='rice', top_crops=[], latency_ms=1.0)
+        # Deleted by another request while its entry was pending
+        User.objects.filter(pk=deleted.pk).delete()
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(
+            sorted(PredictionLog.objects.values_list('user_id', flat=True), key=str), [kept.pk, None]
+        )
+        self.assertEqual((buffer.stats()['written'], buffer.stats()['failed']), (2, 0))
+
+
+class DatasetIndexTests(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        Dataset.objects.bulk_create([
+            Dataset(
+                nitrogen=n, phosphorus=p, potassium=k, temperature=t, humidity=h, ph=ph, rainfall=r,
+                label=['rice', 'Maize', 'maize'][i % 3]
+            )
+            for i, (n, p, k, t, h, ph, r) in enumerate(rng.uniform(0, 100, size=(60, 7)).tolist())
+        ])
+        user = User.objects.create_user(username='farmer', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        dataset_index.invalidate()
+        self.addCleanup(dataset_index.invalidate)
+
+    def test_statistics_match_database_aggregates(self):
+        from django.db.models import Avg, Max, Min
+        index = DatasetIndex.from_database()
+        self.assertEqual(index.crops(), ['Maize', 'rice'])
+        expected = Dataset.objects.alias(label_lower=Lower('label')).filter(label_lower='maize').aggregate(
+            low=Min('ph'), high=Max('ph'), mean=Avg('ph')
+        )
+        stats = index.crop_statistics('MAIZE')
+        self.assertEqual(stats['sample_size'], 40)
+        self.assertEqual((stats['ph_min'], stats['ph_max']), (expected['low'], expected['high']))
+        self.assertEqual(stats['ph_mean'], round(expected['mean'], 2))
+        self.assertIsNone(index.crop_statistics('wheat'))
+
+    def test_similar_cases_come_from_the_crop(self):
+        index = DatasetIndex.from_database()
+        cases = index.similar_cases('rice', 5)
+        self.assertEqual(len(cases), 5)
+        rice = set(Dataset.objects.filter(label='rice').values_list('nitrogen', flat=True))
+        self.assertTrue(all(case['label'] == 'rice' and case['nitrogen'] in rice for case in cases))
+
+    def test_rebuilt_only_when_dataset_changes(self):
+        cache = DatasetIndexCache(check_interval=0)
+        first = cache.get()
+        self.assertIs(cache.get(), first)
+        Dataset.objects.create(
+            nitrogen=1, phosphorus=1, potassium=1, temperature=1, humidity=1, ph=1, rainfall=1, label='rice'
+        )
+        self.assertEqual(cache.get().crop_statistics('rice')['sample_size'], 21)
+
+    def test_crop_soil_endpoints(self):
+        response = self.client.post('/api/crop-soil-recommendations/', {'crop': 'RICE'}, format='json')
+        self.assertEqual(response.data['recommendations']['crop'], 'RICE')
+        self.assertEqual(response.data['recommendations']['sample_size'], 20)
+        response = self.client.get('/api/all-crop-soil-recommendations/')
+        self.assertEqual(sorted(response.data['all_recommendations']), ['Maize', 'rice'])
+
+
+class DatasetUploadTests(TestCase):
+    HEADER = 'N,P,K,temperature,humidity,ph,rainfall,label\n'
+
+    def setUp(self):
+        user = User.objects.create_user(username='farmer', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        self.addCleanup(dataset_index.invalidate)
+
+    def upload(self, rows, merge_mode='merge'):
+        csv_file = SimpleUploadedFile('data.csv', (self.HEADER + rows).encode(), content_type='text/csv')
+        return self.client.post('/api/upload-csv/', {'file': csv_file, 'merge_mode': merge_mode}, format='multipart')
+
+    def test_validation_report(self):
+        df = pd.DataFrame({
+            'N': [90, 'x', None, 2000], 'P': [42] * 4, 'K': [43] * 4, 'temperature': [20.8] * 4,
+            'humidity': [82] * 4, 'ph': [6.5] * 4, 'rainfall': [202.9] * 4, 'label': [' Rice ', 'maize', 'maize', ''],
+        })
+        features, labels, report = validate_dataset(df)
+        self.assertEqual(features.tolist(), [[90, 42, 43, 20.8, 82, 6.5, 202.9]])
+        self.assertEqual(labels.tolist(), ['rice'])
+        self.assertEqual((report['valid'], report['invalid']), (1, 3))
+        self.assertEqual(report['column_errors'], {
+            'N': {'missing': 1, 'not_numeric': 1, 'out_of_range': 1}, 'label': {'missing': 1},
+        })
+        self.assertEqual([(error['line'], error['column']) for error in report['errors']],
+                         [(3, 'N'), (4, 'N'), (5, 'N'), (5, 'label')])
+
+    def test_only_valid_rows_are_inserted(self):
+        response = self.upload('90,42,43,20.8,82,6.5,202.9,Rice\n85,abc,41,21.7,80,7.0,226.6,rice\n60,55,44,23.0,82,7.8,263.9,maize\n')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual((response.data['records_added'], response.data['records_rejected']), (2, 1))
+        self.assertEqual(response.data['validation']['errors'][0]['line'], 3)
+        self.assertEqual(sorted(Dataset.objects.values_list('label', flat=True)), ['maize', 'rice'])
+
+    def test_invalid_file_keeps_existing_dataset(self):
+        self.upload('90,42,43,20.8,82,6.5,202.9,rice\n')
+        response = self.upload('90,42,43,20.8,820,6.5,202.9,rice\n', merge_mode='replace')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Dataset.objects.count(), 1)
+
+
+class ChunkedUploadTests(TestCase):
+    CSV = (
+        b'N,P,K,temperature,humidity,ph,rainfall,label\n'
+        b'90,42,43,20.8,82,6.5,202.9,rice\n'
+        b'60,55,44,23.0,82,7.8,263.9,maize\n'
+    )
+
+    def setUp(self):
+        user = User.objects.create_user(username='farmer', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = mock.patch.object(chunked_upload, 'UPLOAD_DIR', directory.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(dataset_index.invalidate)
+
+        response = self.client.post('/api/upload-csv/chunked/', {
+            'filename': 'data.csv', 'size': len(self.CSV), 'chunk_size': 32,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.url = f"/api/upload-csv/chunked/{response.data['upload_id']}/"
+        self.chunks = [self.CSV[i:i + 32] for i in range(0, len(self.CSV), 32)]
+        self.assertEqual(response.data['total_chunks'], len(self.chunks))
+
+    def put(self, index, body=None, checksum=None):
+        body = self.chunks[index] if body is None else body
+        return self.client.generic(
+            'PUT', f'{self.url}chunks/{index}/', body, content_type='application/octet-stream',
+            HTTP_X_CHUNK_SHA256=checksum or hashlib.sha256(body).hexdigest()
+        )
+
+    def test_resumed_upload_is_imported_once(self):
+        self.assertEqual(self.put(0).status_code, 200)
+        # A retried chunk is acknowledged, a skipped one is refused
+        self.assertEqual(self.put(0).data['next_chunk'], 1)
+        response = self.put(2)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.client.post(f'{self.url}commit/').status_code, 409)
+
+        status = self.client.get(self.url).data
+        self.assertEqual((status['next_chunk'], status['received_bytes']), (1, 32))
+        for index in range(status['next_chunk'], len(self.chunks)):
+            self.assertEqual(self.put(index).status_code, 200)
+
+        response = self.client.post(f'{self.url}commit/', {
+            'sha256': hashlib.sha256(self.CSV).hexdigest(),
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['records_added'], 2)
+        self.assertEqual(self.client.post(f'{self.url}commit/').data['records_added'], 2)
+        self.assertEqual(Dataset.objects.count(), 2)
+
+    def test_corrupted_chunk_is_rejected(self):
+        response = self.put(0, body=b'x' * 32, checksum=hashlib.sha256(self.chunks[0]).hexdigest())
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.client.get(self.url).data['received_bytes'], 0)
+        self.assertEqual(self.put(0, body=b'x' * 40).status_code, 413)
+
+
+class HyperparameterSearchTests(SimpleTestCase):
+    SPACE = {'n_estimators': [5, 10], 'max_depth': [None, 3], 'min_samples_leaf': [1], 'max_features': ['sqrt']}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        rng = np.random.default_rng(0)
+        cls.y = np.repeat(np.arange(3), 30)
+        cls.X = rng.normal(size=(90, 7)) + cls.y[:, np.newaxis]
+
+    def test_best_candidate_has_every_fold(self):
+        result = search(self.X, self.y, n_folds=3, search_space=self.SPACE, max_candidates=3, workers=2)
+        self.assertFalse(result['budget_exhausted'])
+        self.assertEqual(len(result['candidates']), 3)
+        best = result['best']
+        self.assertEqual([fold['fold'] for fold in best['folds']], [1, 2, 3])
+        self.assertEqual(
+            best['mean']['f1_score'],
+            max(candidate['mean']['f1_score'] for candidate in result['candidates'])
+        )
+
+    def test_exhausted_budget_selects_nothing(self):
+        result = search(self.X, self.y, n_folds=3, search_space=self.SPACE, budget_seconds=0, workers=1)
+        self.assertTrue(result['budget_exhausted'])
+        self.assertIsNone(result['best'])
+        # Abandoned fits are stopped, not left running against deleted data
+        self.assertEqual(multiprocessing.active_children(), [])
+
+    def test_candidates_are_distinct_and_bounded(self):
+        candidates = candidate_params(self.SPACE, max_candidates=10)
+        self.assertEqual(len(candidates), 4)
+        self.assertEqual(len({tuple(sorted(c.items(), key=str)) for c in candidates}), 4)
+
+
+class ModelSizeReportTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        rng = np.random.default_rng(0)
+        y = np.repeat(np.arange(3), 40)
+        X = rng.normal(size=(120, 7)) + y[:, np.newaxis]
+        cls.X_train, cls.y_train, cls.X_test, cls.y_test = X[::2], y[::2], X[1::2], y[1::2]
+        cls.params = {'n_estimators': 20}
+        cls.model = RandomForestClassifier(random_state=42, **cls.params).fit(cls.X_train, cls.y_train)
+
+    def test_report_covers_tree_counts_and_depths(self):
+        report, forests = size_report(
+            self.model, self.params, self.X_train, self.y_train, self.X_test, self.y_test,
+            tree_counts=[5, 10, 50], depths=[None, 4, 2], latency_samples=20
+        )
+        self.assertEqual(
+            {(v['n_estimators'], v['max_depth']) for v in report['variants']},
+            {(count, depth) for count in (5, 10, 20) for depth in (None, 4, 2)}
+        )
+        self.assertEqual(set(forests), {(v['n_estimators'], v['max_depth']) for v in report['variants']})
+        self.assertTrue(any(v['pareto'] for v in report['variants']))
+        smallest = report['variants'][0]
+        self.assertEqual((smallest['n_estimators'], smallest['max_depth']), (5, 2))
+        self.assertLessEqual(smallest['max_tree_depth'], 2)
+
+    def test_truncated_forest_votes_with_its_first_trees(self):
+        smaller = truncate_forest(self.model, 5)
+        self.assertEqual(len(smaller.estimators_), 5)
+        self.assertEqual(len(self.model.estimators_), 20)
+        expected = np.mean([tree.predict_proba(self.X_test) for tree in self.model.estimators_[:5]], axis=0)
+        np.testing.assert_allclose(smaller.predict_proba(self.X_test), expected)
+
+    def test_smallest_within_tolerance(self):
+        variants = mark_pareto([
+            {'accuracy': 0.99, 'latency_us': 90.0, 'artifact_bytes': 1000},
+            {'accuracy': 0.98, 'latency_us': 40.0, 'artifact_bytes': 300},
+            {'accuracy': 0.90, 'latency_us': 20.0, 'artifact_bytes': 100},
+            {'accuracy': 0.97, 'latency_us': 50.0, 'artifact_bytes': 400},
+        ])
+        self.assertEqual([v['pareto'] for v in variants], [True, True, True, False])
+        self.assertEqual(smallest_within(variants, 0.015)['artifact_bytes'], 300)
+        self.assertEqual(smallest_within(variants, 0)['artifact_bytes'], 1000)
+
+
+class PredictionCounterTests(TestCase):
+    FEATURES = {
+        'nitrogen': 90.0, 'phosphorus': 42.0, 'potassium': 43.0, 'temperature': 20.8,
+        'humidity': 82.0, 'ph': 6.5, 'rainfall': 202.9,
+    }
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='farmer', password='testpass123')
+        self.admin = User.objects.create_user(username='admin', password='testpass123', role='admin')
+        self.client.force_login(self.admin)
+
+    def assertCountersMatchRows(self):
+        rows = SoilData.objects.filter(source='app', user=self.user).order_by().values('prediction').annotate(n=Count('id'))
+        expected = {row['prediction']: row['n'] for row in rows}
+        counters = dict(
+            PredictionCounter.objects.filter(user=self.user, count__gt=0).values_list('crop', 'count')
+        )
+        self.assertEqual(counters, expected)
+        profile = get_user_profile(self.user)
+        self.assertEqual(profile['total_predictions'], sum(expected.values()))
+        self.assertEqual(
+            profile['most_predicted_crop'], max(sorted(expected), key=expected.get) if expected else 'None'
+        )
+
+    def test_counters_follow_create_edit_and_delete(self):
+        readings = [save_prediction(self.user, self.FEATURES, crop, 90.0) for crop in ('rice', 'rice', 'maize')]
+        self.assertCountersMatchRows()
+        self.client.post(f'/dashboard/edit-api-soil-data/{readings[0].pk}/', {'prediction': 'jute'})
+        self.assertCountersMatchRows()
+        self.client.post(f'/dashboard/delete-api-soil-data/{readings[1].pk}/')
+        self.assertCountersMatchRows()
+        self.client.post(f'/dashboard/delete-api-soil-data/{readings[2].pk}/')
+        self.assertCountersMatchRows()
+        self.assertEqual(get_user_profile(self.user)['most_predicted_crop'], 'jute')
+
+    def test_reports_are_not_counted(self):
+        save_prediction(self.user, self.FEATURES, 'rice', 90.0)
+        report_prediction(dict(self.FEATURES, prediction='maize', user_id='farmer'))
+        self.assertCountersMatchRows()
+        self.assertEqual(get_user_profile(self.user)['total_predictions'], 1)
+
+    def test_migration_backfill(self):
+        for crop in ('rice', 'rice', 'maize'):
+            save_prediction(self.user, self.FEATURES, crop, 90.0)
+        PredictionCounter.objects.all().delete()
+        migration = importlib.import_module('api.migrations.0010_predictioncounter')
+        state = MigrationLoader(connection).project_state(('api', '0010_predictioncounter'))
+        migration.backfill_counters(state.apps, None)
+        self.assertCountersMatchRows()
+
+
+class CredentialTests(TestCase):
+    def setUp(self):
+        self.farmer = User.objects.create_user(username='farmer', email='farm@example.com', password='testpass123')
+
+    def test_username_match_wins_over_email(self):
+        User.objects.create_user(username='other', email='farmer', password='testpass123')
+        User.objects.create_user(username='later', email='farm@example.com', password='testpass123')
+        self.assertEqual(find_user('farmer'), self.farmer)
+        # Accounts sharing an email resolve to the oldest
+        self.assertEqual(find_user('farm@example.com'), self.farmer)
+
+    def test_check_credentials(self):
+        self.assertEqual(check_credentials('farm@example.com', 'testpass123'), (self.farmer, None))
+        self.assertEqual(check_credentials('farmer', 'wrong'), (None, 'invalid_password'))
+
+    def test_unknown_user_still_hashes_once(self):
+        with mock.patch('django.contrib.auth.base_user.make_password', return_value='!') as make_password:
+            self.assertEqual(check_credentials('nobody', 'testpass123'), (None, 'not_found'))
+        make_password.assert_called_once_with('testpass123')
+
+    def test_inactive_user(self):
+        self.farmer.is_active = False
+        self.farmer.save()
+        self.assertEqual(check_credentials('farmer', 'testpass123'), (None, 'inactive'))
+        self.assertEqual(check_credentials('farmer', 'wrong'), (None, 'invalid_password'))
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='farmer', password='testpass123')
+        self.token = str(AccessToken.for_user(self.user))
+        token_user_cache.clear()
+        self.addCleanup(token_user_cache.clear)
+
+    def authenticate(self):
+        request = RequestFactory().get('/api/profile/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        return CachedJWTAuthentication().authenticate(request)
+
+    def test_cached_token_skips_user_select(self):
+        with self.assertNumQueries(1):
+            user, _ = self.authenticate()
+        with self.assertNumQueries(0):
+            cached, _ = self.authenticate()
+        self.assertEqual((cached.pk, cached.username), (user.pk, 'farmer'))
+        self.assertIsNot(cached, user)
+
+    def test_saving_or_deleting_user_invalidates(self):
+        self.authenticate()
+        self.user.location = 'Kaduna'
+        self.user.save()
+        with self.assertNumQueries(1):
+            user, _ = self.authenticate()
+        self.assertEqual(user.location, 'Kaduna')
+        self.user.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_deactivated_user_is_rejected(self):
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_entries_expire_and_evict(self):
+        cache = TokenUserCache(ttl=60, max_entries=2)
+        with mock.patch('api.token_cache.time.time', return_value=1000.0) as now:
+            cache.set('a', 'token-a', {'id': 1})
+            cache.set('b', 'token-b', {'id': 2}, token_expires_at=1010.0)
+            cache.get('a')
+            cache.set('c', 'token-c', {'id': 3})
+            self.assertIsNone(cache.get('b'))
+            now.return_value = 1059.0
+            self.assertEqual(cache.get('a'), ('token-a', {'id': 1}))
+            now.return_value = 1060.0
+            self.assertIsNone(cache.get('a'))
+        cache.set('d', 'token-d', {'id': 4})
+        cache.invalidate_user(4)
+        self.assertIsNone(cache.get('d'))
+
+
+class PredictionCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.calls = []
+        self.cache = PredictionCache(ttl=60, max_entries=2)
+
+    def compute(self, row):
+        self.calls.append(row)
+        return tuple(row)
+
+    def test_near_identical_readings_share_an_entry(self):
+        first = self.cache.get_or_compute('v1', [90, 42, 43, 20.81, 82.04, 6.52, 202.9], self.compute)
+        second = self.cache.get_or_compute('v1', [90, 42, 43, 20.79, 81.96, 6.48, 203.1], self.compute)
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(self.cache.stats()['hit_rate'], 0.5)
+
+    def test_prediction_uses_quantized_row(self):
+        self.cache.get_or_compute('v1', [90.4, 42, 43, 20.81, 82, 6.52, 202.9], self.compute)
+        np.testing.assert_allclose(self.calls[0], [90, 42, 43, 20.8, 82, 6.5, 203])
+
+    def test_model_change_invalidates(self):
+        row = [90, 42, 43, 20.8, 82, 6.5, 203]
+        self.cache.get_or_compute('v1', row, self.compute)
+        self.cache.get_or_compute('v2', row, self.compute)
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(self.cache.stats()['invalidations'], 1)
+
+    def test_lru_eviction(self):
+        for n in range(3):
+            self.cache.get_or_compute('v1', [n, 0, 0, 0, 0, 0, 0], self.compute)
+        stats = self.cache.stats()
+        self.assertEqual((stats['size'], stats['evictions']), (2, 1))
+
+
+class WeatherTests(SimpleTestCase):
+    OPEN_METEO = {'current': {'rain': 1.5, 'weather_code': 61}, 'current_units': {'time': 'iso8601'}}
+
+    def mock_clients(self):
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(200, json=self.OPEN_METEO)
+
+        real_client = httpx.AsyncClient
+        factory = mock.patch(
+            'httpx.AsyncClient', side_effect=lambda **kwargs: real_client(transport=httpx.MockTransport(handler), **kwargs)
+        )
+        return factory, requests
+
+    def test_weather(self):
+        factory, requests = self.mock_clients()
+        with factory:
+            response = self.client.get('/api/weather/', {'lat': '6.5', 'lon': '3.4'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['current_weather']['precipitation'], 1.5)
+        self.assertEqual(requests[0].url.params['latitude'], '6.5')
+
+    def test_missing_coordinates(self):
+        self.assertEqual(self.client.get('/api/weather/', {'lat': '6.5'}).status_code, 400)
+
+    async def test_asgi_requests_share_a_client(self):
+        factory, requests = self.mock_clients()
+        with factory as client_class:
+            for _ in range(2):
+                response = await self.async_client.get('/api/weather/', {'lat': '6.5', 'lon': '3.4'})
+                self.assertEqual(response.status_code, 200)
+        self.assertEqual((client_class.call_count, len(requests)), (1, 2))
+
+
+class StartupImportTests(SimpleTestCase):
+    def test_url_modules_leave_heavy_dependencies_unimported(self):
+        script = (
+            "import os, sys, django\n"
+            "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'soilsync_backend.settings')\n"
+            "django.setup()\n"
+            "from django.urls import get_resolver\n"
+            "get_resolver().url_patterns\n"
+            "print(' '.join(sorted({'numpy', 'pandas', 'sklearn', 'joblib', 'reportlab'} & set(sys.modules))))\n"
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', script], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), '')
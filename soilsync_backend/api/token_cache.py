@@ -0,0 +1,60 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+
+
+class TokenUserCache:
+    """
+    Bounded LRU of verified access tokens -> (validated token, user snapshot).
+
+    Entries expire after ``ttl`` seconds or when the token itself expires,
+    whichever comes first. The cache is per process, so invalidation only
+    reaches the worker that changed the user; the short TTL bounds how long
+    other workers can serve a stale snapshot.
+    """
+
+    def __init__(self, ttl=60, max_entries=4096):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, raw_token):
+        with self._lock:
+            entry = self._entries.get(raw_token)
+            if entry is None:
+                return None
+            deadline, validated_token, snapshot = entry
+            if deadline <= time.time():
+                del self._entries[raw_token]
+                return None
+            self._entries.move_to_end(raw_token)
+            return validated_token, snapshot
+
+    def set(self, raw_token, validated_token, snapshot, token_expires_at=None):
+        deadline = time.time() + self.ttl
+        if token_expires_at is not None:
+            deadline = min(deadline, token_expires_at)
+        with self._lock:
+            self._entries[raw_token] = (deadline, validated_token, snapshot)
+            self._entries.move_to_end(raw_token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id):
+        """Drop every cached token belonging to ``user_id``"""
+        with self._lock:
+            stale = [key for key, (_, _, snapshot) in self._entries.items() if snapshot['id'] == user_id]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_user_cache = TokenUserCache(
+    ttl=getattr(settings, 'JWT_USER_CACHE_TTL', 60),
+    max_entries=getattr(settings, 'JWT_USER_CACHE_SIZE', 4096),
+)
@@ -0,0 +1,197 @@
+"""
+Cross-validated hyperparameter search for the crop random forest.
+
+Candidates are drawn from SEARCH_SPACE and every (candidate, fold) pair is
+fitted in a process pool. The training data is written once to ``.npy``
+files that each worker opens with ``mmap_mode='r'``, so tasks carry only
+the parameters and a fold number instead of a pickled copy of the dataset.
+
+The search stops submitting work when the wall-clock budget runs out;
+candidates whose folds did not all finish are reported but never chosen.
+Workers are started with ``spawn`` and import only NumPy and sklearn, so
+nothing of the (threaded) Django process is forked.
+"""
+import itertools
+import os
+import queue
+import random
+import shutil
+import tempfile
+import time
+import multiprocessing
+import numpy as np
+
+SEARCH_SPACE = {
+    'n_estimators': [100, 200, 300],
+    'max_depth': [None, 12, 24],
+    'min_samples_leaf': [1, 2, 4],
+    'max_features': ['sqrt', 'log2', None],
+}
+
+# Metric a candidate is ranked by (mean over folds), then the tie-breakers
+SELECTION_METRIC = 'f1_score'
+
+_data = {}
+
+
+def _open_data(directory):
+    """Worker initializer: map the shared arrays read-only"""
+    for name in ('X', 'y', 'folds'):
+        _data[name] = np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+
+
+def _evaluate(params, fold, random_state):
+    """Fit one candidate on all folds but ``fold`` and score it on ``fold``"""
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.metrics import accuracy_score, f1_score, log_loss, precision_score, recall_score
+
+    X, y, folds = _data['X'], _data['y'], _data['folds']
+    train, test = folds != fold, folds == fold
+    n_classes = int(y.max()) + 1
+
+    start = time.perf_counter()
+    model = RandomForestClassifier(random_state=random_state, n_jobs=1, **params)
+    model.fit(X[train], y[train])
+    fit_seconds = time.perf_counter() - start
+
+    def probabilities(rows):
+        # Classes missing from this fold's training rows get probability 0
+        proba = np.zeros((int(rows.sum()), n_classes))
+        proba[:, model.classes_] = model.predict_proba(X[rows])
+        return proba
+
+    train_proba, test_proba = probabilities(train), probabilities(test)
+    y_train, y_test = y[train], y[test]
+    y_pred = test_proba.argmax(axis=1)
+    labels = np.arange(n_classes)
+    return {
+        'fold': fold + 1,
+        'accuracy': float(accuracy_score(y_test, y_pred)),
+        'precision': float(precision_score(y_test, y_pred, average='weighted', zero_division=0)),
+        'recall': float(recall_score(y_test, y_pred, average='weighted', zero_division=0)),
+        'f1_score': float(f1_score(y_test, y_pred, average='weighted', zero_division=0)),
+        'train_accuracy': float(accuracy_score(y_train, train_proba.argmax(axis=1))),
+        'train_loss': float(log_loss(y_train, train_proba, labels=labels)),
+        'val_loss': float(log_loss(y_test, test_proba, labels=labels)),
+        'fit_seconds': round(fit_seconds, 3),
+    }
+
+
+def candidate_params(search_space=None, max_candidates=12, random_state=42):
+    """Up to ``max_candidates`` distinct points of the grid in random order"""
+    space = search_space or SEARCH_SPACE
+    names = sorted(space)
+    grid = [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+    random.Random(random_state).shuffle(grid)
+    return grid[:max_candidates]
+
+
+def _summary(params, folds):
+    complete = sorted(folds, key=lambda fold: fold['fold'])
+    mean = {
+        metric: float(np.mean([fold[metric] for fold in complete]))
+        for metric in ('accuracy', 'precision', 'recall', 'f1_score', 'train_accuracy', 'train_loss', 'val_loss')
+    } if complete else {}
+    return {'params': params, 'folds': complete, 'mean': mean}
+
+
+def search(X, y, n_folds=5, search_space=None, max_candidates=12, budget_seconds=120,
+           workers=None, random_state=42):
+    """
+    Cross-validate candidates from ``search_space`` on (X, y) with
+    ``y`` label-encoded as 0..n_classes-1.
+
+    Returns a dict with the ``best`` candidate (params, per-fold metrics and
+    their means), every evaluated ``candidates`` entry, ``elapsed`` seconds
+    and whether the ``budget_exhausted`` before all folds ran.
+    """
+    from sklearn.model_selection import StratifiedKFold
+
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    y = np.ascontiguousarray(y, dtype=np.int64)
+    folds = np.empty(len(y), dtype=np.int8)
+    splitter = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=random_state)
+    for fold, (_, test) in enumerate(splitter.split(X, y)):
+        folds[test] = fold
+
+    candidates = candidate_params(search_space, max_candidates, random_state)
+    tasks = [(index, fold) for index in range(len(candidates)) for fold in range(n_folds)]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(tasks)))
+    results = {index: [] for index in range(len(candidates))}
+
+    directory = tempfile.mkdtemp(prefix='soilsync_tuning_')
+    start = time.monotonic()
+    deadline = start + budget_seconds
+    budget_exhausted = False
+    try:
+        for name, array in (('X', X), ('y', y), ('folds', folds)):
+            np.save(os.path.join(directory, f'{name}.npy'), array)
+        pool = multiprocessing.get_context('spawn').Pool(
+            workers, initializer=_open_data, initargs=(directory,)
+        )
+        completed = queue.Queue()
+
+        def submit(index, fold):
+            pool.apply_async(
+                _evaluate, (candidates[index], fold, random_state),
+                callback=lambda result: completed.put((index, result, None)),
+                error_callback=lambda error: completed.put((index, None, error)),
+            )
+
+        try:
+            backlog = iter(tasks)
+            running = 0
+            # Keep at most two tasks per worker queued so the budget can stop
+            # the search without a backlog of already-submitted fits
+            for index, fold in itertools.islice(backlog, workers * 2):
+                submit(index, fold)
+                running += 1
+            while running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    budget_exhausted = True
+                    break
+                try:
+                    index, result, error = completed.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+                running -= 1
+                if error is not None:
+                    raise error
+                results[index].append(result)
+                task = next(backlog, None)
+                if task is not None:
+                    submit(*task)
+                    running += 1
+        finally:
+            if budget_exhausted:
+                # Fits still running past the budget are abandoned, not
+                # awaited: their workers are stopped before the data
+                # directory is removed from under them
+                pool.terminate()
+            else:
+                pool.close()
+            pool.join()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    summaries = [_summary(candidates[index], folds_done) for index, folds_done in results.items()]
+    complete = [summary for summary in summaries if len(summary['folds']) == n_folds]
+    best = max(
+        complete,
+        key=lambda summary: (
+            summary['mean'][SELECTION_METRIC],
+            summary['mean']['accuracy'],
+            -summary['params']['n_estimators'],
+        ),
+        default=None
+    )
+    return {
+        'best': best,
+        'candidates': summaries,
+        'n_folds': n_folds,
+        'workers': workers,
+        'elapsed': round(time.monotonic() - start, 2),
+        'budget_seconds': budget_seconds,
+        'budget_exhausted': budget_exhausted,
+    }
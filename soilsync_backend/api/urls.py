@@ -5,13 +5,23 @@ from .views import (
     PredictSoilView,
     ListUsersView,
     ListDatasetView,
-    WeatherView,
+    weather,
     root_view,
     retrain_model,
     get_model_versions,
     get_model_details,
     deploy_model,
+    set_inference_engine,
+    get_model_rollout,
+    set_model_rollout,
+    prediction_cache_stats,
+    get_prediction_log,
+    worker_memory,
     upload_csv_data,
+    chunked_upload_create,
+    chunked_upload_detail,
+    chunked_upload_chunk,
+    chunked_upload_commit,
     get_training_logs,
     get_crop_recommendations,
     get_crop_soil_recommendations,
@@ -26,15 +36,25 @@ urlpatterns = [
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('register/', RegisterView.as_view(), name='register'),
     path('predict/', PredictSoilView.as_view(), name='predict'),
+    path('predict/cache-stats/', prediction_cache_stats, name='prediction_cache_stats'),
+    path('predict/log/', get_prediction_log, name='get_prediction_log'),
+    path('system/memory/', worker_memory, name='worker_memory'),
     path('retrain/', retrain_model, name='retrain_model'),
     path('users/', ListUsersView.as_view(), name='list_users'),
     path('user/profile/', UserProfileView.as_view(), name='user_profile'),
     path('dataset/', ListDatasetView.as_view(), name='list_dataset'),
-    path('weather/', WeatherView.as_view(), name='weather'),
+    path('weather/', weather, name='weather'),
     path('models/', get_model_versions, name='get_model_versions'),
+    path('models/rollout/', get_model_rollout, name='get_model_rollout'),
     path('models/<int:version_id>/', get_model_details, name='get_model_details'),
     path('models/<int:version_id>/deploy/', deploy_model, name='deploy_model'),
+    path('models/<int:version_id>/engine/', set_inference_engine, name='set_inference_engine'),
+    path('models/<int:version_id>/rollout/', set_model_rollout, name='set_model_rollout'),
     path('upload-csv/', upload_csv_data, name='upload_csv_data'),
+    path('upload-csv/chunked/', chunked_upload_create, name='chunked_upload_create'),
+    path('upload-csv/chunked/<uuid:upload_id>/', chunked_upload_detail, name='chunked_upload_detail'),
+    path('upload-csv/chunked/<uuid:upload_id>/chunks/<int:index>/', chunked_upload_chunk, name='chunked_upload_chunk'),
+    path('upload-csv/chunked/<uuid:upload_id>/commit/', chunked_upload_commit, name='chunked_upload_commit'),
     path('models/<int:version_id>/logs/', get_training_logs, name='get_training_logs'),
     path('crop-recommendations/', get_crop_recommendations, name='get_crop_recommendations'),
     path('crop-soil-recommendations/', get_crop_soil_recommendations, name='get_crop_soil_recommendations'),
@@ -5,19 +5,27 @@ from rest_framework import status
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework.views import APIView
 from django.contrib.auth.password_validation import validate_password
-from django.contrib.auth import authenticate
+from .authentication import check_credentials
+import asyncio
 import logging
-import requests
 import json
+import time
+import weakref
 from .serializers import CustomUserSerializer, SoilDataSerializer
 from .models import SoilData, Dataset, ModelVersion, TrainingLog
-import joblib
-import pandas as pd
-import numpy as np
+from .services import get_user_profile
+from .ingestion import save_prediction
+from . import model_store
+from .prediction_cache import prediction_cache, FEATURES as PREDICTION_FEATURES
+from .prediction_log import prediction_log
+from .preload import memory_usage
+from .rollout import model_rollout
 import os
 from django.conf import settings
+from django.db import transaction
 from django.core.paginator import Paginator
 from rest_framework.renderers import JSONRenderer
+from django.core.handlers.asgi import ASGIRequest
 from django.http import JsonResponse
 from rest_framework import serializers
 from rest_framework.decorators import api_view, permission_classes
@@ -26,22 +34,6 @@ from rest_framework.permissions import IsAuthenticated
 logger = logging.getLogger(__name__)
 User = get_user_model()
 
-# Load the model
-MODEL_PATH = os.path.join(settings.BASE_DIR, 'lib', 'models', 'RandomForest.pkl')
-try:
-    model = joblib.load(MODEL_PATH)
-    logger.info(f"Successfully loaded model from {MODEL_PATH}")
-except Exception as e:
-    logger.error(f"Error loading model from {MODEL_PATH}: {str(e)}")
-    # Try alternative path
-    try:
-        MODEL_PATH = os.path.join(settings.BASE_DIR.parent, 'lib', 'models', 'RandomForest.pkl')
-        model = joblib.load(MODEL_PATH)
-        logger.info(f"Successfully loaded model from alternative path: {MODEL_PATH}")
-    except Exception as e2:
-        logger.error(f"Error loading model from alternative path: {str(e2)}")
-        model = None
-
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     username_field = 'username_or_email'
 
@@ -53,8 +45,11 @@ def retrain_model(request):
     try:
         from sklearn.ensemble import RandomForestClassifier
         from sklearn.model_selection import train_test_split
-        from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, confusion_matrix, classification_report
+        from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, confusion_matrix, classification_report, log_loss
         from sklearn.preprocessing import LabelEncoder
+        import joblib
+        import pandas as pd
+        from .artifacts import artifact_dir_for, export_artifact
         import uuid
         from datetime import datetime
         
@@ -77,10 +72,53 @@ def retrain_model(request):
         # Split data
         X_train, X_test, y_train, y_test = train_test_split(X, y_encoded, test_size=0.2, random_state=42, stratify=y_encoded)
         
+        # Optionally pick the forest's hyperparameters by cross-validation on
+        # the training split; the holdout below stays untouched
+        model_params = {'n_estimators': 200}
+        tuning = None
+        if str(request.data.get('tune', '')).lower() in ('1', 'true', 'yes'):
+            from .tuning import search
+            tuning_settings = getattr(settings, 'MODEL_TUNING', {})
+            tuning = search(
+                X_train.to_numpy(), y_train,
+                n_folds=min(max(int(request.data.get('folds', tuning_settings.get('FOLDS', 5))), 2), 10),
+                max_candidates=int(request.data.get('max_candidates', tuning_settings.get('MAX_CANDIDATES', 12))),
+                budget_seconds=float(request.data.get('budget_seconds', tuning_settings.get('BUDGET_SECONDS', 120))),
+                workers=tuning_settings.get('WORKERS') or None,
+            )
+            if tuning['best'] is not None:
+                model_params = dict(tuning['best']['params'])
+            else:
+                logger.warning('Tuning budget ran out before any candidate finished; using default parameters')
+        
         # Train model
-        model_new = RandomForestClassifier(n_estimators=200, random_state=42)
+        model_new = RandomForestClassifier(random_state=42, **model_params)
         model_new.fit(X_train, y_train)
         
+        # Holdout accuracy, single-row latency and artifact size of smaller
+        # forests (fewer trees, shallower depth). With an accuracy tolerance,
+        # the smallest of them within it of the best is deployed instead
+        size_settings = getattr(settings, 'MODEL_SIZE_REPORT', {})
+        tolerance = request.data.get('accuracy_tolerance', size_settings.get('ACCURACY_TOLERANCE'))
+        size = None
+        if tolerance not in (None, '') or str(
+            request.data.get('size_report', size_settings.get('ENABLED', True))
+        ).lower() in ('1', 'true', 'yes'):
+            from .model_size import size_report, smallest_within
+            size, forests = size_report(
+                model_new, model_params, X_train, y_train, X_test, y_test,
+                tree_counts=size_settings.get('TREE_COUNTS'),
+                depths=size_settings.get('DEPTHS'),
+                latency_samples=size_settings.get('LATENCY_SAMPLES', 200),
+            )
+            if tolerance not in (None, ''):
+                chosen = smallest_within(size['variants'], float(tolerance))
+                model_new = forests[(chosen['n_estimators'], chosen['max_depth'])]
+                model_params = dict(model_params, n_estimators=chosen['n_estimators'], max_depth=chosen['max_depth'])
+                size['accuracy_tolerance'] = float(tolerance)
+                size['deployed'] = chosen
+            del forests
+        
         # Make predictions
         y_pred = model_new.predict(X_test)
         
@@ -102,26 +140,44 @@ def retrain_model(request):
         feature_names = ['nitrogen', 'phosphorus', 'potassium', 'temperature', 'humidity', 'ph', 'rainfall']
         feature_importance = dict(zip(feature_names, model_new.feature_importances_.tolist()))
         
-        # Training metrics (simplified for now)
-        training_metrics = {
-            'train_accuracy': accuracy,  # In real scenario, calculate on training set
-            'val_accuracy': accuracy,
-            'epochs': [1, 2, 3, 4, 5],  # Placeholder
-            'train_loss': [0.8, 0.6, 0.4, 0.3, 0.2],  # Placeholder
-            'val_loss': [0.9, 0.7, 0.5, 0.4, 0.3]  # Placeholder
-        }
+        # Training metrics. 'epochs' numbers the points of the loss curves:
+        # the cross-validation folds of the chosen parameters when tuned,
+        # otherwise a single train/holdout point
+        if tuning and tuning['best']:
+            cv_folds = tuning['best']['folds']
+            training_metrics = {
+                'train_accuracy': tuning['best']['mean']['train_accuracy'],
+                'val_accuracy': tuning['best']['mean']['accuracy'],
+                'holdout_accuracy': accuracy,
+                'epochs': [fold['fold'] for fold in cv_folds],
+                'train_loss': [fold['train_loss'] for fold in cv_folds],
+                'val_loss': [fold['val_loss'] for fold in cv_folds],
+            }
+        else:
+            training_metrics = {
+                'train_accuracy': accuracy_score(y_train, model_new.predict(X_train)),
+                'val_accuracy': accuracy,
+                'holdout_accuracy': accuracy,
+                'epochs': [1],
+                'train_loss': [log_loss(y_train, model_new.predict_proba(X_train), labels=model_new.classes_)],
+                'val_loss': [log_loss(y_test, model_new.predict_proba(X_test), labels=model_new.classes_)],
+            }
+        if size:
+            training_metrics['size_report'] = size
         
         # Generate version
         version = f"v{datetime.now().strftime('%Y%m%d_%H%M%S')}"
         
-        # Save model with version
+        # Save model with version, plus its memory-mappable artifact
         model_path = os.path.join(settings.BASE_DIR, 'lib', 'models', f'RandomForest_{version}.pkl')
         os.makedirs(os.path.dirname(model_path), exist_ok=True)
         joblib.dump(model_new, model_path)
+        export_artifact(model_new, artifact_dir_for(model_path), model_path)
         
         # Also save as active model
         active_model_path = os.path.join(settings.BASE_DIR, 'lib', 'models', 'RandomForest.pkl')
         joblib.dump(model_new, active_model_path)
+        export_artifact(model_new, artifact_dir_for(active_model_path), active_model_path)
         
         # Create model version record
         model_version = ModelVersion.objects.create(
@@ -149,11 +205,10 @@ def retrain_model(request):
                 'training_data_size': len(X_train),
                 'test_data_size': len(X_test),
                 'unique_labels': len(le.classes_),
-                'model_params': {
-                    'n_estimators': 200,
-                    'random_state': 42
-                },
-                'classification_report': classification_report(y_test, y_pred, output_dict=True)
+                'model_params': dict(model_params, random_state=42),
+                'classification_report': classification_report(y_test, y_pred, output_dict=True),
+                # Every candidate tried, with its per-fold metrics
+                'cross_validation': tuning
             }
         )
         
@@ -170,6 +225,13 @@ def retrain_model(request):
             'confusion_matrix': confusion_matrix_data,
             'feature_importance': feature_importance,
             'training_metrics': training_metrics,
+            'model_params': model_params,
+            'tuning': tuning and {
+                'best': tuning['best'],
+                'candidates_evaluated': sum(1 for candidate in tuning['candidates'] if candidate['folds']),
+                'elapsed': tuning['elapsed'],
+                'budget_exhausted': tuning['budget_exhausted'],
+            },
             'model_path': model_path
         })
         
@@ -194,13 +256,6 @@ class CustomTokenObtainPairView(APIView):
     permission_classes = []
 
     def post(self, request, *args, **kwargs):
-        logger.info("=== Login Attempt ===")
-        logger.info(f"Username or Email: {request.data.get('username_or_email')}")
-        logger.info(f"Request data: {request.data}")
-        logger.info(f"Request headers: {request.headers}")
-        logger.info(f"Request method: {request.method}")
-        logger.info(f"Request path: {request.path}")
-
         try:
             # Handle username_or_email field
             username_or_email = request.data.get('username_or_email')
@@ -212,26 +267,19 @@ class CustomTokenObtainPairView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Try to find user by username first
-            user = User.objects.filter(username=username_or_email).first()
-            if not user:
-                # If not found by username, try email
-                user = User.objects.filter(email=username_or_email).first()
-                if not user:
-                    return Response(
-                        {"error": "No user found with this username or email"},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-            
-            # Authenticate the user
-            authenticated_user = authenticate(username=user.username, password=password)
-            if not authenticated_user:
+            # One lookup and one password hash, shared with the auth backend
+            authenticated_user, reason = check_credentials(username_or_email, password)
+            if reason == 'not_found':
+                return Response(
+                    {"error": "No user found with this username or email"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if reason == 'invalid_password':
                 return Response(
                     {"error": "Invalid password"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            
-            if not authenticated_user.is_active:
+            if reason == 'inactive':
                 return Response(
                     {"error": "User account is disabled"},
                     status=status.HTTP_400_BAD_REQUEST
@@ -243,10 +291,6 @@ class CustomTokenObtainPairView(APIView):
             
             # Add role to token
             refresh['role'] = authenticated_user.role
-            
-            logger.info(f"User found: {authenticated_user.username}")
-            logger.info(f"User is superuser: {authenticated_user.is_superuser}")
-            logger.info(f"User role: {authenticated_user.role}")
 
             # Always set role to admin for superusers
             if authenticated_user.is_superuser:
@@ -260,17 +304,11 @@ class CustomTokenObtainPairView(APIView):
                 'role': role
             }
             
-            logger.info(f"Login successful for user: {authenticated_user.username}")
+            logger.debug(f"Login successful for user: {authenticated_user.username}")
             return Response(response_data, status=status.HTTP_200_OK)
             
         except Exception as e:
             logger.error(f"Unexpected error during login: {str(e)}")
-            # Provide more specific error messages
-            if "more than one" in str(e):
-                return Response(
-                    {"error": "Multiple accounts found with this email. Please contact support."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
             return Response(
                 {"error": "An unexpected error occurred"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -302,10 +340,28 @@ class RegisterView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+def predict_top_crops(predictor, row, n=5):
+    """Top prediction and the ``n`` most probable crops for one feature row"""
+    import numpy as np
+    proba = predictor.predict_proba(np.array([row]))[0]
+    class_labels = predictor.classes_
+    prediction = class_labels[proba.argmax()]
+    # Ensure prediction is always a crop name string
+    if not isinstance(prediction, str):
+        prediction = str(prediction)
+
+    top_indices = proba.argsort()[-n:][::-1]
+    top_crops = [
+        {"label": str(class_labels[i]), "confidence": float(proba[i])}
+        for i in top_indices
+    ]
+    return prediction, top_crops
+
 class PredictSoilView(APIView):
     def post(self, request):
         try:
-            if model is None:
+            predictor = model_store.get_predictor()
+            if predictor is None:
                 return Response(
                     {"error": "Model not loaded. Please check the model path and try again."},
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -315,64 +371,56 @@ class PredictSoilView(APIView):
             if serializer.is_valid():
                 # Prepare data for prediction
                 data = serializer.validated_data
-                input_data = np.array([[
-                    data['nitrogen'],
-                    data['phosphorus'],
-                    data['potassium'],
-                    data['temperature'],
-                    data['humidity'],
-                    data['ph'],
-                    data['rainfall']
-                ]])
-
-                # Make prediction
-                prediction = model.predict(input_data)[0]
-                # Ensure prediction is always a crop name string
-                if hasattr(model, 'classes_') and not isinstance(prediction, str):
-                    try:
-                        prediction = model.classes_[prediction]
-                    except Exception:
-                        prediction = str(prediction)
-                logger.info(f"Made prediction: {prediction} for input: {input_data}")
-
-                # Get top N probable crops using predict_proba
-                if hasattr(model, 'predict_proba'):
-                    proba = model.predict_proba(input_data)[0]
-                    class_labels = model.classes_
-                    N = 5
-                    top_indices = proba.argsort()[-N:][::-1]
-                    top_crops = [
-                        {"label": str(class_labels[i]), "confidence": float(proba[i])}
-                        for i in top_indices
-                    ]
+                features = [data[feature] for feature in PREDICTION_FEATURES]
+
+                # Repeat readings are served from the prediction cache; a
+                # miss runs the active version's inference engine. While a
+                # candidate version is evaluated, canary users are served by
+                # it (bypassing the cache of primary results) and shadow
+                # samples are re-scored by it in the background
+                started = time.perf_counter()
+                rollout = model_rollout.current()
+                canary = model_rollout.canary_predictor(rollout, request.user)
+                if canary is not None:
+                    served_by, version_id = 'canary', rollout.version_id
+                    _, row = prediction_cache.quantize(features)
+                    prediction, top_crops = model_rollout.timed(
+                        rollout.version_id, 'canary', lambda row: predict_top_crops(canary, row), row
+                    )
                 else:
-                    top_crops = [{"label": str(prediction), "confidence": 1.0}]
+                    model_key = model_store.model_key()
+                    served_by, version_id = 'primary', model_key[0]
+                    compute = lambda row: predict_top_crops(predictor, row)
+                    if rollout is not None:
+                        primary = compute
+                        compute = lambda row: model_rollout.timed(model_key[0], 'primary', primary, row)
+                    prediction, top_crops = prediction_cache.get_or_compute(model_key, features, compute)
+                    model_rollout.shadow(rollout, features, prediction)
+                latency = time.perf_counter() - started
+                logger.info(f"Made prediction: {prediction} for input: {features}")
 
                 # Get confidence level for the top prediction
                 confidence = top_crops[0]['confidence'] if top_crops else 1.0
 
-                # Save the data with prediction and confidence
-                soil_data = serializer.save(
+                # Save the reading with prediction and confidence, keeping the
+                # user's prediction counters in the same transaction
+                soil_data = save_prediction(request.user, data, prediction, confidence)
+
+                # Audit trail, written in batches by a background thread
+                prediction_log.log(
                     user=request.user,
+                    soil_data=soil_data,
+                    model_version_id=version_id,
+                    served_by=served_by,
+                    inputs=dict(zip(PREDICTION_FEATURES, features)),
                     prediction=prediction,
-                    confidence=confidence
+                    top_crops=top_crops,
+                    latency_ms=latency * 1000
                 )
 
                 # Get similar cases from the dataset (legacy, can be removed later)
-                similar_cases = Dataset.objects.filter(
-                    label=prediction
-                ).order_by('?')[:5]  # Get 5 random similar cases
-
-                similar_cases_data = [{
-                    'nitrogen': case.nitrogen,
-                    'phosphorus': case.phosphorus,
-                    'potassium': case.potassium,
-                    'temperature': case.temperature,
-                    'humidity': case.humidity,
-                    'ph': case.ph,
-                    'rainfall': case.rainfall,
-                    'label': case.label
-                } for case in similar_cases]
+                from .dataset_index import dataset_index
+                similar_cases_data = dataset_index.get().similar_cases(prediction, 5)
 
                 return Response({
                     "message": "Prediction successful",
@@ -395,7 +443,7 @@ class PredictSoilView(APIView):
 
     def get(self, request):
         try:
-            soil_data = SoilData.objects.filter(user=request.user).order_by('-created_at')
+            soil_data = SoilData.objects.predictions().filter(user=request.user).order_by('-created_at')
             serializer = SoilDataSerializer(soil_data, many=True)
             return Response(serializer.data)
         except Exception as e:
@@ -494,64 +542,67 @@ class ListDatasetView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-class WeatherView(APIView):
-    permission_classes = []  # Allow unauthenticated access
-    
-    def get(self, request):
-        try:
-            # Get location parameters
-            lat = request.GET.get('lat')
-            lon = request.GET.get('lon')
-            
-            if not lat or not lon:
-                return Response(
-                    {"error": "Latitude and longitude parameters are required"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # Use Open-Meteo API (free, no API key required)
-            url = f"https://api.open-meteo.com/v1/forecast"
-            params = {
-                'latitude': float(lat),
-                'longitude': float(lon),
-                'current': 'precipitation,rain,weather_code',
-                'timezone': 'auto'
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            print(f'[DEBUG] Open-Meteo API URL: {response.url}')
-            print(f'[DEBUG] Open-Meteo API Response: {response.text}')
-            
-            if response.status_code == 200:
-                data = response.json()
-                
-                # Parse the weather data
-                current = data.get('current', {})
-                print(f'[DEBUG] Parsed current: {current}')
-                # Extract current rainfall data
-                current_weather = {
-                    'precipitation': current.get('rain', current.get('precipitation', 0.0)),
-                    'weather_code': current.get('weather_code', 0),
-                    'latitude': float(lat),
-                    'longitude': float(lon),
-                    'timestamp': data.get('current_units', {}).get('time', ''),
-                }
-                print(f'[DEBUG] Returning current_weather: {current_weather}')
-                return Response({
-                    'current_weather': current_weather,
-                })
-            else:
-                return Response(
-                    {"error": f"Weather API returned status {response.status_code}"},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
-                
-        except Exception as e:
-            logger.error(f"Error in weather API: {str(e)}")
-            return Response(
-                {"error": str(e)},
+OPEN_METEO_URL = 'https://api.open-meteo.com/v1/forecast'
+
+# Under ASGI requests share one pooled client per event loop (one per worker
+# process); under WSGI every request runs in a fresh loop and gets its own
+_weather_clients = weakref.WeakKeyDictionary()
+
+
+async def fetch_weather(request, params):
+    import httpx
+    timeout = getattr(settings, 'WEATHER_API_TIMEOUT', 10)
+    if isinstance(request, ASGIRequest):
+        loop = asyncio.get_running_loop()
+        client = _weather_clients.get(loop)
+        if client is None:
+            client = _weather_clients[loop] = httpx.AsyncClient(timeout=timeout)
+        return await client.get(OPEN_METEO_URL, params=params)
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        return await client.get(OPEN_METEO_URL, params=params)
+
+
+async def weather(request):
+    """
+    Current rainfall at ``lat``/``lon`` from Open-Meteo (free, no API key).
+    Async, so under ASGI waiting on the upstream ties up no worker thread.
+    """
+    lat = request.GET.get('lat')
+    lon = request.GET.get('lon')
+    if not lat or not lon:
+        return JsonResponse(
+            {"error": "Latitude and longitude parameters are required"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        params = {
+            'latitude': float(lat),
+            'longitude': float(lon),
+            'current': 'precipitation,rain,weather_code',
+            'timezone': 'auto'
+        }
+        response = await fetch_weather(request, params)
+        logger.debug(f'Open-Meteo API {response.url}: {response.text}')
+
+        if response.status_code != 200:
+            return JsonResponse(
+                {"error": f"Weather API returned status {response.status_code}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+        data = response.json()
+        current = data.get('current', {})
+        return JsonResponse({
+            'current_weather': {
+                'precipitation': current.get('rain', current.get('precipitation', 0.0)),
+                'weather_code': current.get('weather_code', 0),
+                'latitude': params['latitude'],
+                'longitude': params['longitude'],
+                'timestamp': data.get('current_units', {}).get('time', ''),
+            },
+        })
+    except Exception as e:
+        logger.error(f"Error in weather API: {str(e)}")
+        return JsonResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 class RootView(APIView):
     permission_classes = []  # Allow unauthenticated access
@@ -584,6 +635,9 @@ def get_model_versions(request):
                 'recall': version.recall,
                 'f1_score': version.f1_score,
                 'is_active': version.is_active,
+                'inference_engine': version.inference_engine,
+                'rollout_mode': version.rollout_mode,
+                'rollout_percent': version.rollout_percent,
                 'created_at': version.created_at,
                 'created_by': version.created_by.username
             })
@@ -617,6 +671,9 @@ def get_model_details(request, version_id):
                 'feature_importance': version.feature_importance,
                 'training_metrics': version.training_metrics,
                 'is_active': version.is_active,
+                'inference_engine': version.inference_engine,
+                'rollout_mode': version.rollout_mode,
+                'rollout_percent': version.rollout_percent,
                 'created_at': version.created_at,
                 'created_by': version.created_by.username
             }
@@ -634,21 +691,30 @@ def deploy_model(request, version_id):
     try:
         version = ModelVersion.objects.get(id=version_id)
         
+        # Copy the model file to the active location first: other processes
+        # reload it as soon as they see the version change
+        import shutil
+        from .artifacts import ArtifactError, artifact_dir_for, install_artifact
+        active_model_path = os.path.join(settings.BASE_DIR, 'lib', 'models', 'RandomForest.pkl')
+        shutil.copy2(version.model_path, active_model_path)
+        try:
+            install_artifact(version.model_path, active_model_path)
+        except ArtifactError as e:
+            # Without a matching artifact the pickle is loaded instead
+            shutil.rmtree(artifact_dir_for(active_model_path), ignore_errors=True)
+            logger.warning(f"No model artifact for {version.version}: {e}")
+        
         # Deactivate all other versions
         ModelVersion.objects.filter(is_active=True).update(is_active=False)
         
-        # Activate the selected version
+        # Activate the selected version, ending its evaluation
         version.is_active = True
+        version.rollout_mode = ''
+        version.rollout_percent = 0
         version.save()
         
-        # Copy the model file to the active location
-        import shutil
-        active_model_path = os.path.join(settings.BASE_DIR, 'lib', 'models', 'RandomForest.pkl')
-        shutil.copy2(version.model_path, active_model_path)
-        
-        # Reload the global model
-        global model
-        model = joblib.load(active_model_path)
+        model_store.reload_model(active_model_path, version.id)
+        model_rollout.invalidate()
         
         return Response({
             'success': True,
@@ -661,6 +727,245 @@ def deploy_model(request, version_id):
         logger.error(f"Error deploying model: {str(e)}")
         return Response({'success': False, 'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def prediction_cache_stats(request):
+    """Hit rate and size of this worker's prediction cache."""
+    if request.user.role != 'admin':
+        return Response(
+            {'success': False, 'error': 'Only admin users can view cache statistics'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    return Response({'success': True, 'cache': prediction_cache.stats()})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_prediction_log(request):
+    """Logged predictions, newest first, optionally for one model version or user."""
+    if request.user.role != 'admin':
+        return Response(
+            {'success': False, 'error': 'Only admin users can view the prediction log'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    try:
+        from .models import PredictionLog
+        entries = PredictionLog.objects.select_related('model_version', 'user')
+        if request.GET.get('version_id'):
+            entries = entries.filter(model_version_id=request.GET['version_id'])
+        if request.GET.get('user_id'):
+            entries = entries.filter(user_id=request.GET['user_id'])
+        try:
+            page = int(request.GET.get('page', 1))
+        except ValueError:
+            page = 1
+        current_page = Paginator(entries.order_by('-created_at'), 50).get_page(page)
+
+        return Response({
+            'success': True,
+            'entries': [{
+                'id': entry.id,
+                'created_at': entry.created_at,
+                'user': entry.user.username if entry.user else None,
+                'soil_data_id': entry.soil_data_id,
+                'version_id': entry.model_version_id,
+                'version': entry.model_version.version if entry.model_version else None,
+                'served_by': entry.served_by,
+                'inputs': entry.inputs,
+                'prediction': entry.prediction,
+                'top_crops': entry.top_crops,
+                'latency_ms': entry.latency_ms,
+            } for entry in current_page],
+            'current_page': current_page.number,
+            'total_pages': current_page.paginator.num_pages,
+            # This worker's buffer of entries not yet written
+            'buffer': prediction_log.stats(),
+        })
+    except Exception as e:
+        logger.error(f"Error fetching prediction log: {str(e)}")
+        return Response({'success': False, 'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def worker_memory(request):
+    """Memory of the worker process serving this request."""
+    if request.user.role != 'admin':
+        return Response(
+            {'success': False, 'error': 'Only admin users can view worker memory'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    return Response({'success': True, 'memory': memory_usage()})
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def set_inference_engine(request, version_id):
+    """Choose how predictions are computed for a model version."""
+    if request.user.role != 'admin':
+        return Response(
+            {'success': False, 'error': 'Only admin users can change the inference engine'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    try:
+        engine = request.data.get('engine')
+        engines = [choice for choice, _ in ModelVersion.ENGINE_CHOICES]
+        if engine not in engines:
+            return Response(
+                {'success': False, 'error': f'engine must be one of {engines}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        version = ModelVersion.objects.get(id=version_id)
+        version.inference_engine = engine
+        version.save(update_fields=['inference_engine'])
+        model_store.invalidate_predictor()
+
+        return Response({
+            'success': True,
+            'version': version.version,
+            'inference_engine': version.inference_engine
+        })
+    except ModelVersion.DoesNotExist:
+        return Response({'success': False, 'error': 'Model version not found'}, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        logger.error(f"Error setting inference engine: {str(e)}")
+        return Response({'success': False, 'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+def _evaluation_data(evaluation):
+    return {
+        'version_id': evaluation.model_version_id,
+        'version': evaluation.model_version.version,
+        'mode': evaluation.mode,
+        'predictions': evaluation.predictions,
+        'agreement_rate': evaluation.agreement_rate if evaluation.mode == 'shadow' else None,
+        'errors': evaluation.errors,
+        'dropped': evaluation.dropped,
+        'mean_latency_ms': evaluation.mean_latency_ms,
+        'max_latency_ms': evaluation.latency_max_ms,
+        'started_at': evaluation.started_at,
+        'updated_at': evaluation.updated_at,
+    }
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_model_rollout(request):
+    """The version under shadow or canary evaluation and its live statistics."""
+    if request.user.role != 'admin':
+        return Response(
+            {'success': False, 'error': 'Only admin users can view model rollouts'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    try:
+        from django.db.models import Q
+        from .models import ModelEvaluation
+        candidate = ModelVersion.objects.exclude(rollout_mode='').filter(is_active=False).first()
+        # The candidate's statistics next to the active version's primary traffic
+        evaluations = ModelEvaluation.objects.select_related('model_version').filter(
+            Q(model_version=candidate) | Q(model_version__is_active=True, mode='primary')
+        )
+        return Response({
+            'success': True,
+            'rollout': candidate and {
+                'version_id': candidate.id,
+                'version': candidate.version,
+                'mode': candidate.rollout_mode,
+                'percent': candidate.rollout_percent,
+            },
+            'evaluations': [_evaluation_data(evaluation) for evaluation in evaluations.order_by('mode')],
+        })
+    except Exception as e:
+        logger.error(f"Error fetching model rollout: {str(e)}")
+        return Response({'success': False, 'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def set_model_rollout(request, version_id):
+    """
+    Start ('shadow' or 'canary', with a percent) or stop ('off') evaluating a
+    version on live traffic. Starting resets the statistics of the version
+    and of the active version's primary traffic.
+    """
+    if request.user.role != 'admin':
+        return Response(
+            {'success': False, 'error': 'Only admin users can change model rollouts'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    try:
+        from .models import ModelEvaluation
+        mode = request.data.get('mode')
+        if mode not in ('shadow', 'canary', 'off'):
+            return Response(
+                {'success': False, 'error': "mode must be 'shadow', 'canary' or 'off'"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            percent = float(request.data.get('percent', 0 if mode == 'off' else 10))
+        except (TypeError, ValueError):
+            percent = -1
+        if not 0 <= percent <= 100:
+            return Response(
+                {'success': False, 'error': 'percent must be a number between 0 and 100'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        version = ModelVersion.objects.get(id=version_id)
+        if version.is_active and mode != 'off':
+            return Response(
+                {'success': False, 'error': 'The active version cannot be evaluated against itself'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        with transaction.atomic():
+            if mode == 'off':
+                version.rollout_mode, version.rollout_percent = '', 0
+            else:
+                # One candidate at a time
+                ModelVersion.objects.exclude(id=version.id).exclude(rollout_mode='').update(
+                    rollout_mode='', rollout_percent=0
+                )
+                version.rollout_mode, version.rollout_percent = mode, percent
+                ModelEvaluation.objects.filter(model_version=version).delete()
+                ModelEvaluation.objects.filter(model_version__is_active=True, mode='primary').delete()
+            version.save(update_fields=['rollout_mode', 'rollout_percent'])
+        model_rollout.invalidate()
+
+        return Response({
+            'success': True,
+            'version': version.version,
+            'rollout_mode': version.rollout_mode or 'off',
+            'rollout_percent': version.rollout_percent
+        })
+    except ModelVersion.DoesNotExist:
+        return Response({'success': False, 'error': 'Model version not found'}, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        logger.error(f"Error setting model rollout: {str(e)}")
+        return Response({'success': False, 'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+def _dataset_import_response(source, merge_mode):
+    """Import a dataset CSV (file object or path) and describe the outcome"""
+    from .dataset_import import DatasetValidationError, import_dataset_csv
+    from .dataset_index import dataset_index
+    # Validated and imported in bounded chunks; only valid rows are inserted,
+    # and replace mode clears the existing data in the same transaction
+    try:
+        records_added, report = import_dataset_csv(source, replace=merge_mode == 'replace')
+    except DatasetValidationError as e:
+        return Response({'success': False, 'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if not report['valid']:
+        return Response({
+            'success': False,
+            'error': 'No valid rows in CSV',
+            'validation': report
+        }, status=status.HTTP_400_BAD_REQUEST)
+    dataset_index.invalidate()
+
+    return Response({
+        'success': True,
+        'records_added': records_added,
+        'records_rejected': report['invalid'],
+        'total_records': Dataset.objects.count(),
+        'merge_mode': merge_mode,
+        'validation': report
+    })
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def upload_csv_data(request):
@@ -669,50 +974,94 @@ def upload_csv_data(request):
         if 'file' not in request.FILES:
             return Response({'success': False, 'error': 'No file provided'}, status=status.HTTP_400_BAD_REQUEST)
         
-        file = request.FILES['file']
         merge_mode = request.data.get('merge_mode', 'merge')  # 'merge' or 'replace'
-        
-        # Read CSV
-        df = pd.read_csv(file)
-        
-        # Validate required columns
-        required_columns = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall', 'label']
-        if not all(col in df.columns for col in required_columns):
-            return Response({
-                'success': False, 
-                'error': f'CSV must contain columns: {required_columns}'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # If replace mode, clear existing data
-        if merge_mode == 'replace':
-            Dataset.objects.all().delete()
-        
-        # Add new data
-        records_added = 0
-        for _, row in df.iterrows():
-            Dataset.objects.create(
-                nitrogen=row['N'],
-                phosphorus=row['P'],
-                potassium=row['K'],
-                temperature=row['temperature'],
-                humidity=row['humidity'],
-                ph=row['ph'],
-                rainfall=row['rainfall'],
-                label=row['label']
-            )
-            records_added += 1
-        
-        return Response({
-            'success': True,
-            'records_added': records_added,
-            'total_records': Dataset.objects.count(),
-            'merge_mode': merge_mode
-        })
+        return _dataset_import_response(request.FILES['file'], merge_mode)
         
     except Exception as e:
         logger.error(f"Error uploading CSV: {str(e)}")
         return Response({'success': False, 'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def chunked_upload_create(request):
+    """Start a resumable, chunked dataset CSV upload."""
+    from .chunked_upload import UploadError, create_upload, status_data
+    try:
+        upload = create_upload(
+            request.user,
+            request.data.get('filename'),
+            request.data.get('size'),
+            merge_mode=request.data.get('merge_mode', 'merge'),
+            chunk_size=request.data.get('chunk_size'),
+        )
+        return Response({'success': True, **status_data(upload)}, status=status.HTTP_201_CREATED)
+    except UploadError as e:
+        return Response({'success': False, 'error': str(e)}, status=e.status)
+    except Exception as e:
+        logger.error(f"Error starting chunked upload: {str(e)}")
+        return Response({'success': False, 'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def chunked_upload_detail(request, upload_id):
+    """Progress of a chunked upload (where to resume), or abort it."""
+    from .chunked_upload import UploadError, delete_upload, get_upload, status_data
+    try:
+        upload = get_upload(upload_id, request.user)
+        if request.method == 'DELETE':
+            delete_upload(upload)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response({'success': True, **status_data(upload)})
+    except UploadError as e:
+        return Response({'success': False, 'error': str(e)}, status=e.status)
+
+@api_view(['PUT'])
+@permission_classes([IsAuthenticated])
+def chunked_upload_chunk(request, upload_id, index):
+    """Store one chunk, sent as the raw request body."""
+    from .chunked_upload import UploadError, status_data, write_chunk
+    try:
+        length = request.META.get('CONTENT_LENGTH')
+        if not length:
+            return Response({'success': False, 'error': 'Content-Length is required'},
+                            status=status.HTTP_411_LENGTH_REQUIRED)
+        # The body is streamed from the request, never read into memory whole
+        upload = write_chunk(
+            upload_id, request.user, index, request.stream, int(length),
+            request.headers.get('X-Chunk-SHA256')
+        )
+        return Response({'success': True, **status_data(upload)})
+    except UploadError as e:
+        return Response({'success': False, 'error': str(e)}, status=e.status)
+    except Exception as e:
+        logger.error(f"Error storing upload chunk: {str(e)}")
+        return Response({'success': False, 'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def chunked_upload_commit(request, upload_id):
+    """Import a fully received chunked upload into the dataset."""
+    from .chunked_upload import UploadError, complete_file, finish_upload, get_upload
+    from .models import DatasetUpload
+    try:
+        get_upload(upload_id, request.user)
+        with transaction.atomic():
+            upload = DatasetUpload.objects.select_for_update().get(pk=upload_id)
+            # Committing again returns the first outcome
+            if upload.status != 'uploading':
+                return Response(upload.result, status=(
+                    status.HTTP_200_OK if upload.status == 'committed' else status.HTTP_400_BAD_REQUEST
+                ))
+            path = complete_file(upload, request.data.get('sha256'))
+            response = _dataset_import_response(path, upload.merge_mode)
+            finish_upload(upload, 'committed' if response.status_code == 200 else 'failed', response.data)
+        return response
+    except UploadError as e:
+        return Response({'success': False, 'error': str(e)}, status=e.status)
+    except Exception as e:
+        logger.error(f"Error committing chunked upload: {str(e)}")
+        return Response({'success': False, 'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_training_logs(request, version_id):
@@ -744,8 +1093,8 @@ def get_training_logs(request, version_id):
 def get_crop_recommendations(request):
     """Get list of available crops for search."""
     try:
-        # Get unique crops from dataset with optimized query
-        crops = Dataset.objects.values_list('label', flat=True).distinct().order_by('label')
+        from .dataset_index import dataset_index
+        crops = dataset_index.get().crops()
         crop_list = []
         
         for crop in crops:
@@ -772,71 +1121,12 @@ def get_crop_soil_recommendations(request):
         if not crop:
             return Response({'error': 'Crop parameter is required'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Get all records for this crop from dataset with optimized query
-        crop_data = Dataset.objects.filter(label__iexact=crop).only(
-            'nitrogen', 'phosphorus', 'potassium', 'temperature', 
-            'humidity', 'ph', 'rainfall'
-        )
-        
-        if not crop_data.exists():
+        from .dataset_index import dataset_index
+        stats = dataset_index.get().crop_statistics(crop)
+        if stats is None:
             return Response({'error': f'No data found for crop: {crop}'}, status=status.HTTP_404_NOT_FOUND)
-        
-        # Calculate statistics for soil requirements using database aggregation
-        from django.db.models import Min, Max, Avg
-        
-        stats = crop_data.aggregate(
-            nitrogen_min=Min('nitrogen'),
-            nitrogen_max=Max('nitrogen'),
-            nitrogen_avg=Avg('nitrogen'),
-            phosphorus_min=Min('phosphorus'),
-            phosphorus_max=Max('phosphorus'),
-            phosphorus_avg=Avg('phosphorus'),
-            potassium_min=Min('potassium'),
-            potassium_max=Max('potassium'),
-            potassium_avg=Avg('potassium'),
-            temp_min=Min('temperature'),
-            temp_max=Max('temperature'),
-            temp_avg=Avg('temperature'),
-            humidity_min=Min('humidity'),
-            humidity_max=Max('humidity'),
-            humidity_avg=Avg('humidity'),
-            ph_min=Min('ph'),
-            ph_max=Max('ph'),
-            ph_avg=Avg('ph'),
-            rainfall_min=Min('rainfall'),
-            rainfall_max=Max('rainfall'),
-            rainfall_avg=Avg('rainfall'),
-        )
-        
-        sample_size = crop_data.count()
-        
-        # Build recommendations from database aggregation results
-        recommendations = {
-            'crop': crop,
-            'nitrogen_min': stats['nitrogen_min'],
-            'nitrogen_max': stats['nitrogen_max'],
-            'nitrogen_mean': round(stats['nitrogen_avg'], 2),
-            'phosphorus_min': stats['phosphorus_min'],
-            'phosphorus_max': stats['phosphorus_max'],
-            'phosphorus_mean': round(stats['phosphorus_avg'], 2),
-            'potassium_min': stats['potassium_min'],
-            'potassium_max': stats['potassium_max'],
-            'potassium_mean': round(stats['potassium_avg'], 2),
-            'temp_min': stats['temp_min'],
-            'temp_max': stats['temp_max'],
-            'temp_mean': round(stats['temp_avg'], 2),
-            'humidity_min': stats['humidity_min'],
-            'humidity_max': stats['humidity_max'],
-            'humidity_mean': round(stats['humidity_avg'], 2),
-            'ph_min': stats['ph_min'],
-            'ph_max': stats['ph_max'],
-            'ph_mean': round(stats['ph_avg'], 2),
-            'rainfall_min': stats['rainfall_min'],
-            'rainfall_max': stats['rainfall_max'],
-            'rainfall_mean': round(stats['rainfall_avg'], 2),
-            'sample_size': sample_size,
-            'notes': _get_crop_growing_notes(crop)
-        }
+
+        recommendations = dict(stats, crop=crop, notes=_get_crop_growing_notes(crop))
         
         return Response({
             'success': True,
@@ -851,64 +1141,13 @@ def get_crop_soil_recommendations(request):
 def get_all_crop_soil_recommendations(request):
     """Get soil requirements for all crops in one call."""
     try:
-        from django.db.models import Min, Max, Avg
-        crops = Dataset.objects.values_list('label', flat=True).distinct()
+        from .dataset_index import dataset_index
+        index = dataset_index.get()
         all_recommendations = {}
-        for crop in crops:
-            crop_data = Dataset.objects.filter(label__iexact=crop)
-            if not crop_data.exists():
-                continue
-            stats = crop_data.aggregate(
-                nitrogen_min=Min('nitrogen'),
-                nitrogen_max=Max('nitrogen'),
-                nitrogen_avg=Avg('nitrogen'),
-                phosphorus_min=Min('phosphorus'),
-                phosphorus_max=Max('phosphorus'),
-                phosphorus_avg=Avg('phosphorus'),
-                potassium_min=Min('potassium'),
-                potassium_max=Max('potassium'),
-                potassium_avg=Avg('potassium'),
-                temp_min=Min('temperature'),
-                temp_max=Max('temperature'),
-                temp_avg=Avg('temperature'),
-                humidity_min=Min('humidity'),
-                humidity_max=Max('humidity'),
-                humidity_avg=Avg('humidity'),
-                ph_min=Min('ph'),
-                ph_max=Max('ph'),
-                ph_avg=Avg('ph'),
-                rainfall_min=Min('rainfall'),
-                rainfall_max=Max('rainfall'),
-                rainfall_avg=Avg('rainfall'),
+        for crop in index.crops():
+            all_recommendations[crop] = dict(
+                index.crop_statistics(crop), crop=crop, notes=_get_crop_growing_notes(crop)
             )
-            sample_size = crop_data.count()
-            recommendations = {
-                'crop': crop,
-                'nitrogen_min': stats['nitrogen_min'],
-                'nitrogen_max': stats['nitrogen_max'],
-                'nitrogen_mean': round(stats['nitrogen_avg'], 2),
-                'phosphorus_min': stats['phosphorus_min'],
-                'phosphorus_max': stats['phosphorus_max'],
-                'phosphorus_mean': round(stats['phosphorus_avg'], 2),
-                'potassium_min': stats['potassium_min'],
-                'potassium_max': stats['potassium_max'],
-                'potassium_mean': round(stats['potassium_avg'], 2),
-                'temp_min': stats['temp_min'],
-                'temp_max': stats['temp_max'],
-                'temp_mean': round(stats['temp_avg'], 2),
-                'humidity_min': stats['humidity_min'],
-                'humidity_max': stats['humidity_max'],
-                'humidity_mean': round(stats['humidity_avg'], 2),
-                'ph_min': stats['ph_min'],
-                'ph_max': stats['ph_max'],
-                'ph_mean': round(stats['ph_avg'], 2),
-                'rainfall_min': stats['rainfall_min'],
-                'rainfall_max': stats['rainfall_max'],
-                'rainfall_mean': round(stats['rainfall_avg'], 2),
-                'sample_size': sample_size,
-                'notes': _get_crop_growing_notes(crop)
-            }
-            all_recommendations[crop] = recommendations
         return Response({'success': True, 'all_recommendations': all_recommendations})
     except Exception as e:
         logger.error(f"Error fetching all crop soil recommendations: {str(e)}")
@@ -975,33 +1214,7 @@ class UserProfileView(APIView):
     
     def get(self, request):
         try:
-            user = request.user
-            
-            # Get user's prediction count
-            total_predictions = SoilData.objects.filter(user=user).count()
-            
-            # Get most predicted crop
-            from django.db.models import Count
-            most_predicted = SoilData.objects.filter(user=user).values('prediction').annotate(
-                count=Count('prediction')
-            ).order_by('-count').first()
-            
-            most_predicted_crop = most_predicted['prediction'] if most_predicted else 'None'
-            
-            user_data = {
-                'username': user.username,
-                'email': user.email,
-                'first_name': user.first_name or '',
-                'last_name': user.last_name or '',
-                'farm_name': user.farm_name or '',
-                'farm_size': user.farm_size or '',
-                'role': user.role,
-                'date_joined': user.date_joined,
-                'total_predictions': total_predictions,
-                'most_predicted_crop': most_predicted_crop,
-                'phone': user.phone or '',
-                'location': user.location or '',
-            }
+            user_data = get_user_profile(request.user)
             
             return Response(user_data)
             
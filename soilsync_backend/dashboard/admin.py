@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import SensorDevice, SoilData, CropRecommendation, SystemFeedback, ActivityLog, PredictionResult
+from .models import SensorDevice, CropRecommendation, SystemFeedback, ActivityLog
 
 @admin.register(SensorDevice)
 class SensorDeviceAdmin(admin.ModelAdmin):
@@ -7,13 +7,6 @@ class SensorDeviceAdmin(admin.ModelAdmin):
     list_filter = ('status', 'date_installed')
     search_fields = ('name', 'device_id', 'location')
 
-@admin.register(SoilData)
-class SoilDataAdmin(admin.ModelAdmin):
-    list_display = ('user', 'sensor', 'location', 'nitrogen', 'phosphorus', 'potassium', 'ph_level', 'moisture', 'temperature', 'rainfall', 'timestamp')
-    list_filter = ('timestamp', 'location')
-    search_fields = ('user__username', 'sensor__name', 'location')
-    raw_id_fields = ('user', 'sensor')
-
 @admin.register(CropRecommendation)
 class CropRecommendationAdmin(admin.ModelAdmin):
     list_display = ('soil_data', 'recommended_crop', 'confidence_score', 'recommendation_date')
@@ -34,9 +27,3 @@ class ActivityLogAdmin(admin.ModelAdmin):
     list_filter = ('timestamp', 'action')
     search_fields = ('user__username', 'action', 'description')
     raw_id_fields = ('user',)
-
-@admin.register(PredictionResult)
-class PredictionResultAdmin(admin.ModelAdmin):
-    list_display = ('crop_name', 'nitrogen', 'phosphorus', 'potassium', 'temperature', 'humidity', 'ph', 'rainfall', 'predicted_yield', 'confidence_score', 'created_at')
-    list_filter = ('created_at', 'crop_name')
-    search_fields = ('crop_name', 'location', 'device_id', 'user_id')
@@ -1,10 +1,16 @@
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from django.conf import settings
 from rest_framework.response import Response
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils import timezone
-from .models import PredictionResult, SoilData, SensorDevice, CropRecommendation, SystemFeedback, ActivityLog
+from api.ingestion import report_prediction
+from api.models import SoilData
+from .models import SensorDevice, CropRecommendation, SystemFeedback, ActivityLog
 from .serializers import (
     PredictionResultSerializer, 
     SoilDataSerializer, 
@@ -13,6 +19,10 @@ from .serializers import (
     SystemFeedbackSerializer,
     ActivityLogSerializer
 )
+from .services.rollup_service import SoilRollupService
+from .services.ingestion_service import parse_payload, validate_readings, reading_buffer
+from .services.realtime import AsyncEventStream, EventStream, realtime_feed
+from .services import wire_format
 import logging
 
 logger = logging.getLogger(__name__)
@@ -22,16 +32,20 @@ logger = logging.getLogger(__name__)
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def receive_prediction(request):
-    """Receive prediction data from the Flutter app"""
+    """
+    Receive prediction data from the Flutter app. A prediction the app just
+    got from /api/predict/ is already stored and is not written again.
+    """
     try:
         serializer = PredictionResultSerializer(data=request.data)
         if serializer.is_valid():
-            prediction = serializer.save()
-            logger.info(f"Received prediction: {prediction.crop_name}")
+            prediction, created = report_prediction(serializer.validated_data)
+            logger.info(f"Received prediction: {prediction.prediction}")
             return Response({
                 'status': 'success',
                 'message': 'Prediction saved successfully',
-                'id': prediction.id
+                'id': prediction.id,
+                'duplicate': not created
             }, status=status.HTTP_201_CREATED)
         else:
             logger.error(f"Invalid prediction data: {serializer.errors}")
@@ -51,7 +65,7 @@ def receive_prediction(request):
 def get_predictions(request):
     """Get all predictions for dashboard display"""
     try:
-        predictions = PredictionResult.objects.all()[:100]
+        predictions = SoilData.objects.predictions().order_by('-created_at')[:100]
         serializer = PredictionResultSerializer(predictions, many=True)
         return Response({
             'status': 'success',
@@ -67,13 +81,19 @@ def get_predictions(request):
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def get_predictions_realtime(request):
-    """Get latest predictions for real-time dashboard updates"""
+    """
+    Latest predictions for the real-time dashboard, plus the feed cursor to
+    open /dashboard/api/stream/ from for everything that arrives afterwards
+    """
     try:
-        predictions = PredictionResult.objects.order_by('-created_at')[:50]
+        # Taken before the query: a row stored in between is both listed and streamed, never missed
+        cursor = realtime_feed.cursor()
+        predictions = SoilData.objects.predictions().order_by('-created_at')[:50]
         serializer = PredictionResultSerializer(predictions, many=True)
         return Response({
             'status': 'success',
             'data': serializer.data,
+            'cursor': cursor,
             'timestamp': timezone.now().isoformat()
         })
     except Exception as e:
@@ -83,19 +103,46 @@ def get_predictions_realtime(request):
             'message': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@require_GET
+def stream_updates(request):
+    """
+    Server-Sent Events stream of new predictions (``prediction`` events) and
+    sensor reading batches (``readings`` events) stored after the cursor in
+    the Last-Event-ID header or ``?cursor=``. See services/realtime.py.
+    """
+    cursor = request.headers.get('Last-Event-ID') or request.GET.get('cursor')
+    subscription = realtime_feed.subscribe(cursor)
+    if subscription is None:
+        return JsonResponse({'error': 'Realtime stream unavailable, poll /dashboard/api/predictions/realtime/'}, status=503)
+    feed_settings = getattr(settings, 'REALTIME_FEED', {})
+    stream_class = AsyncEventStream if isinstance(request, ASGIRequest) else EventStream
+    response = StreamingHttpResponse(
+        stream_class(
+            subscription,
+            heartbeat=feed_settings.get('HEARTBEAT_SECONDS', 15.0),
+            max_seconds=feed_settings.get('MAX_STREAM_SECONDS', 45.0),
+        ),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering events
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 # Soil Data API endpoints
 @api_view(['GET', 'POST'])
 @permission_classes([AllowAny])
 def soil_data_list_create(request):
     """List or create soil data entries"""
     if request.method == 'GET':
-        soil_data = SoilData.objects.all()
+        soil_data = SoilData.objects.sensor_readings().order_by('-created_at')
         serializer = SoilDataSerializer(soil_data, many=True)
         return Response(serializer.data)
     
     elif request.method == 'POST':
         serializer = SoilDataSerializer(data=request.data)
         if serializer.is_valid():
+            # Stored by the ingestion service, which queues its recommendation
             serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -105,7 +152,7 @@ def soil_data_list_create(request):
 def soil_data_detail(request, pk):
     """Retrieve, update or delete a soil data entry"""
     try:
-        soil_data = SoilData.objects.get(pk=pk)
+        soil_data = SoilData.objects.sensor_readings().get(pk=pk)
     except SoilData.DoesNotExist:
         return Response(status=status.HTTP_404_NOT_FOUND)
     
@@ -116,14 +163,77 @@ def soil_data_detail(request, pk):
     elif request.method == 'PUT':
         serializer = SoilDataSerializer(soil_data, data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            old_user_id, old_timestamp, old_sensor_id = soil_data.user_id, soil_data.timestamp, soil_data.sensor_id
+            updated = serializer.save()
+            SoilRollupService.refresh_buckets('sensor', old_user_id, old_timestamp, sensor_id=old_sensor_id)
+            SoilRollupService.refresh_buckets('sensor', updated.user_id, updated.timestamp, sensor_id=updated.sensor_id)
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     elif request.method == 'DELETE':
         soil_data.delete()
+        SoilRollupService.refresh_buckets('sensor', soil_data.user_id, soil_data.timestamp, sensor_id=soil_data.sensor_id)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+@csrf_exempt
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def ingest_sensor_readings(request, device_id):
+    """
+    Accept a batch of readings for one sensor device. The body is a JSON array
+    of readings, ``{"readings": [...]}``, or newline-delimited JSON. Each reading
+    is either an object or a compact array in ingestion_service.READING_FIELDS
+    order. Bodies sent as application/vnd.soilsync.readings use the binary
+    format described in services/wire_format.py. Valid readings are buffered and bulk-inserted; invalid ones are
+    reported back by index. Other content types are refused with 415.
+    """
+    content_type = request.content_type or ''
+    if content_type != wire_format.CONTENT_TYPE and 'json' not in content_type:
+        return Response(
+            {'error': f'Unsupported content type {content_type}'}, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+        )
+    try:
+        device = SensorDevice.objects.only('id', 'location', 'status').get(device_id=device_id)
+    except SensorDevice.DoesNotExist:
+        return Response({'error': f'Unknown device {device_id}'}, status=status.HTTP_404_NOT_FOUND)
+    if device.status != 'active':
+        return Response({'error': f'Device {device_id} is {device.status}'}, status=status.HTTP_409_CONFLICT)
+
+    try:
+        if request.content_type == wire_format.CONTENT_TYPE:
+            header_device_id, total, valid, errors = wire_format.decode_batch(request.body)
+            if header_device_id != device_id:
+                return Response(
+                    {'error': f'Batch is for device {header_device_id}, not {device_id}'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        else:
+            raw_readings = parse_payload(request.body, content_type)
+            total = len(raw_readings)
+    except ValueError as e:
+        return Response({'error': f'Invalid payload: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+
+    max_batch = getattr(settings, 'SENSOR_INGEST', {}).get('MAX_BATCH_READINGS', 10000)
+    if total > max_batch:
+        return Response(
+            {'error': f'Batch too large ({total} readings, limit {max_batch})'},
+            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        )
+
+    if request.content_type != wire_format.CONTENT_TYPE:
+        valid, errors = validate_readings(raw_readings)
+    try:
+        accepted = reading_buffer.add(device, request.user, valid)
+    except Exception as e:
+        logger.error(f"Error storing readings for {device_id}: {str(e)}")
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    return Response({
+        'accepted': accepted,
+        'rejected': total - len(valid),
+        'errors': errors,
+    }, status=status.HTTP_202_ACCEPTED if accepted or not errors else status.HTTP_400_BAD_REQUEST)
+
 # Sensor Device API endpoints
 @api_view(['GET', 'POST'])
 @permission_classes([AllowAny])
@@ -164,8 +274,8 @@ def crop_recommendation_list_create(request):
 def dashboard_stats(request):
     """Get dashboard statistics"""
     try:
-        total_predictions = PredictionResult.objects.count()
-        total_soil_data = SoilData.objects.count()
+        total_predictions = SoilData.objects.predictions().count()
+        total_soil_data = SoilData.objects.sensor_readings().count()
         total_sensors = SensorDevice.objects.count()
         total_recommendations = CropRecommendation.objects.count()
         
@@ -3,9 +3,10 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.contrib.auth import get_user_model
-from .models import SoilData, CropRecommendation
+from api.models import SoilData
+from .models import CropRecommendation
 from .serializers import CropRecommendationSerializer
-from .services.crop_recommendation_service import CropRecommendationService
+from .services.crop_recommendation_service import get_recommendation_service
 
 User = get_user_model()
 
@@ -25,7 +26,7 @@ def generate_recommendation(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        service = CropRecommendationService()
+        service = get_recommendation_service()
         recommendation = service.generate_recommendations(soil_data_id)
         
         if recommendation:
@@ -52,7 +53,7 @@ def get_top_recommendations(request, soil_data_id):
     """
     try:
         soil_data = SoilData.objects.get(id=soil_data_id)
-        service = CropRecommendationService()
+        service = get_recommendation_service()
         
         recommendations = service.get_top_recommendations(soil_data, top_n=3)
         
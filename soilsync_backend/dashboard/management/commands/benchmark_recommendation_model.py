@@ -0,0 +1,60 @@
+import time
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from dashboard.services.crop_recommendation_service import get_recommendation_service
+
+class Command(BaseCommand):
+    help = 'Compare single-sample latency of the sklearn and fused crop recommendation paths'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=2000,
+            help='Predictions timed per path (default: 2000)'
+        )
+
+    def handle(self, *args, **options):
+        service = get_recommendation_service()
+        model, scaler = service.get_artifacts()
+        predictor = service.get_predictor()
+        if predictor is None:
+            raise CommandError('No crop recommendation model found; run train_recommendation_model first')
+
+        rng = np.random.default_rng(42)
+        samples = rng.uniform(
+            [0, 5, 5, 8, 14, 3.5, 20], [140, 145, 205, 43, 99, 9.9, 298],
+            size=(options['iterations'], 7)
+        )
+
+        def sklearn_path(row):
+            # predict_crop before the fused pipeline
+            features = scaler.transform(row)
+            return model.predict(features)[0], model.predict_proba(features)[0].max()
+
+        def fused_path(row):
+            return predictor.predict_topk(row, 1)[0][0]
+
+        mismatches = 0
+        for row in samples[:200]:
+            row = row.reshape(1, -1)
+            expected = model.predict_proba(scaler.transform(row))
+            if not np.array_equal(expected, predictor.predict_proba(row)):
+                mismatches += 1
+        if mismatches:
+            self.stdout.write(self.style.ERROR(f"{mismatches} of 200 samples differ from predict_proba"))
+
+        for name, path in (('sklearn', sklearn_path), ('fused', fused_path)):
+            path(samples[:1])
+            timings = []
+            for row in samples:
+                row = row.reshape(1, -1)
+                start = time.perf_counter()
+                path(row)
+                timings.append(time.perf_counter() - start)
+            timings = np.array(timings) * 1e6
+            self.stdout.write(
+                f"{name:8s} mean {timings.mean():8.1f} us   "
+                f"p50 {np.percentile(timings, 50):8.1f} us   "
+                f"p99 {np.percentile(timings, 99):8.1f} us"
+            )
@@ -0,0 +1,38 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from dashboard.services.rollup_service import SoilRollupService, SOURCES
+
+class Command(BaseCommand):
+    help = 'Fold new soil readings into the hourly and daily rollup tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            choices=list(SOURCES),
+            help='Only compact one source (default: all sources)'
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Drop existing rollups and recompute them from the raw tables'
+        )
+        parser.add_argument(
+            '--reconcile-hours',
+            type=float,
+            help='Recompute buckets this far back after compacting (default: SOIL_ROLLUPS RECONCILE_HOURS, 0 to skip)'
+        )
+
+    def handle(self, *args, **options):
+        sources = [options['source']] if options['source'] else list(SOURCES)
+        for source in sources:
+            if options['rebuild']:
+                count = SoilRollupService.rebuild(source)
+            else:
+                count = SoilRollupService.compact(source)
+                if options['reconcile_hours'] is None:
+                    SoilRollupService.reconcile(source)
+                elif options['reconcile_hours'] > 0:
+                    SoilRollupService.reconcile(source, window=timedelta(hours=options['reconcile_hours']))
+            self.stdout.write(
+                self.style.SUCCESS(f"Folded {count} {source} readings into rollups")
+            )
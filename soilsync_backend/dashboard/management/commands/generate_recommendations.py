@@ -1,6 +1,6 @@
 from django.core.management.base import BaseCommand
-from dashboard.models import SoilData, CropRecommendation
-from dashboard.services.crop_recommendation_service import CropRecommendationService
+from api.models import SoilData
+from dashboard.services.crop_recommendation_service import get_recommendation_service
 
 class Command(BaseCommand):
     help = 'Generate crop recommendations for existing soil data'
@@ -14,12 +14,18 @@ class Command(BaseCommand):
         parser.add_argument(
             '--all',
             action='store_true',
-            help='Generate recommendations for all soil data without recommendations'
+            help='Generate recommendations for all soil data without recommendations (default)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Readings scored per model call and bulk insert (default: 1000)'
         )
 
     def handle(self, *args, **options):
-        service = CropRecommendationService()
-        
+        service = get_recommendation_service()
+
         if options['soil_id']:
             # Process specific soil data
             try:
@@ -28,7 +34,7 @@ class Command(BaseCommand):
                 if recommendation:
                     self.stdout.write(
                         self.style.SUCCESS(
-                            f"Generated recommendation for soil data ID {options['soil_id']}: {recommendation.crop_name}"
+                            f"Generated recommendation for soil data ID {options['soil_id']}: {recommendation.recommended_crop}"
                         )
                     )
                 else:
@@ -43,49 +49,16 @@ class Command(BaseCommand):
                         f"Soil data ID {options['soil_id']} not found"
                     )
                 )
-        
-        elif options['all']:
-            # Process all soil data without recommendations
-            soil_data_list = SoilData.objects.filter(
-                croprecommendation__isnull=True
-            ).order_by('-timestamp')
-            
-            count = 0
-            for soil_data in soil_data_list:
-                recommendation = service.generate_recommendations(soil_data.id)
-                if recommendation:
-                    count += 1
-                    self.stdout.write(
-                        self.style.SUCCESS(
-                            f"Generated recommendation for soil data ID {soil_data.id}: {recommendation.crop_name}"
-                        )
-                    )
-            
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f"Generated {count} new crop recommendations"
-                )
-            )
-        
-        else:
-            # Process all soil data
-            soil_data_list = SoilData.objects.all().order_by('-timestamp')
-            count = 0
-            for soil_data in soil_data_list:
-                # Check if recommendation already exists
-                existing = CropRecommendation.objects.filter(soil_data=soil_data).first()
-                if not existing:
-                    recommendation = service.generate_recommendations(soil_data.id)
-                    if recommendation:
-                        count += 1
-                        self.stdout.write(
-                            self.style.SUCCESS(
-                                f"Generated recommendation for soil data ID {soil_data.id}: {recommendation.crop_name}"
-                            )
-                        )
-            
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f"Generated {count} new crop recommendations"
-                )
+            return
+
+        # Process all soil data without recommendations in batches
+        count = 0
+        for written in service.generate_recommendations_batch(batch_size=options['batch_size']):
+            count += written
+            self.stdout.write(f"Generated {count} recommendations so far...")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated {count} new crop recommendations"
             )
+        )
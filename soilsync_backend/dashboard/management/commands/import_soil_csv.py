@@ -1,7 +1,6 @@
 import csv
 from django.core.management.base import BaseCommand
-from dashboard.models import SoilData, SensorDevice
-from django.contrib.auth.models import User
+from django.contrib.auth import get_user_model
 from django.utils import timezone
 
 class Command(BaseCommand):
@@ -16,10 +15,9 @@ class Command(BaseCommand):
         model_choice = options['model']
         count = 0
         if model_choice == 'SoilData':
-            from dashboard.models import SoilData, SensorDevice
-            from django.contrib.auth.models import User
-            from django.utils import timezone
-            user = User.objects.first()
+            from api.ingestion import sensor_reading
+            from dashboard.models import SensorDevice
+            user = get_user_model().objects.first()
             sensor = SensorDevice.objects.first()
             if not user or not sensor:
                 self.stdout.write(self.style.ERROR('At least one user and one sensor must exist.'))
@@ -28,20 +26,18 @@ class Command(BaseCommand):
             reader = csv.DictReader(csvfile)
             for row in reader:
                 if model_choice == 'SoilData':
-                    SoilData.objects.create(
-                        user=user,
-                        sensor=sensor,
-                        location=row.get('location', ''),
-                        nitrogen=row.get('N', 0),
-                        phosphorus=row.get('P', 0),
-                        potassium=row.get('K', 0),
-                        ph_level=row.get('ph', 0),
-                        moisture=row.get('moisture', 0),
-                        temperature=row.get('temperature', 0),
-                        rainfall=row.get('rainfall', 0),
-                        crop=row.get('label', ''),
-                        timestamp=timezone.now()
-                    )
+                    reading = sensor_reading(sensor, user, {
+                        'nitrogen': row.get('N', 0),
+                        'phosphorus': row.get('P', 0),
+                        'potassium': row.get('K', 0),
+                        'ph_level': row.get('ph', 0),
+                        'moisture': row.get('moisture', 0),
+                        'temperature': row.get('temperature', 0),
+                        'rainfall': row.get('rainfall', 0),
+                        'timestamp': timezone.now(),
+                    })
+                    reading.location = row.get('location', '') or reading.location
+                    reading.save()
                 else:  # Dataset
                     from api.models import Dataset
                     Dataset.objects.create(
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from dashboard.services.crop_recommendation_service import get_recommendation_service
+
+class Command(BaseCommand):
+    help = 'Train the dashboard crop recommendation model and scaler'
+
+    def handle(self, *args, **options):
+        service = get_recommendation_service()
+        model, scaler = service.train_model()
+        if model is None:
+            self.stdout.write(self.style.ERROR('Training finished but the model could not be loaded'))
+            return
+        self.stdout.write(
+            self.style.SUCCESS(f"Saved crop recommendation model to {service.model_path}")
+        )
@@ -0,0 +1,107 @@
+# Generated by Django 5.1 on 2026-10-19 12:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_predictionresult_alter_activitylog_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=10, unique=True)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailySoilRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('api', 'API Predictions'), ('sensor', 'Sensor Readings')], default='api', max_length=10)),
+                ('bucket_start', models.DateTimeField()),
+                ('reading_count', models.IntegerField(default=0)),
+                ('nitrogen_sum', models.FloatField(default=0.0)),
+                ('nitrogen_min', models.FloatField(blank=True, null=True)),
+                ('nitrogen_max', models.FloatField(blank=True, null=True)),
+                ('phosphorus_sum', models.FloatField(default=0.0)),
+                ('phosphorus_min', models.FloatField(blank=True, null=True)),
+                ('phosphorus_max', models.FloatField(blank=True, null=True)),
+                ('potassium_sum', models.FloatField(default=0.0)),
+                ('potassium_min', models.FloatField(blank=True, null=True)),
+                ('potassium_max', models.FloatField(blank=True, null=True)),
+                ('temperature_sum', models.FloatField(default=0.0)),
+                ('temperature_min', models.FloatField(blank=True, null=True)),
+                ('temperature_max', models.FloatField(blank=True, null=True)),
+                ('humidity_sum', models.FloatField(default=0.0)),
+                ('humidity_min', models.FloatField(blank=True, null=True)),
+                ('humidity_max', models.FloatField(blank=True, null=True)),
+                ('ph_sum', models.FloatField(default=0.0)),
+                ('ph_min', models.FloatField(blank=True, null=True)),
+                ('ph_max', models.FloatField(blank=True, null=True)),
+                ('rainfall_sum', models.FloatField(default=0.0)),
+                ('rainfall_min', models.FloatField(blank=True, null=True)),
+                ('rainfall_max', models.FloatField(blank=True, null=True)),
+                ('ph_acidic_count', models.IntegerField(default=0)),
+                ('ph_neutral_count', models.IntegerField(default=0)),
+                ('ph_alkaline_count', models.IntegerField(default=0)),
+                ('prediction_counts', models.JSONField(blank=True, default=dict)),
+                ('sensor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='dashboard.sensordevice')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['bucket_start'],
+                'abstract': False,
+                'indexes': [models.Index(fields=['source', 'user', 'bucket_start'], name='dashboard_d_source_af6e3c_idx'), models.Index(fields=['source', 'bucket_start'], name='dashboard_d_source_0a1bfb_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='HourlySoilRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('api', 'API Predictions'), ('sensor', 'Sensor Readings')], default='api', max_length=10)),
+                ('bucket_start', models.DateTimeField()),
+                ('reading_count', models.IntegerField(default=0)),
+                ('nitrogen_sum', models.FloatField(default=0.0)),
+                ('nitrogen_min', models.FloatField(blank=True, null=True)),
+                ('nitrogen_max', models.FloatField(blank=True, null=True)),
+                ('phosphorus_sum', models.FloatField(default=0.0)),
+                ('phosphorus_min', models.FloatField(blank=True, null=True)),
+                ('phosphorus_max', models.FloatField(blank=True, null=True)),
+                ('potassium_sum', models.FloatField(default=0.0)),
+                ('potassium_min', models.FloatField(blank=True, null=True)),
+                ('potassium_max', models.FloatField(blank=True, null=True)),
+                ('temperature_sum', models.FloatField(default=0.0)),
+                ('temperature_min', models.FloatField(blank=True, null=True)),
+                ('temperature_max', models.FloatField(blank=True, null=True)),
+                ('humidity_sum', models.FloatField(default=0.0)),
+                ('humidity_min', models.FloatField(blank=True, null=True)),
+                ('humidity_max', models.FloatField(blank=True, null=True)),
+                ('ph_sum', models.FloatField(default=0.0)),
+                ('ph_min', models.FloatField(blank=True, null=True)),
+                ('ph_max', models.FloatField(blank=True, null=True)),
+                ('rainfall_sum', models.FloatField(default=0.0)),
+                ('rainfall_min', models.FloatField(blank=True, null=True)),
+                ('rainfall_max', models.FloatField(blank=True, null=True)),
+                ('ph_acidic_count', models.IntegerField(default=0)),
+                ('ph_neutral_count', models.IntegerField(default=0)),
+                ('ph_alkaline_count', models.IntegerField(default=0)),
+                ('prediction_counts', models.JSONField(blank=True, default=dict)),
+                ('sensor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='dashboard.sensordevice')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['bucket_start'],
+                'abstract': False,
+                'indexes': [models.Index(fields=['source', 'user', 'bucket_start'], name='dashboard_h_source_5dde9d_idx'), models.Index(fields=['source', 'bucket_start'], name='dashboard_h_source_fb14f8_idx')],
+            },
+        ),
+    ]
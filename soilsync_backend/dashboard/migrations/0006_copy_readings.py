@@ -0,0 +1,125 @@
+# Generated by Django 5.1 on 2026-10-19 12:54
+
+from datetime import timedelta
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+FEATURES = ['nitrogen', 'phosphorus', 'potassium', 'temperature', 'humidity', 'ph', 'rainfall']
+
+
+def batches(queryset):
+    last_id = 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id).order_by('id')[:BATCH_SIZE])
+        if not batch:
+            return
+        last_id = batch[-1].id
+        yield batch
+
+
+def copy_sensor_readings(apps, schema_editor):
+    """Copy dashboard sensor readings into soil_data and point their recommendations at the copies"""
+    OldSoilData = apps.get_model('dashboard', 'SoilData')
+    SoilData = apps.get_model('api', 'SoilData')
+    CropRecommendation = apps.get_model('dashboard', 'CropRecommendation')
+    for batch in batches(OldSoilData.objects.all()):
+        copies = SoilData.objects.bulk_create([
+            SoilData(
+                source='sensor',
+                user_id=old.user_id,
+                sensor_id=old.sensor_id,
+                location=old.location,
+                nitrogen=old.nitrogen,
+                phosphorus=old.phosphorus,
+                potassium=old.potassium,
+                temperature=old.temperature,
+                humidity=old.moisture,
+                ph=old.ph_level,
+                rainfall=old.rainfall,
+                created_at=old.timestamp,
+            )
+            for old in batch
+        ])
+        new_ids = {old.id: copy.id for old, copy in zip(batch, copies)}
+        recommendations = list(CropRecommendation.objects.filter(soil_data_id__in=new_ids))
+        for recommendation in recommendations:
+            recommendation.reading_id = new_ids[recommendation.soil_data_id]
+        CropRecommendation.objects.bulk_update(recommendations, ['reading'], batch_size=BATCH_SIZE)
+
+
+def copy_reported_predictions(apps, schema_editor):
+    """
+    Copy predictions reported by the app into soil_data. A report naming a
+    user that repeats their prediction stored by /api/predict/ fills in
+    that row instead.
+    """
+    PredictionResult = apps.get_model('dashboard', 'PredictionResult')
+    SoilData = apps.get_model('api', 'SoilData')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    window = timedelta(seconds=getattr(settings, 'READING_INGEST', {}).get('REPORT_MATCH_SECONDS', 600))
+    users = {}
+
+    def resolve_user(user_id):
+        user_id = (user_id or '').strip()
+        if user_id not in users:
+            lookup = {'pk': int(user_id)} if user_id.isdigit() else {'username': user_id}
+            users[user_id] = User.objects.filter(**lookup).values_list('pk', flat=True).first() if user_id else None
+        return users[user_id]
+
+    for batch in batches(PredictionResult.objects.all()):
+        reports = []
+        for result in batch:
+            user_id = resolve_user(result.user_id)
+            features = {feature: getattr(result, feature) for feature in FEATURES}
+            match = None
+            if user_id is not None:
+                match = SoilData.objects.filter(
+                    source='app',
+                    user_id=user_id,
+                    prediction=result.crop_name,
+                    created_at__gte=result.created_at - window,
+                    created_at__lte=result.created_at + window,
+                    **features
+                ).order_by('-created_at').first()
+            extra = {
+                'location': result.location or '',
+                'device_id': result.device_id or '',
+                'predicted_yield': result.predicted_yield,
+            }
+            if match is not None:
+                changed = {
+                    field: value for field, value in extra.items() if value not in ('', None) and not getattr(match, field)
+                }
+                if changed:
+                    SoilData.objects.filter(pk=match.pk).update(**changed)
+                continue
+            reports.append(SoilData(
+                source='report',
+                user_id=user_id,
+                prediction=result.crop_name,
+                confidence=result.confidence_score,
+                created_at=result.created_at,
+                **features,
+                **extra
+            ))
+        SoilData.objects.bulk_create(reports)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_canonical_readings'),
+        ('dashboard', '0005_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='croprecommendation',
+            name='reading',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.soildata'),
+        ),
+        migrations.RunPython(copy_sensor_readings, migrations.RunPython.noop),
+        migrations.RunPython(copy_reported_predictions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1 on 2026-10-19 12:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def clear_rollups(apps, schema_editor):
+    """Rollups refer to the old row ids; drop them so the next compaction rebuilds them from soil_data"""
+    for name in ('HourlySoilRollup', 'DailySoilRollup', 'RollupWatermark'):
+        apps.get_model('dashboard', name).objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_canonical_readings'),
+        ('dashboard', '0006_copy_readings'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='croprecommendation',
+            name='soil_data',
+        ),
+        migrations.RenameField(
+            model_name='croprecommendation',
+            old_name='reading',
+            new_name='soil_data',
+        ),
+        migrations.AlterField(
+            model_name='croprecommendation',
+            name='soil_data',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dashboard_recommendations', to='api.soildata'),
+        ),
+        migrations.DeleteModel(
+            name='PredictionResult',
+        ),
+        migrations.DeleteModel(
+            name='SoilData',
+        ),
+        migrations.RunPython(clear_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1 on 2026-10-19 13:34
+
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+
+
+def clear_rollups(apps, schema_editor):
+    """Racing compactions may have written duplicate buckets; drop them so the next compaction rebuilds them"""
+    for name in ('HourlySoilRollup', 'DailySoilRollup', 'RollupWatermark'):
+        apps.get_model('dashboard', name).objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0007_canonical_readings'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_rollups, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailysoilrollup',
+            constraint=models.UniqueConstraint(models.F('source'), django.db.models.functions.comparison.Coalesce('user', 0), django.db.models.functions.comparison.Coalesce('sensor', 0), models.F('bucket_start'), name='unique_daily_soil_rollup'),
+        ),
+        migrations.AddConstraint(
+            model_name='hourlysoilrollup',
+            constraint=models.UniqueConstraint(models.F('source'), django.db.models.functions.comparison.Coalesce('user', 0), django.db.models.functions.comparison.Coalesce('sensor', 0), models.F('bucket_start'), name='unique_hourly_soil_rollup'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1 on 2026-10-19 13:52
+
+from django.db import migrations
+
+
+def build_rollups(apps, schema_editor):
+    """
+    Fill the rollups from soil_data so dashboards have totals right after
+    deploy. This runs the service against the current models; keep it the
+    last migration touching the rollup tables.
+    """
+    from dashboard.services.rollup_service import SOURCES, SoilRollupService
+    for source in SOURCES:
+        SoilRollupService.rebuild(source)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_canonical_readings'),
+        ('dashboard', '0009_rollup_rows_without_user'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
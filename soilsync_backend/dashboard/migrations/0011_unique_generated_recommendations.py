@@ -0,0 +1,23 @@
+# Generated by Django 5.1 on 2026-10-19 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_canonical_readings'),
+        ('dashboard', '0010_build_soil_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='croprecommendation',
+            name='generated',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddConstraint(
+            model_name='croprecommendation',
+            constraint=models.UniqueConstraint(condition=models.Q(('generated', True)), fields=('soil_data',), name='unique_generated_recommendation'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 
@@ -20,36 +21,23 @@ class SensorDevice(models.Model):
     def __str__(self):
         return f"{self.name} ({self.device_id})"
 
-class SoilData(models.Model):
-    """Model for soil sensor readings"""
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='dashboard_soil_data')
-    sensor = models.ForeignKey(SensorDevice, on_delete=models.CASCADE, related_name='dashboard_readings')
-    location = models.CharField(max_length=255, default='')
-    nitrogen = models.FloatField(default=0.0)
-    phosphorus = models.FloatField(default=0.0)
-    potassium = models.FloatField(default=0.0)
-    ph_level = models.FloatField(default=7.0)
-    moisture = models.FloatField(default=0.0)
-    temperature = models.FloatField(default=0.0)
-    rainfall = models.FloatField(default=0.0)
-    timestamp = models.DateTimeField(default=timezone.now)
-    
-    class Meta:
-        ordering = ['-timestamp']
-    
-    def __str__(self):
-        return f"Soil data from {self.location} at {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
-
 class CropRecommendation(models.Model):
     """Model for crop recommendations based on soil data"""
-    soil_data = models.ForeignKey(SoilData, on_delete=models.CASCADE, related_name='dashboard_recommendations')
+    soil_data = models.ForeignKey('api.SoilData', on_delete=models.CASCADE, related_name='dashboard_recommendations')
     recommended_crop = models.CharField(max_length=100, default='')
     confidence_score = models.FloatField(default=0.0)
     recommendation_date = models.DateTimeField(default=timezone.now)
     additional_info = models.TextField(blank=True, null=True)
+    # Written by CropRecommendationService rather than entered by hand
+    generated = models.BooleanField(default=False)
     
     class Meta:
         ordering = ['-recommendation_date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['soil_data'], condition=models.Q(generated=True), name='unique_generated_recommendation'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.recommended_crop} for {self.soil_data.location}"
@@ -89,29 +77,99 @@ class ActivityLog(models.Model):
     
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['-timestamp'], name='activitylog_timestamp_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.action} at {self.timestamp}"
 
-class PredictionResult(models.Model):
-    """Model to store crop prediction results from the Flutter app"""
-    crop_name = models.CharField(max_length=100, default='')
-    nitrogen = models.FloatField(default=0.0)
-    phosphorus = models.FloatField(default=0.0)
-    potassium = models.FloatField(default=0.0)
-    temperature = models.FloatField(default=0.0)
-    humidity = models.FloatField(default=0.0)
-    ph = models.FloatField(default=7.0)
-    rainfall = models.FloatField(default=0.0)
-    predicted_yield = models.FloatField(default=0.0)
-    confidence_score = models.FloatField(default=0.0)
-    location = models.CharField(max_length=255, blank=True, null=True)
-    created_at = models.DateTimeField(default=timezone.now)
-    device_id = models.CharField(max_length=255, blank=True, null=True)
-    user_id = models.CharField(max_length=255, blank=True, null=True)
-    
+class SoilRollupBase(models.Model):
+    """Pre-aggregated soil readings for one user/sensor and time bucket"""
+    SOURCE_CHOICES = [
+        ('api', 'API Predictions'),
+        ('sensor', 'Sensor Readings'),
+    ]
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default='api')
+    bucket_start = models.DateTimeField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    sensor = models.ForeignKey(SensorDevice, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    reading_count = models.IntegerField(default=0)
+    nitrogen_sum = models.FloatField(default=0.0)
+    nitrogen_min = models.FloatField(null=True, blank=True)
+    nitrogen_max = models.FloatField(null=True, blank=True)
+    phosphorus_sum = models.FloatField(default=0.0)
+    phosphorus_min = models.FloatField(null=True, blank=True)
+    phosphorus_max = models.FloatField(null=True, blank=True)
+    potassium_sum = models.FloatField(default=0.0)
+    potassium_min = models.FloatField(null=True, blank=True)
+    potassium_max = models.FloatField(null=True, blank=True)
+    temperature_sum = models.FloatField(default=0.0)
+    temperature_min = models.FloatField(null=True, blank=True)
+    temperature_max = models.FloatField(null=True, blank=True)
+    humidity_sum = models.FloatField(default=0.0)
+    humidity_min = models.FloatField(null=True, blank=True)
+    humidity_max = models.FloatField(null=True, blank=True)
+    ph_sum = models.FloatField(default=0.0)
+    ph_min = models.FloatField(null=True, blank=True)
+    ph_max = models.FloatField(null=True, blank=True)
+    rainfall_sum = models.FloatField(default=0.0)
+    rainfall_min = models.FloatField(null=True, blank=True)
+    rainfall_max = models.FloatField(null=True, blank=True)
+    ph_acidic_count = models.IntegerField(default=0)
+    ph_neutral_count = models.IntegerField(default=0)
+    ph_alkaline_count = models.IntegerField(default=0)
+    prediction_counts = models.JSONField(default=dict, blank=True)
+
     class Meta:
-        ordering = ['-created_at']
-        
+        abstract = True
+        ordering = ['bucket_start']
+
+class HourlySoilRollup(SoilRollupBase):
+    """Hourly soil reading rollup, used for trend charts"""
+
+    class Meta(SoilRollupBase.Meta):
+        indexes = [
+            models.Index(fields=['source', 'user', 'bucket_start']),
+            models.Index(fields=['source', 'bucket_start']),
+        ]
+        # NULL user/sensor ids are coalesced so those buckets are unique too
+        constraints = [
+            models.UniqueConstraint(
+                'source', Coalesce('user', 0), Coalesce('sensor', 0), 'bucket_start',
+                name='unique_hourly_soil_rollup',
+            ),
+        ]
+
+    def __str__(self):
+        owner = self.user.username if self.user else 'Unknown user'
+        return f"{owner} hourly rollup at {self.bucket_start.strftime('%Y-%m-%d %H:%M')}"
+
+class DailySoilRollup(SoilRollupBase):
+    """Daily soil reading rollup, used for dashboard totals and averages"""
+
+    class Meta(SoilRollupBase.Meta):
+        indexes = [
+            models.Index(fields=['source', 'user', 'bucket_start']),
+            models.Index(fields=['source', 'bucket_start']),
+        ]
+        # NULL user/sensor ids are coalesced so those buckets are unique too
+        constraints = [
+            models.UniqueConstraint(
+                'source', Coalesce('user', 0), Coalesce('sensor', 0), 'bucket_start',
+                name='unique_daily_soil_rollup',
+            ),
+        ]
+
+    def __str__(self):
+        owner = self.user.username if self.user else 'Unknown user'
+        return f"{owner} daily rollup for {self.bucket_start.strftime('%Y-%m-%d')}"
+
+class RollupWatermark(models.Model):
+    """Highest raw row id already folded into the rollup tables, per source"""
+    source = models.CharField(max_length=10, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
     def __str__(self):
-        return f"{self.crop_name} - {self.predicted_yield} ({self.created_at.strftime('%Y-%m-%d %H:%M')})"
+        return f"{self.source} rollups up to id {self.last_id}"
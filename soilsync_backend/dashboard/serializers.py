@@ -1,15 +1,60 @@
+from django.contrib.auth import get_user_model
 from rest_framework import serializers
-from .models import PredictionResult, SoilData, SensorDevice, CropRecommendation, SystemFeedback, ActivityLog
+from api.ingestion import save_sensor_readings
+from api.models import SoilData
+from .models import SensorDevice, CropRecommendation, SystemFeedback, ActivityLog
 
 class PredictionResultSerializer(serializers.ModelSerializer):
+    """
+    A canonical prediction in the shape of the former PredictionResult
+    model, for the app's /dashboard/api/predictions/ routes
+    """
+    crop_name = serializers.CharField(source='prediction', max_length=100, required=False, allow_blank=True, default='')
+    nitrogen = serializers.FloatField(default=0.0)
+    phosphorus = serializers.FloatField(default=0.0)
+    potassium = serializers.FloatField(default=0.0)
+    temperature = serializers.FloatField(default=0.0)
+    humidity = serializers.FloatField(default=0.0)
+    ph = serializers.FloatField(default=7.0)
+    rainfall = serializers.FloatField(default=0.0)
+    predicted_yield = serializers.FloatField(default=0.0, allow_null=True)
+    confidence_score = serializers.FloatField(source='confidence', default=0.0, allow_null=True)
+    location = serializers.CharField(max_length=255, required=False, allow_blank=True, allow_null=True)
+    created_at = serializers.DateTimeField(required=False)
+    device_id = serializers.CharField(max_length=255, required=False, allow_blank=True, allow_null=True)
+    user_id = serializers.CharField(max_length=255, required=False, allow_blank=True, allow_null=True)
+
     class Meta:
-        model = PredictionResult
-        fields = '__all__'
+        model = SoilData
+        fields = (
+            'id', 'crop_name', 'nitrogen', 'phosphorus', 'potassium', 'temperature', 'humidity', 'ph',
+            'rainfall', 'predicted_yield', 'confidence_score', 'location', 'created_at', 'device_id', 'user_id'
+        )
 
 class SoilDataSerializer(serializers.ModelSerializer):
+    """A canonical sensor reading under the field names of the former dashboard SoilData model"""
+    moisture = serializers.FloatField(source='humidity', default=0.0)
+    ph_level = serializers.FloatField(source='ph', default=7.0)
+    timestamp = serializers.DateTimeField(source='created_at', required=False)
+    nitrogen = serializers.FloatField(default=0.0)
+    phosphorus = serializers.FloatField(default=0.0)
+    potassium = serializers.FloatField(default=0.0)
+    temperature = serializers.FloatField(default=0.0)
+    rainfall = serializers.FloatField(default=0.0)
+    user = serializers.PrimaryKeyRelatedField(queryset=get_user_model().objects.all())
+    sensor = serializers.PrimaryKeyRelatedField(queryset=SensorDevice.objects.all())
+
     class Meta:
         model = SoilData
-        fields = '__all__'
+        fields = (
+            'id', 'user', 'sensor', 'location', 'nitrogen', 'phosphorus', 'potassium', 'ph_level',
+            'moisture', 'temperature', 'rainfall', 'timestamp'
+        )
+
+    def create(self, validated_data):
+        reading = SoilData(source='sensor', **validated_data)
+        save_sensor_readings([reading])
+        return reading
 
 class SensorDeviceSerializer(serializers.ModelSerializer):
     class Meta:
@@ -20,6 +65,7 @@ class CropRecommendationSerializer(serializers.ModelSerializer):
     class Meta:
         model = CropRecommendation
         fields = '__all__'
+        read_only_fields = ['generated']
 
 class SystemFeedbackSerializer(serializers.ModelSerializer):
     class Meta:
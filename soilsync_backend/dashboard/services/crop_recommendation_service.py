@@ -1,37 +1,108 @@
-import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import StandardScaler
-import joblib
+import logging
 import os
+import threading
 from django.conf import settings
-from .models import SoilData, CropRecommendation
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from api.models import SoilData
+from ..models import CropRecommendation
+from .inference import FusedCropModel
+
+# SoilData fields in the order the model was trained on
+# (N, P, K, temperature, humidity, ph, rainfall)
+FEATURE_FIELDS = ['nitrogen', 'phosphorus', 'potassium', 'temperature', 'humidity', 'ph', 'rainfall']
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = os.path.join(settings.BASE_DIR, 'lib', 'models')
+
 
 class CropRecommendationService:
     """
-    AI-powered crop recommendation service using machine learning
+    AI-powered crop recommendation service using machine learning.
+
+    Artifacts are loaded lazily on first use and reloaded only when a file's
+    mtime or size changes. Use get_recommendation_service() to share one
+    instance per artifact pair across requests and threads.
     """
-    
-    def __init__(self):
-        self.model_path = os.path.join(settings.BASE_DIR, 'lib', 'models', 'crop_recommendation_model.pkl')
-        self.scaler_path = os.path.join(settings.BASE_DIR, 'lib', 'models', 'crop_scaler.pkl')
-        self.model = None
-        self.scaler = None
-        self.load_model()
-    
+
+    def __init__(self, model_path=None, scaler_path=None):
+        self.model_path = model_path or os.path.join(MODEL_DIR, 'crop_recommendation_model.pkl')
+        self.scaler_path = scaler_path or os.path.join(MODEL_DIR, 'crop_scaler.pkl')
+        self._loaded = (None, None, None)
+        self._version = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        return self.get_artifacts()[0]
+
+    @property
+    def scaler(self):
+        return self.get_artifacts()[1]
+
+    def artifact_version(self):
+        """(mtime, size) of each artifact file, or None for a missing file"""
+        version = []
+        for path in (self.model_path, self.scaler_path):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                version.append(None)
+            else:
+                version.append((stat.st_mtime_ns, stat.st_size))
+        return tuple(version)
+
+    def _get_loaded(self):
+        version = self.artifact_version()
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._loaded = self._read_artifacts(version)
+                    self._version = version
+        return self._loaded
+
+    def get_artifacts(self):
+        """Return the (model, scaler) pair, loading it if the files changed"""
+        return self._get_loaded()[:2]
+
+    def get_predictor(self):
+        """The FusedCropModel for the current artifacts, or None"""
+        return self._get_loaded()[2]
+
     def load_model(self):
-        """Load the trained ML model and scaler"""
+        """Force the artifacts to be read again on next use"""
+        with self._lock:
+            self._version = None
+        return self.get_artifacts()
+
+    def _read_artifacts(self, version):
+        if None in version:
+            logger.warning(
+                f"Crop recommendation model not found at {self.model_path}; "
+                f"run `manage.py train_recommendation_model` to create it"
+            )
+            return None, None, None
         try:
-            if os.path.exists(self.model_path):
-                self.model = joblib.load(self.model_path)
-            if os.path.exists(self.scaler_path):
-                self.scaler = joblib.load(self.scaler_path)
+            import joblib
+            model, scaler = joblib.load(self.model_path), joblib.load(self.scaler_path)
+            return model, scaler, FusedCropModel(model, scaler)
         except Exception as e:
-            print(f"Error loading model: {e}")
-            self.train_model()
-    
+            logger.error(f"Error loading crop recommendation model: {e}")
+            return None, None, None
+
     def train_model(self):
-        """Train the crop recommendation model with sample data"""
+        """
+        Train the crop recommendation model with sample data. This is an
+        offline step (see the train_recommendation_model command); the
+        request path never trains.
+        """
+        import joblib
+        import pandas as pd
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.preprocessing import StandardScaler
+
         # Sample training data - in production, this would be loaded from a dataset
         training_data = {
             'N': [90, 85, 60, 50, 75, 65, 70, 80, 95, 70],
@@ -51,47 +122,31 @@ class CropRecommendationService:
         y = df['label']
         
         # Scale features
-        self.scaler = StandardScaler()
-        X_scaled = self.scaler.fit_transform(X)
+        scaler = StandardScaler()
+        X_scaled = scaler.fit_transform(X)
         
         # Train model
-        self.model = RandomForestClassifier(n_estimators=100, random_state=42)
-        self.model.fit(X_scaled, y)
+        model = RandomForestClassifier(n_estimators=100, random_state=42)
+        model.fit(X_scaled, y)
         
-        # Save model
+        # Save model; other processes pick it up from the changed mtime
         os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
-        joblib.dump(self.model, self.model_path)
-        joblib.dump(self.scaler, self.scaler_path)
+        joblib.dump(model, self.model_path)
+        joblib.dump(scaler, self.scaler_path)
+        return self.load_model()
     
     def predict_crop(self, soil_data):
         """Predict the best crop for given soil conditions"""
-        if not self.model or not self.scaler:
+        predictor = self.get_predictor()
+        if predictor is None:
             return None
-        
-        # Prepare features
-        features = np.array([[
-            soil_data.nitrogen,
-            soil_data.phosphorus,
-            soil_data.potassium,
-            soil_data.temperature,
-            soil_data.moisture,
-            soil_data.ph_level,
-            soil_data.rainfall
-        ]])
-        
-        # Scale features
-        features_scaled = self.scaler.transform(features)
-        
-        # Get prediction and probability
-        prediction = self.model.predict(features_scaled)[0]
-        probabilities = self.model.predict_proba(features_scaled)[0]
-        
-        # Get confidence score
-        max_prob = max(probabilities)
-        
+
+        features = [getattr(soil_data, field) for field in FEATURE_FIELDS]
+        crop, probability = predictor.predict_topk(features, 1)[0][0]
+
         return {
-            'crop': prediction,
-            'confidence': max_prob * 100
+            'crop': crop,
+            'confidence': probability * 100
         }
     
     def generate_recommendations(self, soil_data_id):
@@ -111,44 +166,97 @@ class CropRecommendationService:
             result = self.predict_crop(soil_data)
             
             if result:
-                recommendation = CropRecommendation.objects.create(
-                    soil_data=soil_data,
-                    crop_name=result['crop'],
-                    suitability_score=result['confidence']
-                )
+                try:
+                    with transaction.atomic():
+                        recommendation = CropRecommendation.objects.create(
+                            soil_data=soil_data,
+                            recommended_crop=result['crop'],
+                            confidence_score=result['confidence'],
+                            generated=True
+                        )
+                except IntegrityError:
+                    # Scored concurrently by the queue or a backfill
+                    return CropRecommendation.objects.filter(soil_data=soil_data, generated=True).first()
                 
                 return recommendation
             
         except SoilData.DoesNotExist:
             return None
     
+    def predict_batch(self, features):
+        """
+        Score a (n, 7) feature matrix in FEATURE_FIELDS order with a single
+        predict_proba call. Returns a list of (crop, confidence) pairs.
+        """
+        predictor = self.get_predictor()
+        if predictor is None or not len(features):
+            return []
+        return [
+            (crop, probability * 100)
+            for [(crop, probability)] in predictor.predict_topk(features, 1)
+        ]
+
+    def generate_recommendations_batch(self, soil_data_ids=None, batch_size=1000):
+        """
+        Create recommendations for readings that have none, ``batch_size`` rows
+        at a time: one query to fetch features, one predict_proba and one
+        bulk_create per batch. Covers every reading when ``soil_data_ids`` is
+        None. Yields the number of readings scored per batch; readings scored
+        concurrently elsewhere are skipped on insert. Stops without scoring
+        anything while the model is missing.
+        """
+        rows = SoilData.objects.sensor_readings().filter(dashboard_recommendations__isnull=True)
+        if soil_data_ids is not None:
+            rows = rows.filter(id__in=list(soil_data_ids))
+        rows = rows.order_by('id').values_list('id', *FEATURE_FIELDS)
+
+        last_id = 0
+        while True:
+            batch = list(rows.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                return
+            last_id = batch[-1][0]
+            features = np.array([row[1:] for row in batch], dtype=float)
+            results = self.predict_batch(features)
+            if not results:
+                logger.warning(f"Crop recommendation model not loaded, {len(batch)} readings left unscored")
+                return
+            now = timezone.now()
+            CropRecommendation.objects.bulk_create([
+                CropRecommendation(
+                    soil_data_id=row[0],
+                    recommended_crop=crop,
+                    confidence_score=confidence,
+                    recommendation_date=now,
+                    generated=True
+                )
+                for row, (crop, confidence) in zip(batch, results)
+            ], batch_size=batch_size, ignore_conflicts=True)
+            yield len(results)
+
     def get_top_recommendations(self, soil_data, top_n=3):
         """Get top N crop recommendations for given soil conditions"""
-        if not self.model or not self.scaler:
+        predictor = self.get_predictor()
+        if predictor is None:
             return []
-        
-        features = np.array([[
-            soil_data.nitrogen,
-            soil_data.phosphorus,
-            soil_data.potassium,
-            soil_data.temperature,
-            soil_data.moisture,
-            soil_data.ph_level,
-            soil_data.rainfall
-        ]])
-        
-        features_scaled = self.scaler.transform(features)
-        
-        # Get probabilities for all classes
-        probabilities = self.model.predict_proba(features_scaled)[0]
-        classes = self.model.classes_
-        
-        # Create list of (crop, probability) pairs
-        recommendations = [
-            {'crop': crop, 'confidence': prob * 100}
-            for crop, prob in zip(classes, probabilities)
+
+        features = [getattr(soil_data, field) for field in FEATURE_FIELDS]
+        return [
+            {'crop': crop, 'confidence': probability * 100}
+            for crop, probability in predictor.predict_topk(features, top_n)[0]
         ]
-        
-        # Sort by confidence and return top N
-        recommendations.sort(key=lambda x: x['confidence'], reverse=True)
-        return recommendations[:top_n]
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_recommendation_service(model_path=None, scaler_path=None):
+    """Process-wide CropRecommendationService for an artifact pair"""
+    key = (model_path, scaler_path)
+    service = _services.get(key)
+    if service is None:
+        with _services_lock:
+            service = _services.get(key)
+            if service is None:
+                service = _services[key] = CropRecommendationService(model_path, scaler_path)
+    return service
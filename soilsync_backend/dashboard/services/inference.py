@@ -0,0 +1,107 @@
+import threading
+import numpy as np
+
+
+class FusedCropModel:
+    """
+    A fitted StandardScaler and random forest folded into one predictor for
+    the trusted internal path.
+
+    The scaler becomes a precomputed (mean, scale) pair applied in place, and
+    each tree's leaf values are normalised to class probabilities once up
+    front. A prediction is then one ``tree_.apply`` per tree plus a gather,
+    with none of sklearn's input validation, feature-name checks or joblib
+    dispatch. The results are bit-identical to
+    ``model.predict_proba(scaler.transform(X))``.
+
+    Single samples reuse per-thread preallocated buffers. Models that are not
+    single-output tree ensembles fall back to ``model.predict_proba``.
+    """
+
+    def __init__(self, model, scaler=None):
+        self.model = model
+        self.classes_ = model.classes_
+        self.n_features = model.n_features_in_
+        self._mean = None
+        self._scale = None
+        if scaler is not None:
+            if scaler.with_mean:
+                self._mean = np.asarray(scaler.mean_, dtype=np.float64)
+            if scaler.with_std:
+                self._scale = np.asarray(scaler.scale_, dtype=np.float64)
+        self._trees = self._compile_trees(model)
+        self._local = threading.local()
+
+    @staticmethod
+    def _compile_trees(model):
+        estimators = getattr(model, 'estimators_', None)
+        if not estimators or getattr(model, 'n_outputs_', 1) != 1:
+            return None
+        n_classes = len(model.classes_)
+        trees = []
+        for estimator in estimators:
+            tree = getattr(estimator, 'tree_', None)
+            if tree is None:
+                return None
+            # Same normalisation DecisionTreeClassifier.predict_proba applies
+            # per call, done once per leaf
+            values = np.array(tree.value[:, 0, :n_classes], dtype=np.float64)
+            normalizer = values.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            values /= normalizer
+            trees.append((tree, values))
+        return trees
+
+    def _buffers(self):
+        buffers = getattr(self._local, 'buffers', None)
+        if buffers is None:
+            buffers = self._local.buffers = (
+                np.empty((1, self.n_features), dtype=np.float64),
+                np.empty((1, self.n_features), dtype=np.float32),
+                np.empty((1, len(self.classes_)), dtype=np.float64),
+            )
+        return buffers
+
+    def _proba_into(self, X64, X32, out):
+        if self._mean is not None:
+            np.subtract(X64, self._mean, out=X64)
+        if self._scale is not None:
+            np.divide(X64, self._scale, out=X64)
+        if self._trees is None:
+            out[...] = self.model.predict_proba(X64)
+            return out
+        # Trees split on float32 features, as sklearn's input check casts them
+        X32[...] = X64
+        out.fill(0.0)
+        for tree, values in self._trees:
+            out += values.take(tree.apply(X32), axis=0)
+        out /= len(self._trees)
+        return out
+
+    def predict_proba(self, X):
+        """Class probabilities for raw (unscaled) features, shape (n, n_classes)"""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[0] == 1:
+            X64, X32, out = self._buffers()
+            X64[...] = X
+            return self._proba_into(X64, X32, out).copy()
+        X64 = np.array(X, dtype=np.float64, order='C')
+        X32 = np.empty(X64.shape, dtype=np.float32)
+        out = np.empty((X64.shape[0], len(self.classes_)), dtype=np.float64)
+        return self._proba_into(X64, X32, out)
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+    def predict_topk(self, X, k=3):
+        """
+        The ``k`` most likely crops per row as lists of (crop, probability),
+        most likely first. Ties keep class order, matching ``predict``.
+        """
+        probabilities = self.predict_proba(X)
+        order = np.argsort(-probabilities, axis=1, kind='stable')[:, :k]
+        crops = self.classes_[order].tolist()
+        scores = np.take_along_axis(probabilities, order, axis=1).tolist()
+        return [list(zip(row_crops, row_scores)) for row_crops, row_scores in zip(crops, scores)]
@@ -0,0 +1,194 @@
+import atexit
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from api.ingestion import sensor_reading, save_sensor_readings
+
+logger = logging.getLogger(__name__)
+
+# Canonical reading layout. Compact array readings list values in this order,
+# which matches the firmware's CSV output (moisture, temperature, pH, N, P, K)
+# with the timestamp in front and rainfall optional at the end.
+READING_FIELDS = ['ts', 'moisture', 'temperature', 'ph_level', 'nitrogen', 'phosphorus', 'potassium', 'rainfall']
+
+# Object readings may use the short keys, the dashboard field names or the
+# names the mobile app uses for the same values.
+FIELD_ALIASES = {
+    'ts': 'ts', 'timestamp': 'ts',
+    'm': 'moisture', 'moisture': 'moisture', 'humidity': 'moisture',
+    't': 'temperature', 'temp': 'temperature', 'temperature': 'temperature',
+    'ph': 'ph_level', 'ph_level': 'ph_level',
+    'n': 'nitrogen', 'nitrogen': 'nitrogen',
+    'p': 'phosphorus', 'phosphorus': 'phosphorus',
+    'k': 'potassium', 'potassium': 'potassium',
+    'r': 'rainfall', 'rainfall': 'rainfall',
+}
+
+# Plausible ranges for the RS485 soil sensor registers
+READING_RANGES = {
+    'moisture': (0.0, 100.0),
+    'temperature': (-40.0, 80.0),
+    'ph_level': (0.0, 14.0),
+    'nitrogen': (0.0, 2000.0),
+    'phosphorus': (0.0, 2000.0),
+    'potassium': (0.0, 2000.0),
+    'rainfall': (0.0, 5000.0),
+}
+
+REQUIRED_FIELDS = ('moisture', 'temperature', 'ph_level', 'nitrogen', 'phosphorus', 'potassium')
+
+
+class ReadingValidationError(ValueError):
+    pass
+
+
+def parse_payload(body, content_type=''):
+    """
+    Decode a batch of readings from a request body. Accepts a JSON array,
+    a JSON object with a ``readings`` array, or newline-delimited JSON with
+    one reading per line.
+    """
+    text = body.decode('utf-8') if isinstance(body, bytes) else body
+    if 'ndjson' in content_type or 'jsonlines' in content_type:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    payload = json.loads(text)
+    if isinstance(payload, dict):
+        payload = payload.get('readings', [])
+    if not isinstance(payload, list):
+        raise ReadingValidationError('Expected a list of readings')
+    return payload
+
+
+def normalize_reading(raw, now):
+    """Turn one compact reading (array or object) into sensor reading field values"""
+    if isinstance(raw, (list, tuple)):
+        if not 7 <= len(raw) <= len(READING_FIELDS):
+            raise ReadingValidationError(f'Array readings need 7 or {len(READING_FIELDS)} values')
+        values = dict(zip(READING_FIELDS, raw))
+    elif isinstance(raw, dict):
+        # Unknown keys (e.g. the sensor's EC register) are ignored
+        values = {}
+        for key, value in raw.items():
+            field = FIELD_ALIASES.get(key.lower())
+            if field is not None:
+                values[field] = value
+    else:
+        raise ReadingValidationError('Reading must be an array or an object')
+
+    reading = {}
+    for field in REQUIRED_FIELDS:
+        if values.get(field) is None:
+            raise ReadingValidationError(f'Missing {field}')
+    for field, (low, high) in READING_RANGES.items():
+        value = values.get(field, 0.0)
+        if value is None:
+            value = 0.0
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ReadingValidationError(f'{field} must be a number')
+        if not low <= value <= high:
+            raise ReadingValidationError(f'{field} out of range [{low}, {high}]')
+        reading[field] = float(value)
+
+    ts = values.get('ts')
+    if ts is None:
+        reading['timestamp'] = now
+    elif isinstance(ts, (int, float)) and not isinstance(ts, bool):
+        reading['timestamp'] = datetime.fromtimestamp(ts, tz=dt_timezone.utc)
+    else:
+        raise ReadingValidationError('ts must be a Unix timestamp')
+    return reading
+
+
+def validate_readings(raw_readings, max_errors=50):
+    """Validate a batch, returning (valid readings, first ``max_errors`` errors)"""
+    now = timezone.now()
+    valid, errors = [], []
+    for index, raw in enumerate(raw_readings):
+        try:
+            valid.append(normalize_reading(raw, now))
+        except (ReadingValidationError, TypeError, ValueError, OverflowError, OSError) as e:
+            if len(errors) < max_errors:
+                errors.append({'index': index, 'error': str(e)})
+    return valid, errors
+
+
+class ReadingBuffer:
+    """
+    Buffers validated sensor readings in memory and writes them to the
+    canonical SoilData table with bulk_create once ``max_readings`` are pending
+    or the oldest pending reading is ``max_delay`` seconds old.
+    SensorDevice.last_updated is bumped once per device per flush.
+    """
+
+    def __init__(self, max_readings=2000, max_delay=1.0, batch_size=1000):
+        self.max_readings = max_readings
+        self.max_delay = max_delay
+        self.batch_size = batch_size
+        self._pending = []
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+
+    def add(self, device, user, readings):
+        rows = [
+            sensor_reading(device, user, reading)
+            for reading in readings
+        ]
+        with self._lock:
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending.extend(rows)
+            full = len(self._pending) >= self.max_readings
+        if full or self.max_delay <= 0:
+            self.flush()
+        else:
+            self._ensure_timer()
+        return len(rows)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                rows, self._pending, self._oldest = self._pending, [], None
+            if not rows:
+                return 0
+            return save_sensor_readings(rows, self.batch_size)
+
+    def _ensure_timer(self):
+        with self._lock:
+            if self._timer is not None and self._timer.is_alive():
+                return
+            self._timer = threading.Thread(target=self._run_timer, name='sensor-ingest-flush', daemon=True)
+            self._timer.start()
+
+    def _run_timer(self):
+        try:
+            while True:
+                with self._lock:
+                    if not self._pending:
+                        self._timer = None
+                        return
+                    wait = self._oldest + self.max_delay - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                    continue
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception('Failed to flush buffered sensor readings')
+        finally:
+            connection.close()
+
+
+_ingest_settings = getattr(settings, 'SENSOR_INGEST', {})
+reading_buffer = ReadingBuffer(
+    max_readings=_ingest_settings.get('MAX_BUFFERED_READINGS', 2000),
+    max_delay=_ingest_settings.get('MAX_FLUSH_DELAY', 1.0),
+    batch_size=_ingest_settings.get('BULK_BATCH_SIZE', 1000),
+)
+atexit.register(reading_buffer.flush)
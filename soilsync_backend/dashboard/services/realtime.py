@@ -0,0 +1,230 @@
+"""
+In-process publish/subscribe of new predictions and sensor readings for the
+dashboard's Server-Sent Events stream.
+
+The ingestion service publishes every committed write once; each event gets
+the next cursor (``<epoch>-<sequence>``, the epoch changing per process) and
+is serialized to JSON at most once, on first delivery. Events covering the
+last ``history`` items (a prediction is one item, a batch of sensor readings
+one per reading) are kept so a client reconnecting with a cursor is sent only
+what it missed. Every client has its own buffer of at most ``client_buffer``
+items; a client that falls further behind, or whose cursor is no longer in the
+history, is sent a ``reset`` event and should reload the snapshot from
+/dashboard/api/predictions/realtime/.
+
+Only writes made by this process are seen, so with several workers each
+stream reflects the worker it is connected to. Under ASGI streams are
+served by AsyncEventStream and wait on the event loop, not on a thread.
+"""
+import asyncio
+import json
+import secrets
+import threading
+import time
+from collections import deque
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+class Event:
+    __slots__ = ('seq', 'kind', 'size', '_render', '_data')
+
+    def __init__(self, seq, kind, size, render):
+        self.seq = seq
+        self.kind = kind
+        self.size = size
+        self._render = render
+        self._data = None
+
+    def data(self):
+        if self._data is None:
+            self._data = json.dumps(self._render(), cls=DjangoJSONEncoder)
+            self._render = None
+        return self._data
+
+
+class Subscription:
+    def __init__(self, feed, max_items):
+        self.feed = feed
+        self.max_items = max_items
+        self.overflowed = False
+        self._events = []
+        self._size = 0
+        self._condition = threading.Condition()
+        self._waiter = None
+
+    def push(self, events):
+        with self._condition:
+            if self.overflowed:
+                return
+            self._size += sum(event.size for event in events)
+            if self._size > self.max_items:
+                self.overflowed = True
+                self._events = []
+            else:
+                self._events.extend(events)
+            self._condition.notify()
+            if self._waiter is not None:
+                loop, ready = self._waiter
+                loop.call_soon_threadsafe(ready.set)
+
+    def get(self, timeout):
+        """Events published since the last call, waiting up to ``timeout`` seconds; None once overflowed"""
+        with self._condition:
+            if not self._events and not self.overflowed:
+                self._condition.wait(timeout)
+            if self.overflowed:
+                return None
+            events, self._events, self._size = self._events, [], 0
+            return events
+
+    async def aget(self, timeout):
+        """``get`` for a stream served on an event loop"""
+        with self._condition:
+            if not self._events and not self.overflowed:
+                self._waiter = (asyncio.get_running_loop(), asyncio.Event())
+        if self._waiter is not None:
+            try:
+                await asyncio.wait_for(self._waiter[1].wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            with self._condition:
+                self._waiter = None
+        return self.get(0)
+
+    def close(self):
+        self.feed.unsubscribe(self)
+
+
+class EventStream:
+    """
+    SSE body for one subscription: events as they arrive, a comment line
+    every ``heartbeat`` seconds while idle, and an end after ``max_seconds``
+    so the client reconnects (with Last-Event-ID) and frees the thread.
+    """
+
+    def __init__(self, subscription, heartbeat=15.0, max_seconds=45.0):
+        self.subscription = subscription
+        self.heartbeat = heartbeat
+        self.max_seconds = max_seconds
+
+    def __iter__(self):
+        deadline = time.monotonic() + self.max_seconds
+        yield 'retry: 1000\n\n'
+        while time.monotonic() < deadline:
+            events = self.subscription.get(self._timeout(deadline))
+            yield self._frames(events)
+            if events is None:
+                return
+
+    def _timeout(self, deadline):
+        return min(self.heartbeat, max(deadline - time.monotonic(), 0))
+
+    def _frames(self, events):
+        feed = self.subscription.feed
+        if events is None:
+            cursor = feed.cursor()
+            return f'id: {cursor}\nevent: reset\ndata: {json.dumps({"cursor": cursor})}\n\n'
+        if not events:
+            return ': heartbeat\n\n'
+        return ''.join(
+            f'id: {feed.cursor(event.seq)}\nevent: {event.kind}\ndata: {event.data()}\n\n'
+            for event in events
+        )
+
+    def close(self):
+        self.subscription.close()
+
+
+class AsyncEventStream(EventStream):
+    """EventStream for ASGI responses, waiting for events on the event loop"""
+
+    __iter__ = None
+
+    async def __aiter__(self):
+        deadline = time.monotonic() + self.max_seconds
+        yield 'retry: 1000\n\n'
+        while time.monotonic() < deadline:
+            events = await self.subscription.aget(self._timeout(deadline))
+            yield self._frames(events)
+            if events is None:
+                return
+
+
+class RealtimeFeed:
+    def __init__(self, history=5000, client_buffer=2000, max_clients=16, enabled=True):
+        self.history = history
+        self.client_buffer = client_buffer
+        self.max_clients = max_clients
+        self.enabled = enabled
+        self.epoch = secrets.token_hex(4)
+        self._seq = 0
+        self._events = deque()
+        self._size = 0
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def cursor(self, seq=None):
+        return f'{self.epoch}-{self._seq if seq is None else seq}'
+
+    def publish(self, kind, render, size=1):
+        """Publish an event of ``size`` items whose data is ``render()``, called at most once and only if delivered"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._seq += 1
+            event = Event(self._seq, kind, size, render)
+            self._events.append(event)
+            self._size += size
+            while self._size > self.history and len(self._events) > 1:
+                self._size -= self._events.popleft().size
+            for subscription in self._subscribers:
+                subscription.push([event])
+
+    def subscribe(self, cursor=None):
+        """
+        A Subscription receiving events after ``cursor`` (all new events when
+        None), or None when ``max_clients`` streams are already open.
+        """
+        with self._lock:
+            if not self.enabled or len(self._subscribers) >= self.max_clients:
+                return None
+            subscription = Subscription(self, self.client_buffer)
+            if cursor:
+                epoch, _, seq = cursor.partition('-')
+                oldest = self._events[0].seq - 1 if self._events else self._seq
+                if epoch != self.epoch or not seq.isdigit() or not oldest <= int(seq) <= self._seq:
+                    subscription.overflowed = True
+                else:
+                    subscription.push([event for event in self._events if event.seq > int(seq)])
+            self._subscribers.add(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def stats(self):
+        with self._lock:
+            return {'enabled': self.enabled, 'cursor': self.cursor(), 'clients': len(self._subscribers)}
+
+
+def publish_prediction(reading):
+    """Publish a stored prediction in the shape of the /dashboard/api/predictions/ routes"""
+    from ..serializers import PredictionResultSerializer
+    realtime_feed.publish('prediction', lambda: PredictionResultSerializer(reading).data)
+
+
+def publish_readings(rows):
+    """Publish a batch of stored sensor readings in the shape of /dashboard/api/soil-data/"""
+    from ..serializers import SoilDataSerializer
+    realtime_feed.publish('readings', lambda: SoilDataSerializer(rows, many=True).data, size=len(rows))
+
+
+_feed_settings = getattr(settings, 'REALTIME_FEED', {})
+realtime_feed = RealtimeFeed(
+    history=_feed_settings.get('HISTORY', 5000),
+    client_buffer=_feed_settings.get('CLIENT_BUFFER', 2000),
+    max_clients=_feed_settings.get('MAX_CLIENTS', 16),
+    enabled=_feed_settings.get('ENABLED', True),
+)
@@ -0,0 +1,76 @@
+import logging
+import threading
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class RecommendationQueue:
+    """
+    Collects ids of new soil readings and scores them on a background thread,
+    ``batch_size`` readings per predict_proba call and bulk_create. The worker
+    exits once the queue is empty, or while the recommendation model is
+    missing (keeping the readings queued), and is restarted by the next enqueue.
+    """
+
+    def __init__(self, batch_size=500, enabled=True):
+        self.batch_size = batch_size
+        self.enabled = enabled
+        self._pending = []
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def enqueue(self, soil_data_ids):
+        if not self.enabled:
+            return
+        ids = [pk for pk in soil_data_ids if pk is not None]
+        if not ids:
+            return
+        with self._lock:
+            self._pending.extend(ids)
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._worker = threading.Thread(target=self._run, name='crop-recommendation-worker', daemon=True)
+            self._worker.start()
+
+    def drain(self):
+        """Score everything pending on the calling thread; returns rows written"""
+        from .crop_recommendation_service import get_recommendation_service
+        service = get_recommendation_service()
+        written = 0
+        while True:
+            if service.get_predictor() is None:
+                with self._lock:
+                    pending = len(self._pending)
+                if pending:
+                    logger.warning(f"Crop recommendation model not loaded, keeping {pending} readings queued")
+                return written
+            with self._lock:
+                batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+            if not batch:
+                return written
+            written += sum(service.generate_recommendations_batch(batch, self.batch_size))
+
+    def _run(self):
+        from .crop_recommendation_service import get_recommendation_service
+        try:
+            while True:
+                try:
+                    self.drain()
+                except Exception:
+                    logger.exception('Failed to generate queued crop recommendations')
+                stalled = get_recommendation_service().get_predictor() is None
+                with self._lock:
+                    if not self._pending or stalled:
+                        self._worker = None
+                        return
+        finally:
+            connection.close()
+
+
+_queue_settings = getattr(settings, 'CROP_RECOMMENDATION_QUEUE', {})
+recommendation_queue = RecommendationQueue(
+    batch_size=_queue_settings.get('BATCH_SIZE', 500),
+    enabled=_queue_settings.get('ENABLED', True),
+)
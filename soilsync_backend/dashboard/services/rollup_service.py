@@ -0,0 +1,292 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Sum, Min, Max, Q
+from django.db.models.functions import TruncHour, TruncDay
+from django.utils import timezone
+from api.models import SoilData
+from ..models import HourlySoilRollup, DailySoilRollup, RollupWatermark
+
+PARAMETERS = ['nitrogen', 'phosphorus', 'potassium', 'temperature', 'humidity', 'ph', 'rainfall']
+
+# Slices of the canonical readings table folded into the rollups, each with
+# its own watermark: predictions (made by the API or reported by the app) and
+# sensor readings. Rows without a user are rolled up under a NULL user.
+SOURCES = {
+    'api': {
+        'rows': lambda: SoilData.objects.predictions(),
+        'time_field': 'created_at',
+        'sensor_field': None,
+        'prediction_field': 'prediction',
+        'fields': {param: param for param in PARAMETERS},
+    },
+    'sensor': {
+        'rows': lambda: SoilData.objects.sensor_readings(),
+        'time_field': 'created_at',
+        'sensor_field': 'sensor_id',
+        'prediction_field': None,
+        'fields': {param: param for param in PARAMETERS},
+    },
+}
+
+GRANULARITIES = (
+    (HourlySoilRollup, TruncHour),
+    (DailySoilRollup, TruncDay),
+)
+
+_rollup_settings = getattr(settings, 'SOIL_ROLLUPS', {})
+# Rows created less than this long ago are left for the next compaction, so
+# a transaction still committing a lower id is not skipped by the watermark
+COMPACTION_LAG = timedelta(seconds=_rollup_settings.get('COMPACTION_LAG_SECONDS', 60))
+# How far back each compaction run recomputes buckets, picking up rows that
+# committed after the watermark had already passed their id
+RECONCILE_WINDOW = timedelta(hours=_rollup_settings.get('RECONCILE_HOURS', 24))
+
+
+class SoilRollupService:
+    """
+    Maintains hourly and daily soil reading rollups so analytics views read
+    O(buckets) rows instead of rescanning the raw readings tables. Rollups
+    are written by `manage.py compact_soil_rollups`, never on a read; reads
+    add the raw rows the watermark has not reached yet.
+    """
+
+    @classmethod
+    def compact(cls, source='api', now=None):
+        """Fold raw rows newer than the watermark, and older than COMPACTION_LAG, into the rollup tables"""
+        config = SOURCES[source]
+        cutoff = (now or timezone.now()) - COMPACTION_LAG
+        watermark, _ = RollupWatermark.objects.get_or_create(source=source)
+        upper = config['rows']().filter(
+            id__gt=watermark.last_id, **{f"{config['time_field']}__lte": cutoff}
+        ).aggregate(upper=Max('id'))['upper']
+        if upper is None:
+            return 0
+
+        with transaction.atomic():
+            # Claim the id range first; a concurrent compaction that read the
+            # same watermark will fail this update and back off.
+            claimed = RollupWatermark.objects.filter(
+                pk=watermark.pk, last_id=watermark.last_id
+            ).update(last_id=upper, updated_at=timezone.now())
+            if not claimed:
+                return 0
+
+            rows = config['rows']().filter(id__gt=watermark.last_id, id__lte=upper)
+            for rollup_model, trunc in GRANULARITIES:
+                cls._merge(rollup_model, source, cls._aggregate(rows, source, trunc))
+            return rows.count()
+
+    @classmethod
+    def rebuild(cls, source='api', now=None):
+        """Drop and recompute every rollup for a source from the raw table"""
+        with transaction.atomic():
+            for rollup_model, _ in GRANULARITIES:
+                rollup_model.objects.filter(source=source).delete()
+            RollupWatermark.objects.filter(source=source).delete()
+        return cls.compact(source, now=now)
+
+    @classmethod
+    def reconcile(cls, source='api', now=None, window=RECONCILE_WINDOW):
+        """
+        Recompute every bucket from the start of the day ``window`` before
+        ``now`` from the rows the watermark covers, including rows that
+        committed after compaction had moved past their id.
+        """
+        config = SOURCES[source]
+        watermark = RollupWatermark.objects.filter(source=source).first()
+        if watermark is None:
+            return
+        start = timezone.localtime((now or timezone.now()) - window).replace(hour=0, minute=0, second=0, microsecond=0)
+        rows = config['rows']().filter(id__lte=watermark.last_id, **{f"{config['time_field']}__gte": start})
+        with transaction.atomic():
+            for rollup_model, trunc in GRANULARITIES:
+                rollup_model.objects.filter(source=source, bucket_start__gte=start).delete()
+                cls._merge(rollup_model, source, cls._aggregate(rows, source, trunc))
+
+    @classmethod
+    def refresh_buckets(cls, source, user_id, timestamp, sensor_id=None):
+        """
+        Recompute the hour and day buckets containing ``timestamp`` after a raw
+        row was edited or deleted. Only rows already covered by the watermark
+        are counted; newer rows are picked up by the next compaction.
+        """
+        config = SOURCES[source]
+        watermark = RollupWatermark.objects.filter(source=source).first()
+        if watermark is None:
+            return
+
+        local = timezone.localtime(timestamp)
+        hour_start = local.replace(minute=0, second=0, microsecond=0)
+        day_start = local.replace(hour=0, minute=0, second=0, microsecond=0)
+        bounds = (
+            (HourlySoilRollup, TruncHour, hour_start, hour_start + timedelta(hours=1)),
+            (DailySoilRollup, TruncDay, day_start, day_start + timedelta(days=1)),
+        )
+
+        with transaction.atomic():
+            for rollup_model, trunc, start, end in bounds:
+                bucket = rollup_model.objects.filter(
+                    source=source, user_id=user_id, sensor_id=sensor_id, bucket_start=start
+                )
+                bucket.delete()
+                filters = {
+                    'id__lte': watermark.last_id,
+                    'user_id': user_id,
+                    f"{config['time_field']}__gte": start,
+                    f"{config['time_field']}__lt": end,
+                }
+                if config['sensor_field']:
+                    filters[config['sensor_field']] = sensor_id
+                rows = config['rows']().filter(**filters)
+                cls._merge(rollup_model, source, cls._aggregate(rows, source, trunc))
+
+    @classmethod
+    def _aggregate(cls, rows, source, trunc):
+        """Group raw rows by (user, sensor, bucket) in a single pass"""
+        config = SOURCES[source]
+        fields = config['fields']
+        group_by = ['user_id', 'bucket']
+        if config['sensor_field']:
+            group_by.append(config['sensor_field'])
+
+        aggregates = {'reading_count': Count('id')}
+        for param, field in fields.items():
+            aggregates[f'{param}_sum'] = Sum(field)
+            aggregates[f'{param}_min'] = Min(field)
+            aggregates[f'{param}_max'] = Max(field)
+        ph_field = fields['ph']
+        aggregates['ph_acidic_count'] = Count('id', filter=Q(**{f'{ph_field}__lt': 6.0}))
+        aggregates['ph_neutral_count'] = Count('id', filter=Q(**{f'{ph_field}__gte': 6.0, f'{ph_field}__lte': 7.0}))
+        aggregates['ph_alkaline_count'] = Count('id', filter=Q(**{f'{ph_field}__gt': 7.0}))
+
+        rows = rows.order_by().annotate(bucket=trunc(config['time_field']))
+        groups = {}
+        for entry in rows.values(*group_by).annotate(**aggregates):
+            key = (entry.pop('user_id'), entry.pop(config['sensor_field'], None), entry.pop('bucket'))
+            entry['prediction_counts'] = {}
+            groups[key] = entry
+
+        if config['prediction_field']:
+            prediction_field = config['prediction_field']
+            counts = rows.values(*group_by, prediction_field).annotate(n=Count('id'))
+            for entry in counts:
+                key = (entry['user_id'], entry.get(config['sensor_field']), entry['bucket'])
+                groups[key]['prediction_counts'][entry[prediction_field]] = entry['n']
+        return groups
+
+    @classmethod
+    def _merge(cls, rollup_model, source, groups):
+        """Add aggregated groups into existing buckets, creating missing ones"""
+        for (user_id, sensor_id, bucket_start), values in groups.items():
+            lookup = {'source': source, 'user_id': user_id, 'sensor_id': sensor_id, 'bucket_start': bucket_start}
+            bucket = rollup_model.objects.select_for_update().filter(**lookup).first()
+            if bucket is None:
+                try:
+                    with transaction.atomic():
+                        bucket = rollup_model.objects.create(**lookup)
+                except IntegrityError:
+                    # A concurrent compaction or refresh created the bucket first
+                    bucket = rollup_model.objects.select_for_update().get(**lookup)
+            bucket.reading_count += values['reading_count']
+            for param in PARAMETERS:
+                setattr(bucket, f'{param}_sum', getattr(bucket, f'{param}_sum') + (values[f'{param}_sum'] or 0.0))
+                low, high = values[f'{param}_min'], values[f'{param}_max']
+                current_low, current_high = getattr(bucket, f'{param}_min'), getattr(bucket, f'{param}_max')
+                setattr(bucket, f'{param}_min', low if current_low is None else min(current_low, low))
+                setattr(bucket, f'{param}_max', high if current_high is None else max(current_high, high))
+            bucket.ph_acidic_count += values['ph_acidic_count']
+            bucket.ph_neutral_count += values['ph_neutral_count']
+            bucket.ph_alkaline_count += values['ph_alkaline_count']
+            for crop, n in values['prediction_counts'].items():
+                bucket.prediction_counts[crop] = bucket.prediction_counts.get(crop, 0) + n
+            bucket.save()
+
+    @classmethod
+    def summary(cls, user=None, source='api', since=None):
+        """
+        Totals across daily buckets plus the rows not compacted yet: reading
+        count, per-parameter averages, pH distribution and prediction counts
+        per crop.
+        """
+        buckets = DailySoilRollup.objects.filter(source=source)
+        if user is not None:
+            buckets = buckets.filter(user=user)
+        if since is not None:
+            buckets = buckets.filter(bucket_start__gte=since)
+
+        aggregates = {'count': Sum('reading_count')}
+        for param in PARAMETERS:
+            aggregates[f'{param}_sum'] = Sum(f'{param}_sum')
+        aggregates['acidic'] = Sum('ph_acidic_count')
+        aggregates['neutral'] = Sum('ph_neutral_count')
+        aggregates['alkaline'] = Sum('ph_alkaline_count')
+        totals = buckets.aggregate(**aggregates)
+
+        count = totals['count'] or 0
+        sums = {param: totals[f'{param}_sum'] or 0.0 for param in PARAMETERS}
+        ph_distribution = {label: totals[label] or 0 for label in ('acidic', 'neutral', 'alkaline')}
+        crop_counts = {}
+        for counts in buckets.values_list('prediction_counts', flat=True):
+            for crop, n in counts.items():
+                crop_counts[crop] = crop_counts.get(crop, 0) + n
+
+        for values in cls._tail(source, TruncDay, user, since).values():
+            count += values['reading_count']
+            for param in PARAMETERS:
+                sums[param] += values[f'{param}_sum'] or 0.0
+            for label in ph_distribution:
+                ph_distribution[label] += values[f'ph_{label}_count']
+            for crop, n in values['prediction_counts'].items():
+                crop_counts[crop] = crop_counts.get(crop, 0) + n
+
+        return {
+            'count': count,
+            'averages': {
+                param: (sums[param] / count if count else 0.0)
+                for param in PARAMETERS
+            },
+            'ph_distribution': ph_distribution,
+            'crop_counts': crop_counts,
+        }
+
+    @classmethod
+    def hourly_averages(cls, parameters, start, user=None, source='api'):
+        """Per-hour averages for the requested parameters since ``start``, including rows not compacted yet"""
+        buckets = HourlySoilRollup.objects.filter(source=source, bucket_start__gte=start)
+        if user is not None:
+            buckets = buckets.filter(user=user)
+
+        sums = {param: Sum(f'{param}_sum') for param in parameters if param in PARAMETERS}
+        rows = buckets.order_by().values('bucket_start').annotate(
+            count=Sum('reading_count'), **sums
+        )
+        hours = {row['bucket_start']: row for row in rows}
+        for (_, _, bucket_start), values in cls._tail(source, TruncHour, user, start).items():
+            row = hours.setdefault(bucket_start, dict({param: 0.0 for param in sums}, count=0))
+            row['count'] += values['reading_count']
+            for param in sums:
+                row[param] = (row[param] or 0.0) + (values[f'{param}_sum'] or 0.0)
+        return [
+            (bucket_start, {param: row[param] / row['count'] for param in sums})
+            for bucket_start, row in sorted(hours.items()) if row['count']
+        ]
+
+    @classmethod
+    def _tail(cls, source, trunc, user=None, start=None):
+        """
+        Rows above the watermark, grouped like the rollup buckets, so reads
+        are complete between compactions. The tail stays small as long as
+        compaction runs; without a watermark it is the whole raw table.
+        """
+        config = SOURCES[source]
+        last_id = RollupWatermark.objects.filter(source=source).values_list('last_id', flat=True).first()
+        rows = config['rows']().filter(id__gt=last_id or 0)
+        if user is not None:
+            rows = rows.filter(user=user)
+        if start is None:
+            return cls._aggregate(rows, source, trunc)
+        # Every row in a bucket starting at or after ``start`` is itself after it
+        rows = rows.filter(**{f"{config['time_field']}__gte": start})
+        groups = cls._aggregate(rows, source, trunc)
+        return {key: values for key, values in groups.items() if key[2] >= start}
@@ -1,3 +1,623 @@
-from django.test import TestCase
+import asyncio
+import joblib
+import json
+import os
+import runpy
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import skipUnless
+from unittest.mock import patch
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection, transaction
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+from api.ingestion import report_prediction, save_prediction
+from api.models import SoilData
+from api.tests import QueryPlanAssertionsMixin
+from .models import ActivityLog, CropRecommendation, HourlySoilRollup, RollupWatermark, SensorDevice
+from .services import wire_format
+from .services.ingestion_service import ReadingBuffer, ReadingValidationError, validate_readings
+from .services.realtime import EventStream, RealtimeFeed
+from .services.crop_recommendation_service import CropRecommendationService, get_recommendation_service
+from .services.recommendation_queue import RecommendationQueue, recommendation_queue
+from .services.rollup_service import SoilRollupService
+from .services.inference import FusedCropModel
 
-# Create your tests here.
+
+@skipUnless(connection.vendor == 'sqlite', 'Query plan assertions are written against SQLite EXPLAIN output')
+class HotQueryPlanTests(QueryPlanAssertionsMixin, TestCase):
+    def test_latest_predictions(self):
+        queryset = SoilData.objects.predictions().order_by('-created_at')[:50]
+        self.assertUsesIndex(queryset, 'soil_data_predictions_idx')
+
+    def test_predictions_since(self):
+        queryset = SoilData.objects.predictions().filter(created_at__gte='2025-01-01')
+        self.assertUsesIndex(queryset, 'soil_data_predictions_idx')
+
+    def test_latest_sensor_readings(self):
+        queryset = SoilData.objects.sensor_readings().order_by('-created_at')
+        self.assertUsesIndex(queryset, 'soil_data_source_created_idx')
+
+    def test_activity_logs_newest_first(self):
+        queryset = ActivityLog.objects.select_related('user').order_by('-timestamp')
+        self.assertUsesIndex(queryset, 'activitylog_timestamp_idx')
+
+
+class CanonicalReadingTests(TestCase):
+    FEATURES = {
+        'nitrogen': 90.0, 'phosphorus': 42.0, 'potassium': 43.0, 'temperature': 20.8,
+        'humidity': 82.0, 'ph': 6.5, 'rainfall': 202.9,
+    }
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='farmer', password='testpass123')
+        self.client = APIClient()
+
+    def report(self, **fields):
+        payload = dict(self.FEATURES, crop_name='rice', confidence_score=91.0)
+        payload.update(fields)
+        return self.client.post('/dashboard/api/predictions/', payload, format='json')
+
+    def test_report_of_app_prediction_reuses_its_row(self):
+        reading = save_prediction(self.user, self.FEATURES, 'rice', 91.0)
+        response = self.report(user_id='farmer', location='North field', predicted_yield=3.5)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['id'], reading.id)
+        self.assertTrue(response.data['duplicate'])
+        self.assertEqual(SoilData.objects.count(), 1)
+        reading.refresh_from_db()
+        self.assertEqual((reading.source, reading.location, reading.predicted_yield), ('app', 'North field', 3.5))
+
+    def test_unmatched_report_is_stored(self):
+        save_prediction(self.user, self.FEATURES, 'maize', 60.0)
+        response = self.report(user_id=str(self.user.pk), device_id='phone-1')
+        self.assertFalse(response.data['duplicate'])
+        reading = SoilData.objects.get(pk=response.data['id'])
+        self.assertEqual((reading.source, reading.user, reading.prediction), ('report', self.user, 'rice'))
+        self.assertEqual(reading.device_id, 'phone-1')
+
+    def test_report_without_known_user_never_touches_app_rows(self):
+        reading = save_prediction(self.user, self.FEATURES, 'rice', 91.0)
+        for user_id in (None, 'nobody'):
+            payload = {'location': 'Elsewhere'} if user_id is None else {'location': 'Elsewhere', 'user_id': user_id}
+            response = self.report(**payload)
+            self.assertFalse(response.data['duplicate'])
+            self.assertEqual(SoilData.objects.get(pk=response.data['id']).source, 'report')
+        reading.refresh_from_db()
+        self.assertEqual(reading.location, '')
+
+    def test_report_outside_match_window_is_stored(self):
+        reading = save_prediction(self.user, self.FEATURES, 'rice', 91.0)
+        _, created = report_prediction(
+            dict(self.FEATURES, prediction='rice', user_id='farmer'), now=reading.created_at + timedelta(hours=1)
+        )
+        self.assertTrue(created)
+
+    def test_predictions_route_lists_app_and_reported_predictions(self):
+        save_prediction(self.user, self.FEATURES, 'rice', 91.0)
+        self.report(crop_name='maize')
+        response = self.client.get('/dashboard/api/predictions/all/')
+        predictions = response.data['data']
+        self.assertEqual([row['crop_name'] for row in predictions], ['maize', 'rice'])
+        self.assertEqual(predictions[1]['user_id'], str(self.user.pk))
+
+    def test_admin_pages_show_reports_without_a_user(self):
+        save_prediction(self.user, self.FEATURES, 'rice', 91.0)
+        reading, _ = report_prediction(dict(self.FEATURES, prediction='maize'))
+        self.assertIsNone(reading.user)
+        admin = get_user_model().objects.create_user(username='admin', password='testpass123', role='admin')
+        self.client.force_login(admin)
+        for url in ('/dashboard/', '/dashboard/profile/', '/dashboard/api-soil-data/',
+                    '/dashboard/crop-recommendations/', f'/dashboard/edit-api-soil-data/{reading.pk}/',
+                    f'/dashboard/delete-api-soil-data/{reading.pk}/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+        self.assertContains(self.client.get('/dashboard/profile/'), 'Soil analysis by N/A - Prediction: maize')
+
+    def test_sensor_reading_route_writes_canonical_row(self):
+        sensor = SensorDevice.objects.create(name='Probe', device_id='probe-1', location='East')
+        taken = timezone.now() - timedelta(minutes=5)
+        with patch.object(recommendation_queue, 'enqueue') as enqueue:
+            response = self.client.post('/dashboard/api/soil-data/', {
+                'user': self.user.pk, 'sensor': sensor.pk, 'location': 'East', 'nitrogen': 10.0,
+                'moisture': 35.0, 'ph_level': 6.1, 'timestamp': taken.isoformat(),
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        reading = SoilData.objects.get()
+        self.assertEqual(list(enqueue.call_args.args[0]), [reading.pk])
+        self.assertEqual((reading.source, reading.humidity, reading.ph, reading.created_at), ('sensor', 35.0, 6.1, taken))
+        self.assertFalse(SoilData.objects.predictions().exists())
+        listed = self.client.get('/dashboard/api/soil-data/').data
+        self.assertEqual((listed[0]['moisture'], listed[0]['ph_level']), (35.0, 6.1))
+
+
+class SoilRollupTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='farmer', password='testpass123')
+        self.later = timezone.now() + timedelta(minutes=5)
+
+    def predict(self, crop='rice', **features):
+        return save_prediction(self.user, dict(CanonicalReadingTests.FEATURES, **features), crop, 90.0)
+
+    def test_compaction_folds_rows_past_the_lag(self):
+        self.predict(nitrogen=80.0)
+        self.predict('maize', nitrogen=100.0)
+        self.assertEqual(SoilRollupService.compact(), 0)
+        self.assertEqual(SoilRollupService.compact(now=self.later), 2)
+        self.assertEqual(SoilRollupService.compact(now=self.later), 0)
+        summary = SoilRollupService.summary(user=self.user)
+        self.assertEqual(summary['count'], 2)
+        self.assertAlmostEqual(summary['averages']['nitrogen'], 90.0)
+        self.assertEqual(summary['crop_counts'], {'rice': 1, 'maize': 1})
+        self.assertEqual(SoilRollupService.hourly_averages(['nitrogen'], self.later - timedelta(days=1))[0][1], {'nitrogen': 90.0})
+
+    def test_summary_does_not_compact(self):
+        self.predict()
+        self.assertEqual(SoilRollupService.summary()['count'], 1)
+        self.assertFalse(RollupWatermark.objects.filter(last_id__gt=0).exists())
+        self.assertFalse(HourlySoilRollup.objects.exists())
+
+    def test_reads_add_rows_above_the_watermark(self):
+        self.predict(nitrogen=80.0)
+        SoilRollupService.compact(now=self.later)
+        self.predict('maize', nitrogen=100.0)
+        summary = SoilRollupService.summary(user=self.user)
+        self.assertEqual((summary['count'], summary['averages']['nitrogen']), (2, 90.0))
+        self.assertEqual(summary['crop_counts'], {'rice': 1, 'maize': 1})
+        start = self.later - timedelta(days=1)
+        self.assertEqual(SoilRollupService.hourly_averages(['nitrogen'], start)[0][1], {'nitrogen': 90.0})
+        self.assertEqual(SoilRollupService.summary(since=self.later + timedelta(days=1))['count'], 0)
+
+    def test_reconcile_picks_up_rows_committed_behind_the_watermark(self):
+        self.predict()
+        late = self.predict()
+        self.predict()
+        late_id = late.pk
+        late.delete()
+        SoilRollupService.compact(now=self.later)
+        # Committed after compaction had passed its id
+        late.pk = late_id
+        late.save(force_insert=True)
+        self.assertEqual(SoilRollupService.summary()['count'], 2)
+        SoilRollupService.reconcile(now=self.later)
+        self.assertEqual(SoilRollupService.summary()['count'], 3)
+
+    def test_refresh_buckets_after_edit_and_delete(self):
+        reading = self.predict(nitrogen=80.0)
+        self.predict(nitrogen=100.0)
+        SoilRollupService.compact(now=self.later)
+        SoilData.objects.filter(pk=reading.pk).update(nitrogen=120.0)
+        SoilRollupService.refresh_buckets('api', self.user.pk, reading.created_at)
+        self.assertAlmostEqual(SoilRollupService.summary()['averages']['nitrogen'], 110.0)
+        reading.delete()
+        SoilRollupService.refresh_buckets('api', self.user.pk, reading.created_at)
+        summary = SoilRollupService.summary()
+        self.assertEqual((summary['count'], summary['averages']['nitrogen']), (1, 100.0))
+        self.assertEqual(HourlySoilRollup.objects.get().reading_count, 1)
+
+    def test_reports_without_a_user_are_rolled_up(self):
+        self.predict()
+        report_prediction(dict(CanonicalReadingTests.FEATURES, prediction='maize'))
+        SoilRollupService.compact(now=self.later)
+        self.assertEqual(SoilRollupService.summary()['crop_counts'], {'rice': 1, 'maize': 1})
+        self.assertEqual(SoilRollupService.summary(user=self.user)['count'], 1)
+        self.assertIn('Unknown user', str(HourlySoilRollup.objects.get(user=None)))
+
+    def test_bucket_created_concurrently_is_merged(self):
+        self.predict()
+        SoilRollupService.compact(now=self.later)
+        bucket = HourlySoilRollup.objects.get()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            HourlySoilRollup.objects.create(source='api', user=self.user, bucket_start=bucket.bucket_start)
+        self.predict()
+        # As if another compaction inserted the bucket after this one looked
+        with patch('django.db.models.QuerySet.first', return_value=None):
+            SoilRollupService.compact(now=self.later)
+        self.assertEqual(HourlySoilRollup.objects.get().reading_count, 2)
+        self.assertEqual(SoilRollupService.summary()['count'], 2)
+
+
+class WireFormatTests(SimpleTestCase):
+    READING = {
+        'moisture': 35.4, 'temperature': -3.2, 'ec': 120.0, 'ph_level': 6.5,
+        'nitrogen': 90.0, 'phosphorus': 42.0, 'potassium': 43.0,
+    }
+
+    def batch(self, count=3, device_id='probe-1'):
+        return wire_format.encode_batch(
+            device_id, [dict(self.READING, timestamp=1700000000 + 60 * n) for n in range(count)]
+        )
+
+    def test_round_trip(self):
+        device_id, count, readings, errors = wire_format.decode_batch(self.batch())
+        self.assertEqual((device_id, count, errors), ('probe-1', 3, []))
+        self.assertEqual(
+            [reading['timestamp'].timestamp() for reading in readings], [1700000000, 1700000060, 1700000120]
+        )
+        self.assertNotIn('ec', readings[0])
+        self.assertEqual(readings[0]['rainfall'], 0.0)
+
+    def test_scaled_values_keep_one_decimal(self):
+        _, _, readings, _ = wire_format.decode_batch(self.batch(1))
+        for field in ('moisture', 'temperature', 'ph_level', 'nitrogen', 'phosphorus', 'potassium'):
+            self.assertAlmostEqual(readings[0][field], self.READING[field], places=6)
+        self.assertEqual(len(self.batch(2)), wire_format.HEADER.size + len('probe-1') + 2 * wire_format.RECORD.size)
+
+    def test_out_of_range_records_are_reported(self):
+        body = wire_format.encode_batch('probe-1', [
+            dict(self.READING, timestamp=1700000000),
+            dict(self.READING, timestamp=1700000060, ph_level=15.0),
+        ])
+        _, count, readings, errors = wire_format.decode_batch(body)
+        self.assertEqual((count, len(readings)), (2, 1))
+        self.assertEqual(errors, [{'index': 1, 'error': 'ph_level out of range [0.0, 14.0]'}])
+
+    def test_rejects_malformed_batches(self):
+        body = self.batch()
+        cases = {
+            'Not a SoilSync readings batch': b'XX' + body[2:],
+            'Unsupported wire format version 2': body[:2] + bytes([2]) + body[3:],
+            'Truncated header': body[:wire_format.HEADER.size - 1],
+            'Expected': body[:-1],
+        }
+        for message, bad in cases.items():
+            with self.subTest(message), self.assertRaisesRegex(ReadingValidationError, message):
+                wire_format.decode_batch(bad)
+
+    def test_record_count_must_match_body(self):
+        body = bytearray(self.batch(2))
+        # Header claims three records, body holds two
+        body[8:10] = (3).to_bytes(2, 'big')
+        with self.assertRaisesRegex(ReadingValidationError, 'Expected 67 bytes for 3 records, got 51'):
+            wire_format.decode_batch(bytes(body))
+        with self.assertRaisesRegex(ReadingValidationError, 'Expected 51 bytes for 2 records, got 67'):
+            wire_format.decode_batch(self.batch(2) + bytes(wire_format.RECORD.size))
+
+
+class SensorIngestTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='farmer', password='testpass123')
+        self.device = SensorDevice.objects.create(name='Probe', device_id='probe-1', location='East')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.buffer = ReadingBuffer(max_readings=100, max_delay=0)
+        for patcher in (patch('dashboard.api_views.reading_buffer', self.buffer), patch.object(recommendation_queue, 'enqueue')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def post(self, body, content_type, device_id='probe-1'):
+        return self.client.generic('POST', f'/dashboard/api/sensors/{device_id}/readings/', body, content_type=content_type)
+
+    def test_binary_batch(self):
+        response = self.post(WireFormatTests().batch(2), wire_format.CONTENT_TYPE)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data, {'accepted': 2, 'rejected': 0, 'errors': []})
+        self.assertEqual(SoilData.objects.sensor_readings().filter(sensor=self.device).count(), 2)
+
+    def test_binary_batch_errors(self):
+        response = self.post(WireFormatTests().batch(1)[:-1], wire_format.CONTENT_TYPE)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Expected', response.data['error'])
+        response = self.post(WireFormatTests().batch(1, device_id='probe-2'), wire_format.CONTENT_TYPE)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Batch is for device probe-2, not probe-1')
+        self.assertFalse(SoilData.objects.sensor_readings().exists())
+
+    def test_unsupported_content_type(self):
+        response = self.post(b'35.4,20.1', 'text/csv')
+        self.assertEqual(response.status_code, 415)
+
+    def test_array_and_object_readings(self):
+        readings = [
+            [1700000000, 35.4, 20.1, 6.5, 90, 42, 43],
+            {'ts': 1700000060, 'm': 36.0, 't': 20.5, 'ph': 6.6, 'n': 91, 'p': 41, 'k': 44, 'r': 2.5, 'ec': 120},
+        ]
+        for body, content_type in (
+            (json.dumps(readings), 'application/json'),
+            (json.dumps({'readings': readings}), 'application/json'),
+            ('\n'.join(json.dumps(reading) for reading in readings), 'application/x-ndjson'),
+        ):
+            with self.subTest(content_type):
+                response = self.post(body, content_type)
+                self.assertEqual(response.data, {'accepted': 2, 'rejected': 0, 'errors': []})
+        rows = SoilData.objects.sensor_readings().order_by('created_at', 'id')
+        self.assertEqual(rows.count(), 6)
+        self.assertEqual((rows[0].humidity, rows[0].rainfall, rows[0].location), (35.4, 0.0, 'East'))
+        self.assertEqual((rows[5].humidity, rows[5].ph, rows[5].rainfall), (36.0, 6.6, 2.5))
+        self.assertEqual(rows[5].created_at.timestamp(), 1700000060)
+
+    def test_invalid_readings_are_reported_and_capped(self):
+        readings = [[35.4, 20.1]] * 60 + [{'m': 35.4, 't': 20.1, 'ph': 15, 'n': 90, 'p': 42, 'k': 43}]
+        response = self.post(json.dumps(readings), 'application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual((response.data['accepted'], response.data['rejected']), (0, 61))
+        self.assertEqual(len(response.data['errors']), 50)
+        self.assertEqual(response.data['errors'][0], {'index': 0, 'error': 'Array readings need 7 or 8 values'})
+        valid, errors = validate_readings(readings, max_errors=100)
+        self.assertEqual((valid, errors[-1]), ([], {'index': 60, 'error': 'ph_level out of range [0.0, 14.0]'}))
+
+    def test_unknown_or_inactive_device(self):
+        self.assertEqual(self.post('[]', 'application/json', device_id='probe-9').status_code, 404)
+        SensorDevice.objects.filter(pk=self.device.pk).update(status='maintenance')
+        self.assertEqual(self.post('[]', 'application/json').status_code, 409)
+
+
+class ReadingBufferTests(TestCase):
+    READING = {
+        'moisture': 35.4, 'temperature': 20.1, 'ph_level': 6.5, 'nitrogen': 90.0, 'phosphorus': 42.0,
+        'potassium': 43.0, 'rainfall': 0.0,
+    }
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='farmer', password='testpass123')
+        self.device = SensorDevice.objects.create(name='Probe', device_id='probe-1', location='East')
+        patcher = patch.object(recommendation_queue, 'enqueue')
+        self.enqueue = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def add(self, buffer, n):
+        return buffer.add(self.device, self.user, [dict(self.READING, timestamp=timezone.now())] * n)
+
+    def stored(self):
+        return SoilData.objects.sensor_readings().count()
+
+    def test_flushes_when_full(self):
+        buffer = ReadingBuffer(max_readings=3, max_delay=60)
+        with patch.object(buffer, '_ensure_timer') as ensure_timer:
+            self.add(buffer, 2)
+            self.assertEqual(self.stored(), 0)
+            ensure_timer.assert_called_once()
+            self.add(buffer, 2)
+        self.assertEqual(self.stored(), 4)
+        self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(len(list(self.enqueue.call_args.args[0])), 4)
+
+    def test_pending_readings_wait_for_flush(self):
+        buffer = ReadingBuffer(max_readings=100, max_delay=60)
+        with patch.object(buffer, '_ensure_timer'):
+            self.add(buffer, 2)
+        self.assertEqual(self.stored(), 0)
+        # What the timer thread does once the oldest reading is max_delay old
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(self.stored(), 2)
+
+    def test_no_delay_writes_immediately(self):
+        self.add(ReadingBuffer(max_readings=100, max_delay=0), 1)
+        self.assertEqual(self.stored(), 1)
+
+
+class RealtimeFeedTests(TestCase):
+    def setUp(self):
+        self.feed = RealtimeFeed(history=5, client_buffer=3, max_clients=2)
+        for target in ('dashboard.services.realtime.realtime_feed', 'dashboard.api_views.realtime_feed'):
+            patcher = patch(target, self.feed)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def publish(self, n, size=1):
+        for i in range(n):
+            self.feed.publish('prediction', lambda i=i: {'n': i}, size=size)
+
+    def test_resume_sends_only_events_after_cursor(self):
+        self.publish(2)
+        cursor = self.feed.cursor()
+        self.publish(2)
+        events = self.feed.subscribe(cursor).get(0)
+        self.assertEqual([event.data() for event in events], ['{"n": 0}', '{"n": 1}'])
+
+    def test_unknown_or_expired_cursor_resets(self):
+        first = self.feed.cursor()
+        self.publish(6)
+        for cursor in (first, '0000-1'):
+            subscription = self.feed.subscribe(cursor)
+            self.assertIsNone(subscription.get(0))
+            subscription.close()
+        self.assertEqual([event.seq for event in self.feed.subscribe(self.feed.cursor(3)).get(0)], [4, 5, 6])
+
+    def test_slow_client_overflows_instead_of_growing(self):
+        subscription = self.feed.subscribe()
+        self.publish(1, size=2)
+        self.publish(1, size=2)
+        self.assertIsNone(subscription.get(0))
+
+    def test_client_limit(self):
+        self.feed.subscribe()
+        subscription = self.feed.subscribe()
+        self.assertIsNone(self.feed.subscribe())
+        subscription.close()
+        self.assertIsNotNone(self.feed.subscribe())
+
+    def test_committed_writes_are_published(self):
+        user = get_user_model().objects.create_user(username='farmer', password='testpass123')
+        subscription = self.feed.subscribe()
+        with self.captureOnCommitCallbacks(execute=True):
+            reading = save_prediction(user, CanonicalReadingTests.FEATURES, 'rice', 91.0)
+        [event] = subscription.get(0)
+        self.assertEqual(event.kind, 'prediction')
+        self.assertEqual(json.loads(event.data())['id'], reading.id)
+
+    def test_stream_sends_events_and_heartbeats(self):
+        subscription = self.feed.subscribe(self.feed.cursor())
+        self.publish(1)
+        frames = ''.join(EventStream(subscription, heartbeat=0.01, max_seconds=0.05))
+        self.assertIn(f'id: {self.feed.cursor(1)}\nevent: prediction\ndata: {{"n": 0}}\n\n', frames)
+        self.assertIn(': heartbeat\n\n', frames)
+
+    def test_stream_endpoint(self):
+        self.publish(1)
+        with self.settings(REALTIME_FEED={'HEARTBEAT_SECONDS': 0.01, 'MAX_STREAM_SECONDS': 0.02}):
+            response = self.client.get('/dashboard/api/stream/', HTTP_LAST_EVENT_ID=self.feed.cursor(0))
+            body = b''.join(response.streaming_content).decode()
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertIn('event: prediction', body)
+        self.assertEqual(self.feed.stats()['clients'], 0)
+
+    async def test_asgi_stream_waits_on_event_loop(self):
+        with self.settings(REALTIME_FEED={'HEARTBEAT_SECONDS': 5, 'MAX_STREAM_SECONDS': 5}):
+            response = await self.async_client.get('/dashboard/api/stream/', HTTP_LAST_EVENT_ID=self.feed.cursor())
+        self.assertTrue(response.is_async)
+        frames = aiter(response.streaming_content)
+        self.assertEqual(await anext(frames), b'retry: 1000\n\n')
+        # Published from another thread while the stream is waiting
+        threading.Timer(0.05, self.publish, (1,)).start()
+        frame = await asyncio.wait_for(anext(frames), 2)
+        self.assertIn(b'event: prediction\ndata: {"n": 0}', frame)
+        await frames.aclose()
+
+    def test_gunicorn_streams_fit_in_worker_threads(self):
+        config = runpy.run_path(str(settings.BASE_DIR / 'gunicorn.conf.py'))
+        feed = settings.REALTIME_FEED
+        self.assertEqual(config['worker_class'], 'gthread')
+        self.assertLess(feed['MAX_CLIENTS'], config['threads'])
+        self.assertLess(feed['MAX_STREAM_SECONDS'], config['timeout'])
+
+
+class SoilDataExportTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='farmer', password='testpass123')
+        for crop in ('rice', 'maize', 'jute'):
+            save_prediction(self.user, CanonicalReadingTests.FEATURES, crop, 80.0)
+
+    def test_csv_export_streams_rows(self):
+        self.client.force_login(self.user)
+        with patch('dashboard.views.CSV_EXPORT_CHUNK_ROWS', 2):
+            response = self.client.get('/dashboard/api-soil-data/export/csv/')
+            chunks = list(response.streaming_content)
+        self.assertEqual(len(chunks), 2)
+        lines = b''.join(chunks).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:2], ['ID', 'User'])
+        self.assertEqual([line.split(',')[8] for line in lines[1:]], ['jute', 'maize', 'rice'])
+
+    async def test_asgi_csv_export(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get('/dashboard/api-soil-data/export/csv/')
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual(len(body.splitlines()), 4)
+
+
+class FusedCropModelTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        rng = np.random.default_rng(0)
+        cls.X = rng.uniform([0, 5, 5, 8, 14, 3.5, 20], [140, 145, 205, 43, 99, 9.9, 298], size=(300, 7))
+        y = rng.choice(['rice', 'maize', 'coffee', 'jute'], size=300)
+        cls.scaler = StandardScaler().fit(cls.X)
+        cls.model = RandomForestClassifier(n_estimators=20, random_state=0).fit(cls.scaler.transform(cls.X), y)
+        cls.fused = FusedCropModel(cls.model, cls.scaler)
+
+    def test_batch_matches_sklearn_exactly(self):
+        expected = self.model.predict_proba(self.scaler.transform(self.X))
+        np.testing.assert_array_equal(self.fused.predict_proba(self.X), expected)
+
+    def test_single_sample_matches_sklearn_exactly(self):
+        for row in self.X[:50]:
+            expected = self.model.predict_proba(self.scaler.transform(row.reshape(1, -1)))
+            np.testing.assert_array_equal(self.fused.predict_proba(row), expected)
+
+    def test_predict_topk(self):
+        top = self.fused.predict_topk(self.X[:5], k=2)
+        predicted = self.model.predict(self.scaler.transform(self.X[:5]))
+        self.assertEqual([row[0][0] for row in top], list(predicted))
+        for row in top:
+            self.assertEqual(len(row), 2)
+            self.assertGreaterEqual(row[0][1], row[1][1])
+
+
+class RecommendationServiceTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.paths = (os.path.join(tmp.name, 'model.pkl'), os.path.join(tmp.name, 'scaler.pkl'))
+        patcher = patch.dict('dashboard.services.crop_recommendation_service._services', clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_one_service_per_artifact_pair(self):
+        service = get_recommendation_service(*self.paths)
+        self.assertIs(get_recommendation_service(*self.paths), service)
+        self.assertIsNot(get_recommendation_service(), service)
+
+    def test_reloads_only_when_files_change(self):
+        service = get_recommendation_service(*self.paths)
+        self.assertIsNone(service.get_predictor())
+        CropRecommendationService(*self.paths).train_model()
+        model = service.model
+        self.assertIsNotNone(model)
+        self.assertIs(service.model, model)
+        stat = os.stat(self.paths[0])
+        os.utime(self.paths[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        reloaded = service.model
+        self.assertIsNot(reloaded, model)
+        self.assertIs(service.model, reloaded)
+        # A new file of a different size is picked up even with the same mtime
+        stat = os.stat(self.paths[0])
+        joblib.dump(RandomForestClassifier(n_estimators=1).fit([[0] * 7, [1] * 7], ['Rice', 'Maize']), self.paths[0])
+        os.utime(self.paths[0], ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(service.model.n_estimators, 1)
+
+
+class RecommendationBatchTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.service = CropRecommendationService(
+            os.path.join(tmp.name, 'model.pkl'), os.path.join(tmp.name, 'scaler.pkl')
+        )
+        self.service.train_model()
+        device = SensorDevice.objects.create(name='Probe', device_id='probe-1', location='East')
+        self.readings = [
+            SoilData.objects.create(source='sensor', sensor=device, **dict(CanonicalReadingTests.FEATURES, nitrogen=n))
+            for n in (50.0, 60.0, 70.0, 80.0, 90.0)
+        ]
+        self.scored = self.readings[0]
+        CropRecommendation.objects.create(soil_data=self.scored, recommended_crop='Rice', confidence_score=50.0)
+
+    def test_scores_each_unscored_reading_once(self):
+        self.assertEqual(list(self.service.generate_recommendations_batch(batch_size=2)), [2, 2])
+        self.assertEqual(
+            sorted(CropRecommendation.objects.values_list('soil_data_id', flat=True)),
+            [reading.pk for reading in self.readings]
+        )
+        self.assertEqual(CropRecommendation.objects.get(soil_data=self.scored).confidence_score, 50.0)
+        self.assertEqual(list(self.service.generate_recommendations_batch()), [])
+
+    def test_queue_drains_enqueued_ids(self):
+        queue = RecommendationQueue(batch_size=2)
+        enqueued = [self.scored.pk, self.readings[1].pk, None, self.readings[2].pk]
+        with patch.object(queue, '_run'), \
+                patch('dashboard.services.crop_recommendation_service.get_recommendation_service', return_value=self.service):
+            queue.enqueue(enqueued)
+            self.assertEqual(queue.drain(), 2)
+        self.assertEqual(
+            sorted(CropRecommendation.objects.values_list('soil_data_id', flat=True)),
+            sorted([self.scored.pk, self.readings[1].pk, self.readings[2].pk])
+        )
+        self.assertEqual(queue.drain(), 0)
+
+    def test_queue_keeps_readings_while_the_model_is_missing(self):
+        queue = RecommendationQueue(batch_size=2)
+        missing = CropRecommendationService(os.devnull + '.pkl', os.devnull + '.scaler')
+        with patch.object(queue, '_run'), \
+                patch('dashboard.services.crop_recommendation_service.get_recommendation_service', return_value=missing):
+            queue.enqueue([self.readings[1].pk])
+            self.assertEqual(queue.drain(), 0)
+        self.assertEqual(queue._pending, [self.readings[1].pk])
+        with patch('dashboard.services.crop_recommendation_service.get_recommendation_service', return_value=self.service):
+            self.assertEqual(queue.drain(), 1)
+        self.assertTrue(CropRecommendation.objects.filter(soil_data=self.readings[1], generated=True).exists())
+
+    def test_one_generated_recommendation_per_reading(self):
+        self.assertEqual(list(self.service.generate_recommendations_batch([self.readings[1].pk])), [1])
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CropRecommendation.objects.create(soil_data=self.readings[1], recommended_crop='Rice', generated=True)
+        # Entered by hand alongside the generated one
+        CropRecommendation.objects.create(soil_data=self.readings[1], recommended_crop='Rice')
+        self.assertEqual(CropRecommendation.objects.filter(soil_data=self.readings[1]).count(), 2)
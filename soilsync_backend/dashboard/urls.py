@@ -9,8 +9,8 @@ from .views import (
     change_password, toggle_2fa
 )
 from .api_views import (
-    receive_prediction, get_predictions, get_predictions_realtime,
-    soil_data_list_create, soil_data_detail, sensor_device_list_create,
+    receive_prediction, get_predictions, get_predictions_realtime, stream_updates,
+    soil_data_list_create, soil_data_detail, sensor_device_list_create, ingest_sensor_readings,
     crop_recommendation_list_create, dashboard_stats
 )
 
@@ -47,9 +47,11 @@ urlpatterns = [
     path('api/predictions/', receive_prediction, name='receive_prediction'),
     path('api/predictions/all/', get_predictions, name='get_predictions'),
     path('api/predictions/realtime/', get_predictions_realtime, name='get_predictions_realtime'),
+    path('api/stream/', stream_updates, name='stream_updates'),
     path('api/soil-data/', soil_data_list_create, name='soil_data_list_create'),
     path('api/soil-data/<int:pk>/', soil_data_detail, name='soil_data_detail'),
     path('api/sensors/', sensor_device_list_create, name='sensor_device_list_create'),
+    path('api/sensors/<str:device_id>/readings/', ingest_sensor_readings, name='ingest_sensor_readings'),
     path('api/crop-recommendations/', crop_recommendation_list_create, name='crop_recommendation_list_create'),
 
     # Trends API endpoint
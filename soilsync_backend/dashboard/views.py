@@ -1,19 +1,17 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.shortcuts import render, redirect, get_object_or_404
-from .models import SoilData, SensorDevice, CropRecommendation, ActivityLog, SystemFeedback
+from .models import SensorDevice, CropRecommendation, ActivityLog, SystemFeedback
+from .services.rollup_service import SoilRollupService
 from api.models import SoilData as APISoilData
+from api.services import get_user_profile, record_prediction, forget_prediction
 from django.contrib.auth import get_user_model, authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
 from django.contrib import messages
-from django.db import IntegrityError
-from django.http import HttpResponse
+from django.db import IntegrityError, transaction
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
 import csv
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
-from reportlab.lib import colors
 import logging
 
 logger = logging.getLogger(__name__)
@@ -27,36 +25,12 @@ def dashboard_login(request):
         return redirect('database_dashboard')
     
     if request.method == 'POST':
-        username = request.POST.get('username')
-        password = request.POST.get('password')
-        raw_username = username
-        username = (username or '').strip()
-        password = password or ''
-        password_stripped = password.strip()
-        try:
-            user_ci = User.objects.filter(username__iexact=username).first()
-            user_exists = user_ci is not None
-            logger.info(
-                f"[dashboard_login] POST raw_username={raw_username!r}, normalized_username={username!r}, user_exists={user_exists}, pwd_len={len(password)}, pwd_trimmed={'yes' if password != password_stripped else 'no'}"
-            )
-        except Exception as e:
-            logger.error(f"[dashboard_login] Error checking user existence: {e}")
-            user_ci = None
+        username = (request.POST.get('username') or '').strip()
+        password = request.POST.get('password') or ''
         
         if username and password:
-            auth_username = user_ci.username if user_ci else username
-            user = authenticate(request, username=auth_username, password=password)
-            if not user and password != password_stripped:
-                user = authenticate(request, username=auth_username, password=password_stripped)
-                if user:
-                    logger.info("[dashboard_login] authenticated after trimming password")
-            # Fallback: manual password check if backend auth failed
-            if not user and user_ci and (user_ci.check_password(password) or (password != password_stripped and user_ci.check_password(password_stripped))):
-                user = user_ci
-                logger.info("[dashboard_login] authenticated via check_password fallback")
-            logger.info(
-                f"[dashboard_login] authenticate result: {bool(user)} for auth_username={auth_username!r}"
-            )
+            # Single lookup and single password hash via UsernameOrEmailBackend
+            user = authenticate(request, username=username, password=password)
             if user is not None:
                 login(request, user)
                 messages.success(request, f'Welcome back, {user.username}!')
@@ -127,12 +101,15 @@ def database_dashboard(request):
 
     # Get API soil data for analytics
     if is_admin:
-        api_soil_data = APISoilData.objects.select_related('user').all()
+        api_soil_data = APISoilData.objects.predictions().select_related('user').all()
     else:
-        api_soil_data = APISoilData.objects.select_related('user').filter(user=request.user)
+        api_soil_data = APISoilData.objects.predictions().select_related('user').filter(user=request.user)
+
+    # Totals and analytics come from the daily rollups rather than the raw rows
+    rollup = SoilRollupService.summary(user=None if is_admin else request.user)
 
     # Combined recommendations count (traditional + API)
-    total_recommendations = crop_recommendations.count() + api_soil_data.count()
+    total_recommendations = crop_recommendations.count() + rollup['count']
 
     # Get recent data for dashboard display (combine both types)
     recent_traditional = CropRecommendation.objects.select_related('soil_data').all().order_by('-recommendation_date')[:3]
@@ -163,24 +140,8 @@ def database_dashboard(request):
     recent_recommendations = recent_recommendations[:5]
 
     # Analytics data from API soil data
-    ph_distribution = {'acidic': 0, 'neutral': 0, 'alkaline': 0}
-    crop_counts = {}
-
-    for data in api_soil_data:
-        # pH distribution
-        if data.ph < 6.0:
-            ph_distribution['acidic'] += 1
-        elif data.ph <= 7.0:
-            ph_distribution['neutral'] += 1
-        else:
-            ph_distribution['alkaline'] += 1
-
-        # Crop prediction counts
-        crop = data.prediction
-        if crop in crop_counts:
-            crop_counts[crop] += 1
-        else:
-            crop_counts[crop] = 1
+    ph_distribution = rollup['ph_distribution']
+    crop_counts = dict(sorted(rollup['crop_counts'].items(), key=lambda item: item[1], reverse=True))
 
     # Prepare chart data
     crop_labels = list(crop_counts.keys())[:4]  # Top 4 crops
@@ -231,9 +192,9 @@ def crop_recommendations_table(request):
 
     # Get API soil data predictions
     if is_admin:
-        api_soil_data = APISoilData.objects.select_related('user').all().order_by('-created_at')
+        api_soil_data = APISoilData.objects.predictions().select_related('user').all().order_by('-created_at')
     else:
-        api_soil_data = APISoilData.objects.select_related('user').filter(user=request.user).order_by('-created_at')
+        api_soil_data = APISoilData.objects.predictions().select_related('user').filter(user=request.user).order_by('-created_at')
 
     profile_name = request.user.get_full_name() or request.user.username if request.user.is_authenticated else 'Guest'
 
@@ -302,7 +263,7 @@ def edit_api_soil_data(request, pk):
         messages.error(request, 'Access denied. Admin privileges required.')
         return redirect('api_soil_data_table')
 
-    api_data = get_object_or_404(APISoilData, pk=pk)
+    api_data = get_object_or_404(APISoilData.objects.predictions(), pk=pk)
 
     if request.method == 'POST':
         prediction = request.POST.get('prediction')
@@ -310,10 +271,17 @@ def edit_api_soil_data(request, pk):
 
         if prediction:
             try:
+                previous_prediction = api_data.prediction
                 api_data.prediction = prediction
                 if confidence:
                     api_data.confidence = float(confidence)
-                api_data.save()
+                with transaction.atomic():
+                    api_data.save()
+                    # Reported predictions are not in the users' counters
+                    if previous_prediction != prediction and api_data.source == 'app':
+                        forget_prediction(api_data.user, previous_prediction)
+                        record_prediction(api_data.user, prediction)
+                SoilRollupService.refresh_buckets('api', api_data.user_id, api_data.created_at)
 
                 messages.success(request, f'API soil data updated successfully!')
                 return redirect('crop_recommendations_table')
@@ -333,11 +301,15 @@ def delete_api_soil_data(request, pk):
         messages.error(request, 'Access denied. Admin privileges required.')
         return redirect('api_soil_data_table')
 
-    api_data = get_object_or_404(APISoilData, pk=pk)
+    api_data = get_object_or_404(APISoilData.objects.predictions(), pk=pk)
 
     if request.method == 'POST':
         prediction = api_data.prediction
-        api_data.delete()
+        with transaction.atomic():
+            api_data.delete()
+            if api_data.source == 'app':
+                forget_prediction(api_data.user, prediction)
+        SoilRollupService.refresh_buckets('api', api_data.user_id, api_data.created_at)
         messages.success(request, f'API soil data for "{prediction}" deleted successfully!')
         return redirect('crop_recommendations_table')
 
@@ -466,25 +438,29 @@ def user_profile(request):
     """User profile page"""
     is_admin = request.user.role == 'admin' or request.user.is_staff
 
+    # Profile data and prediction statistics from the per-user counters
+    user_profile_data = get_user_profile(request.user)
+
     # Get API soil data (admins see all, users see only their own)
     if is_admin:
-        api_soil_data = APISoilData.objects.select_related('user').all().order_by('-created_at')[:5]  # Recent 5 records
-        api_soil_data_count = APISoilData.objects.count()
+        api_soil_data = APISoilData.objects.predictions().select_related('user').all().order_by('-created_at')[:5]  # Recent 5 records
+        api_soil_data_count = APISoilData.objects.predictions().count()
     else:
-        api_soil_data = APISoilData.objects.filter(user=request.user).order_by('-created_at')[:5]  # Recent 5 records
-        api_soil_data_count = APISoilData.objects.filter(user=request.user).count()
+        api_soil_data = APISoilData.objects.predictions().filter(user=request.user).order_by('-created_at')[:5]  # Recent 5 records
+        api_soil_data_count = user_profile_data['total_predictions']
 
     # Get user's crop recommendations count (traditional + API)
     if is_admin:
-        recommendations_count = CropRecommendation.objects.all().count() + APISoilData.objects.all().count()
+        recommendations_count = CropRecommendation.objects.all().count() + api_soil_data_count
     else:
-        recommendations_count = CropRecommendation.objects.filter(soil_data__user=request.user).count() + APISoilData.objects.filter(user=request.user).count()
+        recommendations_count = CropRecommendation.objects.filter(soil_data__user=request.user).count() + api_soil_data_count
 
     # Get recent activity (API submissions)
     recent_activity = []
     for data in api_soil_data:
         if is_admin and data.user != request.user:
-            action_text = f"Soil analysis by {data.user.username} - Prediction: {data.prediction or 'N/A'}"
+            username = data.user.username if data.user else 'N/A'
+            action_text = f"Soil analysis by {username} - Prediction: {data.prediction or 'N/A'}"
         else:
             action_text = f"Soil analysis submitted - Prediction: {data.prediction or 'N/A'}"
         recent_activity.append({
@@ -492,31 +468,6 @@ def user_profile(request):
             'timestamp': data.created_at
         })
 
-    # Get user profile data from API
-    from api.views import UserProfileView
-    from rest_framework.test import APIRequestFactory
-    from rest_framework.request import Request
-
-    factory = APIRequestFactory()
-    api_request = factory.get('/api/user/profile/')
-    api_request.user = request.user
-
-    # Create a DRF request object
-    from rest_framework.request import Request as DRFRequest
-    drf_request = DRFRequest(api_request)
-    drf_request.user = request.user
-
-    view = UserProfileView()
-    response = view.get(drf_request)
-    user_profile_data = response.data if hasattr(response, 'data') else {}
-
-    # Add activity logging for profile view
-    ActivityLog.objects.create(
-        user=request.user,
-        action='Viewed profile page',
-        description=f'User {request.user.username} accessed their profile page'
-    )
-
     return render(request, 'dashboard/profile.html', {
         'api_soil_data': api_soil_data,
         'api_soil_data_count': api_soil_data_count,
@@ -686,21 +637,18 @@ def api_soil_data_table(request):
 
     if is_admin:
         # Admins see all data
-        api_soil_data = APISoilData.objects.select_related('user').all().order_by('-created_at')
+        api_soil_data = APISoilData.objects.predictions().select_related('user').all().order_by('-created_at')
         # Get all users for the filter dropdown
         all_users = User.objects.all().order_by('username')
     else:
         # Normal users see only their own data
-        api_soil_data = APISoilData.objects.select_related('user').filter(user=request.user).order_by('-created_at')
+        api_soil_data = APISoilData.objects.predictions().select_related('user').filter(user=request.user).order_by('-created_at')
         all_users = None
 
-    # Calculate averages from the actual data
-    if api_soil_data.exists():
-        avg_ph = round(sum(data.ph for data in api_soil_data) / api_soil_data.count(), 1)
-        avg_humidity = round(sum(data.humidity for data in api_soil_data) / api_soil_data.count(), 1)
-    else:
-        avg_ph = 0.0
-        avg_humidity = 0.0
+    # Averages come from the daily rollups
+    averages = SoilRollupService.summary(user=None if is_admin else request.user)['averages']
+    avg_ph = round(averages['ph'], 1)
+    avg_humidity = round(averages['humidity'], 1)
 
     return render(request, 'dashboard/api_soil_data_table.html', {
         'api_soil_data': api_soil_data,
@@ -720,54 +668,92 @@ def export_api_soil_data_csv(request):
     if is_admin and user_id and user_id != 'all':
         try:
             user_obj = User.objects.get(id=user_id)
-            api_soil_data = APISoilData.objects.select_related('user').filter(user=user_obj).order_by('-created_at')
+            api_soil_data = APISoilData.objects.predictions().select_related('user').filter(user=user_obj).order_by('-created_at')
         except User.DoesNotExist:
-            api_soil_data = APISoilData.objects.select_related('user').all().order_by('-created_at')
+            api_soil_data = APISoilData.objects.predictions().select_related('user').all().order_by('-created_at')
     elif is_admin:
-        api_soil_data = APISoilData.objects.select_related('user').all().order_by('-created_at')
+        api_soil_data = APISoilData.objects.predictions().select_related('user').all().order_by('-created_at')
     else:
-        api_soil_data = APISoilData.objects.select_related('user').filter(user=request.user).order_by('-created_at')
+        api_soil_data = APISoilData.objects.predictions().select_related('user').filter(user=request.user).order_by('-created_at')
 
-    response = HttpResponse(content_type='text/csv')
+    # Streamed in chunks; under ASGI the rows are read without holding a thread
+    lines = csv_export_lines_async if isinstance(request, ASGIRequest) else csv_export_lines
+    response = StreamingHttpResponse(lines(api_soil_data), content_type='text/csv')
     response['Content-Disposition'] = 'attachment; filename="api_soil_data_report.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow(['ID', 'User', 'Nitrogen', 'Phosphorus', 'Potassium', 'Temperature', 'Humidity', 'pH', 'Prediction', 'Confidence', 'Created At'])
-
-    for data in api_soil_data:
-        writer.writerow([
-            data.id,
-            data.user.username if data.user else 'N/A',
-            data.nitrogen,
-            data.phosphorus,
-            data.potassium,
-            data.temperature,
-            data.humidity,
-            data.ph,
-            data.prediction,
-            data.confidence,
-            data.created_at.strftime('%Y-%m-%d %H:%M:%S')
-        ])
-
     return response
 
+CSV_EXPORT_HEADER = ['ID', 'User', 'Nitrogen', 'Phosphorus', 'Potassium', 'Temperature', 'Humidity', 'pH', 'Prediction', 'Confidence', 'Created At']
+CSV_EXPORT_CHUNK_ROWS = 2000
+
+class _Echo:
+    """File-like object handing csv.writer's output straight back"""
+    def write(self, value):
+        return value
+
+def _csv_export_row(writer, data):
+    return writer.writerow([
+        data.id,
+        data.user.username if data.user else 'N/A',
+        data.nitrogen,
+        data.phosphorus,
+        data.potassium,
+        data.temperature,
+        data.humidity,
+        data.ph,
+        data.prediction,
+        data.confidence,
+        data.created_at.strftime('%Y-%m-%d %H:%M:%S')
+    ])
+
+def csv_export_lines(queryset):
+    """CSV export of ``queryset`` in chunks of CSV_EXPORT_CHUNK_ROWS rows"""
+    writer = csv.writer(_Echo())
+    chunk = [writer.writerow(CSV_EXPORT_HEADER)]
+    for data in queryset.iterator(chunk_size=CSV_EXPORT_CHUNK_ROWS):
+        chunk.append(_csv_export_row(writer, data))
+        if len(chunk) >= CSV_EXPORT_CHUNK_ROWS:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+async def csv_export_lines_async(queryset):
+    """csv_export_lines for ASGI responses"""
+    writer = csv.writer(_Echo())
+    chunk = [writer.writerow(CSV_EXPORT_HEADER)]
+    async for data in queryset.aiterator(chunk_size=CSV_EXPORT_CHUNK_ROWS):
+        chunk.append(_csv_export_row(writer, data))
+        if len(chunk) >= CSV_EXPORT_CHUNK_ROWS:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
 @login_required(login_url='dashboard_login')
 def export_api_soil_data_pdf(request):
     """Export API soil data to PDF"""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
+
     is_admin = request.user.role == 'admin' or request.user.is_staff
 
     # Check for user filter parameter
     user_id = request.GET.get('user_id')
+    summary_user = None
     if is_admin and user_id and user_id != 'all':
         try:
             user_obj = User.objects.get(id=user_id)
-            api_soil_data = APISoilData.objects.select_related('user').filter(user=user_obj).order_by('-created_at')
+            api_soil_data = APISoilData.objects.predictions().select_related('user').filter(user=user_obj).order_by('-created_at')
+            summary_user = user_obj
         except User.DoesNotExist:
-            api_soil_data = APISoilData.objects.select_related('user').all().order_by('-created_at')
+            api_soil_data = APISoilData.objects.predictions().select_related('user').all().order_by('-created_at')
     elif is_admin:
-        api_soil_data = APISoilData.objects.select_related('user').all().order_by('-created_at')
+        api_soil_data = APISoilData.objects.predictions().select_related('user').all().order_by('-created_at')
     else:
-        api_soil_data = APISoilData.objects.select_related('user').filter(user=request.user).order_by('-created_at')
+        api_soil_data = APISoilData.objects.predictions().select_related('user').filter(user=request.user).order_by('-created_at')
+        summary_user = request.user
 
     response = HttpResponse(content_type='application/pdf')
     response['Content-Disposition'] = 'attachment; filename="api_soil_data_report.pdf"'
@@ -779,12 +765,13 @@ def export_api_soil_data_pdf(request):
     title = Paragraph("API Soil Data Report", styles['Title'])
     elements.append(title)
 
-    # Summary
-    total_records = api_soil_data.count()
+    # Summary from the daily rollups
+    rollup = SoilRollupService.summary(user=summary_user)
+    total_records = rollup['count']
     summary_text = f"Total Records: {total_records}"
     if total_records > 0:
-        avg_ph = round(sum(data.ph for data in api_soil_data) / total_records, 2)
-        avg_humidity = round(sum(data.humidity for data in api_soil_data) / total_records, 2)
+        avg_ph = round(rollup['averages']['ph'], 2)
+        avg_humidity = round(rollup['averages']['humidity'], 2)
         summary_text += f"<br/>Average pH: {avg_ph}<br/>Average Humidity: {avg_humidity}"
 
     summary = Paragraph(summary_text, styles['Normal'])
@@ -841,11 +828,10 @@ def soil_parameter_trends(request):
     end_date = timezone.now()
     start_date = end_date - timedelta(days=days)
 
-    # Fetch data
-    if is_admin:
-        soil_data = APISoilData.objects.filter(created_at__gte=start_date).order_by('created_at')
-    else:
-        soil_data = APISoilData.objects.filter(user=request.user, created_at__gte=start_date).order_by('created_at')
+    # Fetch hourly averages from the rollups
+    hourly = SoilRollupService.hourly_averages(
+        parameters, start_date, user=None if is_admin else request.user
+    )
 
     # Prepare data for Chart.js
     datasets = {}
@@ -872,20 +858,17 @@ def soil_parameter_trends(request):
                 'fill': False,
             }
 
-    # Process data points
-    for data in soil_data:
-        # Use Django's timezone-aware datetime (already converted to TIME_ZONE setting)
-        # and format as ISO 8601 for Chart.js - ensure it's in the correct timezone
+    # Process data points, one per hourly bucket
+    import pytz
+    manila_tz = pytz.timezone('Asia/Manila')
+    for bucket_start, averages in hourly:
         # Convert to Asia/Manila timezone explicitly for consistency
-        import pytz
-        manila_tz = pytz.timezone('Asia/Manila')
-        local_time = data.created_at.astimezone(manila_tz)
+        local_time = bucket_start.astimezone(manila_tz)
         timestamp = local_time.isoformat()
 
         for param in parameters:
             if param in datasets:
-                value = getattr(data, param, None)
-                # Create data point with only the relevant value for this parameter
+                value = averages.get(param)
                 data_point = {
                     'x': timestamp,
                     'y': float(value) if value is not None else None,
@@ -893,10 +876,6 @@ def soil_parameter_trends(request):
                 }
                 datasets[param]['data'].append(data_point)
 
-    # Sort data points by time for each dataset
-    for param in datasets:
-        datasets[param]['data'].sort(key=lambda dp: dp['time'])
-
     # Prepare response data
     chart_data = {
         'datasets': list(datasets.values())
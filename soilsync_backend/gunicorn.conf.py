@@ -0,0 +1,41 @@
+"""
+Gunicorn settings for serving SoilSync:
+
+    gunicorn -c gunicorn.conf.py soilsync_backend.wsgi
+
+preload_app imports the WSGI module in the master, which runs api.preload
+once; workers are then forked with the model, dataset index and crop
+statistics already in (shared) memory. Every worker logs its memory after
+booting, and ``GET /api/system/memory/`` reports the serving worker's.
+
+Workers are threaded (gthread): an open /dashboard/api/stream/ connection
+holds one of a worker's ``threads``, not the whole process, and the worker
+keeps heartbeating to the master while it streams. Keep threads above
+REALTIME_MAX_CLIENTS so streams cannot take every thread of a worker, and
+REALTIME_MAX_STREAM_SECONDS below ``timeout``.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '32'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '60'))
+preload_app = True
+
+
+def when_ready(server):
+    from api.preload import format_memory, memory_usage
+    server.log.info(f"Master {os.getpid()} ready: {format_memory(memory_usage())}")
+    from django.conf import settings
+    feed = getattr(settings, 'REALTIME_FEED', {})
+    if feed.get('ENABLED') and feed.get('MAX_CLIENTS', 0) >= server.cfg.threads:
+        server.log.warning("REALTIME_MAX_CLIENTS should be below GUNICORN_THREADS, or streams can hold every thread")
+    if feed.get('ENABLED') and feed.get('MAX_STREAM_SECONDS', 0) >= server.cfg.timeout:
+        server.log.warning("REALTIME_MAX_STREAM_SECONDS should be below GUNICORN_TIMEOUT")
+
+
+def post_worker_init(worker):
+    from api.preload import format_memory, memory_usage
+    worker.log.info(f"Worker {worker.pid} booted: {format_memory(memory_usage())}")
@@ -2,6 +2,15 @@
 ASGI config for soilsync_backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with, for example:
+
+    uvicorn soilsync_backend.asgi:application --workers 9
+
+The weather proxy, the realtime stream and CSV exports then wait on I/O on
+the event loop instead of holding a thread per request. Every other view,
+prediction included, is sync and Django runs it on the process's single
+sync thread, so a worker serves one of them at a time: size --workers for
+the concurrent sync requests, as for gunicorn (two per CPU plus one).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -9,8 +18,14 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'soilsync_backend.settings')
 
 application = get_asgi_application()
+
+# Load shared serving state before the first request, as the WSGI module does
+if settings.PRELOAD_ON_STARTUP:
+    from api.preload import preload
+    preload()
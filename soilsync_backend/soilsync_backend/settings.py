@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -50,7 +51,7 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -88,17 +89,63 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'soilsync_backend.wsgi.application'
+ASGI_APPLICATION = 'soilsync_backend.asgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Select the backend with DB_ENGINE=sqlite (default) or DB_ENGINE=postgres.
+# PostgreSQL uses psycopg[binary,pool] from requirements.txt; set DB_POOL=0
+# to use persistent connections (DB_CONN_MAX_AGE) instead of the pool.
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite').lower()
+
+if DB_ENGINE in ('postgres', 'postgresql'):
+    DB_POOL = os.environ.get('DB_POOL', '1') == '1'
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'soilsync'),
+            'USER': os.environ.get('DB_USER', 'soilsync'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            # Django's pool manages connection reuse itself and rejects a
+            # non-zero CONN_MAX_AGE
+            'CONN_MAX_AGE': 0 if DB_POOL else int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+                    'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+                    'timeout': int(os.environ.get('DB_POOL_TIMEOUT', '10')),
+                } if DB_POOL else False,
+            },
+        }
+    }
+else:
+    # WAL lets dashboard reads proceed while ingestion writes; IMMEDIATE
+    # transactions take the write lock up front so concurrent writers wait on
+    # busy_timeout instead of failing with "database is locked" mid-transaction.
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                'timeout': 20,
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA busy_timeout=20000;'
+                    f"PRAGMA mmap_size={int(os.environ.get('DB_SQLITE_MMAP_SIZE', 268435456))};"
+                    'PRAGMA cache_size=-20000;'
+                    'PRAGMA temp_store=MEMORY;'
+                ),
+            },
+        }
     }
-}
 
 
 # Password validation
@@ -149,10 +196,32 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Custom user model
 AUTH_USER_MODEL = 'api.CustomUser'
 
-# Custom authentication backends
+# Custom authentication backends. UsernameOrEmailBackend already covers
+# plain username logins, so a failed attempt costs one lookup and one hash.
 AUTHENTICATION_BACKENDS = [
     'api.authentication.UsernameOrEmailBackend',
-    'django.contrib.auth.backends.ModelBackend',
+]
+
+# Password hashing. PASSWORD_HASHER selects the hasher for new passwords
+# ('pbkdf2', or 'argon2' which requires argon2-cffi). The remaining hashers
+# stay enabled so existing hashes still verify; they are re-hashed with the
+# preferred hasher and cost on the next successful login.
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'pbkdf2').lower()
+PASSWORD_PBKDF2_ITERATIONS = int(os.environ.get('PASSWORD_PBKDF2_ITERATIONS', '870000'))
+PASSWORD_ARGON2_TIME_COST = int(os.environ.get('PASSWORD_ARGON2_TIME_COST', '2'))
+PASSWORD_ARGON2_MEMORY_COST = int(os.environ.get('PASSWORD_ARGON2_MEMORY_COST', '102400'))
+PASSWORD_ARGON2_PARALLELISM = int(os.environ.get('PASSWORD_ARGON2_PARALLELISM', '8'))
+
+_PREFERRED_HASHERS = {
+    'pbkdf2': 'api.hashers.TunedPBKDF2PasswordHasher',
+    'argon2': 'api.hashers.TunedArgon2PasswordHasher',
+}
+PASSWORD_HASHERS = [_PREFERRED_HASHERS[PASSWORD_HASHER]] + [
+    hasher for name, hasher in _PREFERRED_HASHERS.items() if name != PASSWORD_HASHER
+] + [
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
 ]
 
 # JWT settings
@@ -168,6 +237,11 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# Verified access tokens are cached per process for JWT_USER_CACHE_TTL seconds
+# (bounded to JWT_USER_CACHE_SIZE entries) so repeat requests skip the user query
+JWT_USER_CACHE_TTL = int(os.environ.get('JWT_USER_CACHE_TTL', '60'))
+JWT_USER_CACHE_SIZE = int(os.environ.get('JWT_USER_CACHE_SIZE', '4096'))
+
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True  # For development only
 CORS_ALLOW_CREDENTIALS = True
@@ -223,6 +297,151 @@ CSRF_TRUSTED_ORIGINS = [
 #     ),
 # }
 
+# 'npy' loads lib/models/RandomForest_artifact/ (memory-mapped, shared between
+# workers) when it was exported from the current RandomForest.pkl; 'pickle'
+# always unpickles RandomForest.pkl. With 'npy', a version using the 'sklearn'
+# inference engine still unpickles the model in every worker that serves it.
+MODEL_ARTIFACT_FORMAT = os.environ.get('MODEL_ARTIFACT_FORMAT', 'npy')
+
+# Inference engine used when no ModelVersion is active ('sklearn' or 'flat').
+# The active version's own setting is re-read every
+# INFERENCE_ENGINE_REFRESH_SECONDS.
+DEFAULT_INFERENCE_ENGINE = os.environ.get('DEFAULT_INFERENCE_ENGINE', 'sklearn')
+INFERENCE_ENGINE_REFRESH_SECONDS = 5.0
+
+# Per-process cache of crop predictions keyed by the active model and the
+# quantized feature vector. QUANTIZATION overrides the bucket width of
+# individual features (see api.prediction_cache.DEFAULT_QUANTIZATION);
+# None means exact values.
+PREDICTION_CACHE = {
+    'TTL': int(os.environ.get('PREDICTION_CACHE_TTL', '600')),
+    'SIZE': int(os.environ.get('PREDICTION_CACHE_SIZE', '10000')),
+    'QUANTIZATION': {},
+}
+
+# Training dataset held in memory for crop statistics and similar cases
+# (api.dataset_index). Each process re-checks the table's row count and
+# highest id every CHECK_SECONDS and rebuilds the index when they moved.
+DATASET_INDEX = {
+    'CHECK_SECONDS': float(os.environ.get('DATASET_INDEX_CHECK_SECONDS', '30')),
+}
+
+# Hyperparameter search run by retrain_model when called with tune=true:
+# FOLDS-fold cross-validation of up to MAX_CANDIDATES forest configurations
+# in WORKERS processes (0 = one per CPU), stopping after BUDGET_SECONDS.
+MODEL_TUNING = {
+    'FOLDS': 5,
+    'MAX_CANDIDATES': int(os.environ.get('MODEL_TUNING_MAX_CANDIDATES', '12')),
+    'BUDGET_SECONDS': float(os.environ.get('MODEL_TUNING_BUDGET_SECONDS', '120')),
+    'WORKERS': int(os.environ.get('MODEL_TUNING_WORKERS', '0')),
+}
+
+# Size/latency report computed by retrain_model: every TREE_COUNTS prefix of
+# the forest and of one forest per DEPTHS limit is scored on the holdout.
+# Setting ACCURACY_TOLERANCE (or passing accuracy_tolerance) deploys the
+# smallest of those variants within that accuracy of the best.
+MODEL_SIZE_REPORT = {
+    'ENABLED': os.environ.get('MODEL_SIZE_REPORT', '1') == '1',
+    'TREE_COUNTS': [10, 25, 50, 100, 200],
+    'DEPTHS': [16, 12, 8],
+    'LATENCY_SAMPLES': 200,
+    'ACCURACY_TOLERANCE': (
+        float(os.environ['MODEL_ACCURACY_TOLERANCE']) if os.environ.get('MODEL_ACCURACY_TOLERANCE') else None
+    ),
+}
+
+# Shadow/canary evaluation of a candidate model version (see api.rollout):
+# the rollout is re-read every REFRESH_SECONDS, shadow predictions run on
+# WORKERS background threads with at most MAX_PENDING queued (more are
+# dropped), and statistics are saved every FLUSH_SECONDS.
+MODEL_ROLLOUT = {
+    'REFRESH_SECONDS': 5.0,
+    'WORKERS': 1,
+    'MAX_PENDING': int(os.environ.get('MODEL_ROLLOUT_MAX_PENDING', '100')),
+    'FLUSH_SECONDS': float(os.environ.get('MODEL_ROLLOUT_FLUSH_SECONDS', '10')),
+}
+
+# Prediction audit log: entries are buffered and written BATCH_SIZE at a
+# time, at the latest MAX_FLUSH_DELAY seconds after they were logged. With
+# MAX_PENDING entries buffered a request waits up to BLOCK_SECONDS for room
+# before its entry is dropped.
+PREDICTION_LOG = {
+    'ENABLED': os.environ.get('PREDICTION_LOG', '1') == '1',
+    'MAX_PENDING': int(os.environ.get('PREDICTION_LOG_MAX_PENDING', '10000')),
+    'BATCH_SIZE': 500,
+    'MAX_FLUSH_DELAY': float(os.environ.get('PREDICTION_LOG_FLUSH_DELAY', '1.0')),
+    'BLOCK_SECONDS': 0.05,
+}
+
+# Chunked dataset uploads: chunks are appended to a file per upload in DIR,
+# which must be shared by all workers of a host. Uploads untouched for
+# EXPIRE_HOURS are removed by `manage.py purge_dataset_uploads`.
+DATASET_UPLOAD = {
+    'DIR': os.environ.get('DATASET_UPLOAD_DIR', os.path.join(BASE_DIR, 'uploads', 'datasets')),
+    'CHUNK_SIZE': int(os.environ.get('DATASET_UPLOAD_CHUNK_SIZE', str(4 * 1024 * 1024))),
+    'MAX_CHUNK_SIZE': 16 * 1024 * 1024,
+    'MAX_FILE_SIZE': int(os.environ.get('DATASET_UPLOAD_MAX_FILE_SIZE', str(2 * 1024 ** 3))),
+    'EXPIRE_HOURS': 24,
+}
+
+# Timeout in seconds for the Open-Meteo calls behind /api/weather/
+WEATHER_API_TIMEOUT = float(os.environ.get('WEATHER_API_TIMEOUT', '10'))
+
+# Build the model, predictor and dataset index when the WSGI or ASGI
+# application is loaded (api.preload). Under gunicorn's preload_app that
+# happens once in the master and the workers share the result copy-on-write.
+PRELOAD_ON_STARTUP = os.environ.get('PRELOAD_ON_STARTUP', '1') == '1'
+
+# Sensor ingestion: readings are buffered per worker and bulk-inserted once
+# MAX_BUFFERED_READINGS are pending or the oldest is MAX_FLUSH_DELAY seconds
+# old. A delay of 0 writes every batch before the request returns.
+SENSOR_INGEST = {
+    'MAX_BUFFERED_READINGS': int(os.environ.get('SENSOR_INGEST_MAX_BUFFERED', '2000')),
+    'MAX_FLUSH_DELAY': float(os.environ.get('SENSOR_INGEST_FLUSH_DELAY', '1.0')),
+    'BULK_BATCH_SIZE': 1000,
+    'MAX_BATCH_READINGS': 10000,
+}
+
+# Dashboard analytics read hourly/daily rollups written only by
+# `manage.py compact_soil_rollups`; run it every few minutes (e.g. from cron).
+# It folds in rows older than COMPACTION_LAG_SECONDS, then recomputes the
+# last RECONCILE_HOURS of buckets to catch rows that committed late.
+SOIL_ROLLUPS = {
+    'COMPACTION_LAG_SECONDS': int(os.environ.get('ROLLUP_COMPACTION_LAG_SECONDS', '60')),
+    'RECONCILE_HOURS': int(os.environ.get('ROLLUP_RECONCILE_HOURS', '24')),
+}
+
+# All soil readings live in api's soil_data table. A prediction the app
+# reports to /dashboard/api/predictions/ within REPORT_MATCH_SECONDS of an
+# identical /api/predict/ result reuses that row instead of adding another.
+READING_INGEST = {
+    'REPORT_MATCH_SECONDS': int(os.environ.get('READING_REPORT_MATCH_SECONDS', '600')),
+}
+
+# Server-Sent Events at /dashboard/api/stream/. New predictions and sensor
+# readings are kept for replay up to HISTORY items; a client more than
+# CLIENT_BUFFER items behind is told to reload. Under gunicorn every open
+# stream holds one of a worker's GUNICORN_THREADS (under ASGI it waits on the
+# event loop), so at most MAX_CLIENTS, fewer than the threads, are served per
+# process, and each ends after MAX_STREAM_SECONDS, below GUNICORN_TIMEOUT
+# (the browser reconnects where it left off).
+REALTIME_FEED = {
+    'ENABLED': os.environ.get('REALTIME_FEED', '1') == '1',
+    'HISTORY': 5000,
+    'CLIENT_BUFFER': 2000,
+    'MAX_CLIENTS': int(os.environ.get('REALTIME_MAX_CLIENTS', '16')),
+    'HEARTBEAT_SECONDS': 15.0,
+    'MAX_STREAM_SECONDS': float(os.environ.get('REALTIME_MAX_STREAM_SECONDS', '45')),
+}
+
+# New sensor readings are scored in the background, BATCH_SIZE per
+# predict_proba call. Readings missed while disabled can be backfilled with
+# `manage.py generate_recommendations`.
+CROP_RECOMMENDATION_QUEUE = {
+    'ENABLED': os.environ.get('CROP_RECOMMENDATION_QUEUE', '1') == '1',
+    'BATCH_SIZE': 500,
+}
+
 # Logging configuration
 LOGGING = {
     'version': 1,
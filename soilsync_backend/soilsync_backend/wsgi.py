@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'soilsync_backend.settings')
 
 application = get_wsgi_application()
+
+# Load shared serving state now; with gunicorn's preload_app this runs in the
+# master before the workers are forked (see gunicorn.conf.py)
+if settings.PRELOAD_ON_STARTUP:
+    from api.preload import preload
+    preload()